@@ -0,0 +1,105 @@
+"""
+Tiempo de arranque de la API: cuánto tarda `import main` y qué paquetes pesan más.
+
+    python -m bench.arranque                          # resumen de python -X importtime por paquete
+    python -m bench.arranque --presupuesto-ms 1500    # sale con 1 si se pasa o si carga el stack de Excel
+    API_SOLO_LECTURA=1 python -m bench.arranque --top 30 --salida arranque.json
+
+Cada medición corre en un intérprete nuevo (sin módulos ya cargados). El tiempo que se
+compara con el presupuesto es la mediana de --repeticiones corridas sin -X importtime,
+que infla los tiempos; el desglose por paquete sale de una corrida aparte con importtime.
+"""
+import os, sys, json, argparse, subprocess, statistics
+from typing import Any, Dict, List
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Lo que no tiene que cargarse al arrancar (se importa con el primer upload / export / stats local)
+PESADOS = ("pandas", "numpy", "openpyxl", "pyarrow", "python_calamine")
+
+_MEDIR = (
+    "import time, sys, json\n"
+    "t0 = time.perf_counter()\n"
+    "import main\n"
+    "print(json.dumps({'segundos': time.perf_counter() - t0,"
+    " 'pesados': [m for m in %r if m in sys.modules]}))\n" % (PESADOS,)
+)
+
+def _correr(*args: str) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, *args], cwd=RAIZ, capture_output=True, text=True, check=True,
+        env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"},
+    )
+
+def medir_import() -> Dict[str, Any]:
+    """Una corrida de `import main` en un proceso nuevo: segundos y pesados cargados."""
+    return json.loads(_correr("-c", _MEDIR).stdout.strip().splitlines()[-1])
+
+def importtime() -> List[Dict[str, Any]]:
+    """Líneas de `python -X importtime -c 'import main'` como {modulo, propio_us, acumulado_us}."""
+    salida = _correr("-X", "importtime", "-c", "import main").stderr
+    filas = []
+    for linea in salida.splitlines():
+        if not linea.startswith("import time:") or "self [us]" in linea:
+            continue
+        propio, acumulado, modulo = linea[len("import time:"):].split("|")
+        filas.append({"modulo": modulo.strip(), "propio_us": int(propio), "acumulado_us": int(acumulado)})
+    return filas
+
+def por_paquete(filas: List[Dict[str, Any]]) -> Dict[str, float]:
+    """Tiempo propio sumado por paquete de primer nivel (ms), de mayor a menor."""
+    totales: Dict[str, int] = {}
+    for f in filas:
+        raiz = f["modulo"].split(".")[0]
+        totales[raiz] = totales.get(raiz, 0) + f["propio_us"]
+    return {k: round(v / 1000, 1) for k, v in sorted(totales.items(), key=lambda kv: -kv[1])}
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--top", type=int, default=15, help="paquetes a mostrar")
+    ap.add_argument("--repeticiones", type=int, default=5)
+    ap.add_argument("--presupuesto-ms", type=float, default=None,
+                    help="falla (exit 1) si la mediana de `import main` lo supera o si se cargan PESADOS")
+    ap.add_argument("--salida", default=None, help="además, guardar el resultado en este JSON")
+    args = ap.parse_args()
+
+    corridas = [medir_import() for _ in range(args.repeticiones)]
+    mediana_ms = round(statistics.median(c["segundos"] for c in corridas) * 1000, 1)
+    pesados = sorted({m for c in corridas for m in c["pesados"]})
+    filas = importtime()
+    paquetes = por_paquete(filas)
+
+    print(f"⏱️ import main: {mediana_ms} ms (mediana de {args.repeticiones}, "
+          f"solo lectura={os.getenv('API_SOLO_LECTURA', '0')})")
+    print(f"   importtime total: {max((f['acumulado_us'] for f in filas if f['modulo'] == 'main'), default=0) / 1000:.1f} ms")
+    print(f"{'paquete':<28}{'ms (propio)':>12}")
+    for nombre, ms in list(paquetes.items())[:args.top]:
+        print(f"{nombre:<28}{ms:>12}")
+    print("📦 Pesados cargados al arrancar:", ", ".join(pesados) or "ninguno")
+
+    resultado = {
+        "import_main_ms": mediana_ms,
+        "corridas_ms": [round(c["segundos"] * 1000, 1) for c in corridas],
+        "pesados_cargados": pesados,
+        "paquetes_ms": paquetes,
+        "presupuesto_ms": args.presupuesto_ms,
+    }
+    if args.salida:
+        with open(args.salida, "w") as f:
+            json.dump(resultado, f, indent=2)
+
+    if args.presupuesto_ms is not None:
+        fallas = []
+        if mediana_ms > args.presupuesto_ms:
+            fallas.append(f"import main tardó {mediana_ms} ms (presupuesto {args.presupuesto_ms} ms)")
+        if pesados:
+            fallas.append(f"se cargaron al arrancar: {', '.join(pesados)}")
+        for falla in fallas:
+            print("❌", falla)
+        if fallas:
+            return 1
+        print("✅ Dentro del presupuesto")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,148 @@
+"""
+Benchmark del camino de ingesta: procesar Excel (streaming) + diff/upsert contra un cliente en memoria.
+
+    python -m bench.bench_ingesta --filas 1000,10000,100000 --salida bench.json
+    python -m bench.bench_ingesta --motor sqlite      # diff/upsert contra SQLite en memoria
+    EXCEL_ENGINE=openpyxl python -m bench.bench_ingesta   # comparar lectores de Excel
+
+Cada tamaño corre en un subproceso aparte para que el pico de RSS sea el de esa corrida.
+La salida es JSON para comparar entre commits.
+"""
+import os, sys, json, time, argparse, platform, resource, subprocess, tempfile, tracemalloc
+from typing import Any, Dict, List
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _rss_max_mb() -> float:
+    kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(kb / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def _commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ, text=True).strip()
+    except Exception:
+        return "desconocido"
+
+def _nuevo_repositorio(motor: str):
+    if motor == "sqlite":
+        from services.sqlite_service import RepositorioSQLite
+        return RepositorioSQLite(":memory:")
+    from services.supabase_service import RepositorioSupabase
+    from bench.memoria_supabase import ClienteMemoria
+    return RepositorioSupabase(ClienteMemoria())
+
+def medir(ruta: str, motor: str = "memoria") -> Dict[str, Any]:
+    """Mide un archivo ya generado (corre dentro del subproceso)."""
+    from services.excel_service import iterar_lotes_excel
+    from services.repositorio import set_repositorio
+    from services.huellas import HuellasLocales, set_huellas
+    from services.tareas_service import insertar_lotes
+
+    out: Dict[str, Any] = {"motor": motor, "archivo_mb": round(os.path.getsize(ruta) / 2**20, 2)}
+
+    # 1) parseo: tiempo (sin tracemalloc, que lo frena) y luego pico de memoria Python
+    lectura: Dict[str, Any] = {}
+    t0 = time.perf_counter()
+    filas = sum(len(lote) for lote in iterar_lotes_excel(ruta, lectura=lectura))
+    out["filas"] = filas
+    out["parse_s"] = round(time.perf_counter() - t0, 3)
+    out["lector"] = lectura["motor_excel"]
+    out["lectura_s"] = round(lectura["segundos_lectura"], 3)
+    out["normalizar_s"] = round(lectura["segundos_normalizar"], 3)
+    out["parse_filas_s"] = round(filas / out["parse_s"]) if out["parse_s"] else None
+
+    tracemalloc.start()
+    for _ in iterar_lotes_excel(ruta):
+        pass
+    out["parse_pico_py_mb"] = round(tracemalloc.get_traced_memory()[1] / 2**20, 1)
+    tracemalloc.stop()
+
+    # 2) diff + upsert aislados: lotes ya parseados en memoria
+    lotes: List[List[dict]] = list(iterar_lotes_excel(ruta))
+    repo = _nuevo_repositorio(motor)
+    set_repositorio(repo)
+    set_huellas(HuellasLocales(":memory:"))
+
+    t0 = time.perf_counter()
+    r = insertar_lotes(lotes)
+    out["upsert_inicial_s"] = round(time.perf_counter() - t0, 3)
+    out["insertadas"] = r["insertadas"]
+
+    cliente = getattr(repo, "_client", None)
+    if cliente is not None:
+        cliente.requests = 0
+    t0 = time.perf_counter()
+    r = insertar_lotes(lotes)
+    out["diff_sin_cambios_s"] = round(time.perf_counter() - t0, 3)
+    if cliente is not None:
+        out["requests_sin_cambios"] = cliente.requests
+    out["actualizadas_sin_cambios"] = r["actualizadas"]
+
+    # mismo re-upload en modo delta: las huellas locales descartan todo antes del motor
+    if cliente is not None:
+        cliente.requests = 0
+    t0 = time.perf_counter()
+    r = insertar_lotes(lotes, modo="delta")
+    out["delta_sin_cambios_s"] = round(time.perf_counter() - t0, 3)
+    if cliente is not None:
+        out["requests_delta"] = cliente.requests
+    del lotes
+
+    # 3) extremo a extremo en streaming (parse + diff, sin cambios)
+    t0 = time.perf_counter()
+    insertar_lotes(iterar_lotes_excel(ruta))
+    out["ingesta_total_s"] = round(time.perf_counter() - t0, 3)
+    out["ingesta_filas_s"] = round(filas / out["ingesta_total_s"]) if out["ingesta_total_s"] else None
+
+    out["rss_max_mb"] = _rss_max_mb()
+    return out
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--filas", default="1000,10000,100000", help="tamaños separados por coma (1k–500k)")
+    ap.add_argument("--salida", help="archivo JSON de salida (por defecto stdout)")
+    ap.add_argument("--dir", default=os.path.join(tempfile.gettempdir(), "bench_planner"),
+                    help="dónde guardar/reusar los .xlsx generados")
+    ap.add_argument("--motor", choices=["memoria", "sqlite"], default="memoria",
+                    help="memoria = cliente Supabase simulado; sqlite = RepositorioSQLite(':memory:')")
+    ap.add_argument("--medir", help=argparse.SUPPRESS)
+    args = ap.parse_args(argv)
+
+    if args.medir:
+        print(json.dumps(medir(args.medir, args.motor)))
+        return 0
+
+    from bench.generar_planner import generar_xlsx
+
+    os.makedirs(args.dir, exist_ok=True)
+    resultados = []
+    for n in [int(x) for x in args.filas.split(",") if x.strip()]:
+        ruta = os.path.join(args.dir, f"planner_{n}.xlsx")
+        if not os.path.exists(ruta):
+            print(f"⚙️  generando {ruta}", file=sys.stderr)
+            generar_xlsx(ruta, n)
+        print(f"⏱️  midiendo {n} filas", file=sys.stderr)
+        salida = subprocess.run(
+            [sys.executable, "-m", "bench.bench_ingesta", "--medir", ruta, "--motor", args.motor],
+            cwd=RAIZ, check=True, capture_output=True, text=True,
+        ).stdout
+        # la última línea es el JSON (el parser imprime progreso antes)
+        resultados.append({"filas_pedidas": n, **json.loads(salida.strip().splitlines()[-1])})
+
+    reporte = {
+        "commit": _commit(),
+        "fecha": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "resultados": resultados,
+    }
+    texto = json.dumps(reporte, indent=2, ensure_ascii=False)
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            f.write(texto + "\n")
+    else:
+        print(texto)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
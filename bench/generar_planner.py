@@ -0,0 +1,77 @@
+"""
+Genera exportaciones sintéticas de Planner (.xlsx) para benchmarks.
+
+    python -m bench.generar_planner 10000 /tmp/planner_10k.xlsx
+"""
+import sys, random
+from datetime import datetime, timedelta
+from openpyxl import Workbook
+
+# Cabeceras tal como las exporta Planner en español (las que entiende _build_renames y algunas que ignora)
+CABECERAS = [
+    "Id. de tarea", "Nombre de la tarea", "Nombre del depósito", "Progreso", "Prioridad",
+    "Asignado a", "Creado por", "Fecha de creación", "Fecha de inicio", "Fecha de vencimiento",
+    "Es periódica", "Retrasado", "Fecha de finalización", "Completado por",
+    "Elementos de la lista de comprobación completados", "Elementos de la lista de comprobación",
+    "Etiquetas", "Descripción",
+]
+
+PROGRESOS = ["No iniciado", "En curso", "Completado", "Informado", "En procesos", "Efectividad verificada", "No efectivo"]
+PRIORIDADES = ["Urgente", "Importante", "Media", "Baja"]
+TABLEROS = ["Cambios de ingeniería", "Mejora continua", "Calidad", "Mantenimiento", "Seguridad"]
+PERSONAS = ["Ana Pérez", "José Núñez", "María Gómez", "Lucía Fernández", "Martín Ríos", "Sofía Díaz"]
+ETIQUETAS = ["Planta 1", "Planta 2", "Crítico", "Proveedor", "Auditoría", "Seguridad", "Costos"]
+
+def _fecha(rnd: random.Random, base: datetime):
+    """Mezcla de formatos como aparecen en exportaciones reales: celda fecha, dd/mm/aaaa, ISO o vacío."""
+    d = base + timedelta(days=rnd.randint(-400, 120))
+    tipo = rnd.random()
+    if tipo < 0.45:
+        return d
+    if tipo < 0.80:
+        return d.strftime("%d/%m/%Y")
+    if tipo < 0.92:
+        return d.strftime("%Y-%m-%d")
+    return None
+
+def _lista(rnd: random.Random, opciones, maximo: int) -> str:
+    elegidos = rnd.sample(opciones, rnd.randint(0, maximo))
+    # separador ';' con espacios y repetidos, como llega de Planner
+    return "; ".join(elegidos + elegidos[:1])
+
+def generar_xlsx(ruta: str, filas: int, seed: int = 42) -> str:
+    rnd = random.Random(seed)
+    base = datetime(2025, 6, 1)
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Tareas")
+    ws.append(CABECERAS)
+    checklist = [f"Paso {i}" for i in range(1, 13)]
+    for i in range(filas):
+        completado = rnd.random() < 0.4
+        ws.append([
+            f"{i:08x}{rnd.getrandbits(64):016x}",
+            f"Tarea de prueba {i}",
+            rnd.choice(TABLEROS),
+            rnd.choice(PROGRESOS),
+            rnd.choice(PRIORIDADES),
+            rnd.choice(PERSONAS) if rnd.random() < 0.9 else None,
+            rnd.choice(PERSONAS),
+            _fecha(rnd, base),
+            _fecha(rnd, base),
+            _fecha(rnd, base),
+            "false",
+            None,
+            _fecha(rnd, base) if completado else None,
+            rnd.choice(PERSONAS) if completado else None,
+            f"{rnd.randint(0, 5)}/5",
+            _lista(rnd, checklist, 6),
+            _lista(rnd, ETIQUETAS, 3),
+            ("Descripción larga del cambio de ingeniería. " * rnd.randint(0, 6)).strip() or None,
+        ])
+    wb.save(ruta)
+    return ruta
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    destino = sys.argv[2] if len(sys.argv) > 2 else f"planner_{n}.xlsx"
+    print(generar_xlsx(destino, n))
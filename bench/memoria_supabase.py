@@ -0,0 +1,67 @@
+"""
+Cliente en memoria con el subconjunto de la API de supabase-py que usa RepositorioSupabase
+(select + in_ + execute, upsert por id_tarea_planner). Sin red: mide solo el costo del proceso.
+"""
+import threading
+from typing import Any, Dict, List, Optional
+
+class _Resultado:
+    def __init__(self, data: List[dict], count: Optional[int] = None):
+        self.data = data
+        self.count = count
+
+class _Consulta:
+    def __init__(self, db: "ClienteMemoria", tabla: str):
+        self._db = db
+        self._tabla = tabla
+        self._op = "select"
+        self._cols: Optional[List[str]] = None
+        self._in: Optional[tuple] = None
+        self._filas: List[dict] = []
+
+    def select(self, cols: str = "*", count: Optional[str] = None):
+        self._cols = None if cols == "*" else [c.strip() for c in cols.split(",")]
+        return self
+
+    def in_(self, col: str, valores):
+        self._in = (col, set(valores))
+        return self
+
+    def upsert(self, filas: List[dict], on_conflict: str = "id_tarea_planner", **_):
+        self._op = "upsert"
+        self._filas = filas
+        return self
+
+    def execute(self) -> _Resultado:
+        self._db.requests += 1
+        tabla = self._db.tablas.setdefault(self._tabla, {})
+        with self._db.lock:
+            if self._op == "upsert":
+                for f in self._filas:
+                    clave = f["id_tarea_planner"]
+                    previa = tabla.get(clave)
+                    fila = dict(f)
+                    fila.setdefault("id", previa["id"] if previa else len(tabla) + 1)
+                    tabla[clave] = fila
+                return _Resultado([])
+            filas = tabla.values()
+            if self._in:
+                col, valores = self._in
+                if col == "id_tarea_planner":
+                    filas = [tabla[v] for v in valores if v in tabla]
+                else:
+                    filas = [f for f in filas if f.get(col) in valores]
+            if self._cols:
+                filas = [{c: f.get(c) for c in self._cols} for f in filas]
+            else:
+                filas = [dict(f) for f in filas]
+            return _Resultado(filas)
+
+class ClienteMemoria:
+    def __init__(self):
+        self.tablas: Dict[str, Dict[str, Any]] = {}
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def table(self, nombre: str) -> _Consulta:
+        return _Consulta(self, nombre)
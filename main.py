@@ -1,15 +1,47 @@
 import os
+import time
 import logging
-from typing import Optional, List
-from fastapi import FastAPI, UploadFile, File, Query, Response
+import threading
+from contextlib import asynccontextmanager
+from typing import Optional, List, Dict, Any
+from fastapi import FastAPI, UploadFile, File, Path, Query, Header, Request, Response, HTTPException, Depends
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import StreamingResponse
 from dotenv import load_dotenv
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
 
-from services.excel_service import procesar_excel
-from services.supabase_service import insertar_tareas, filtrar_tareas, obtener_facetas
+from services.tareas_service import (
+    filtrar_tareas, iterar_tareas_filtradas, obtener_facetas_detalle, buscar_tareas, campos_pedidos, a_columnas,
+    actualizar_retrasadas,
+)
+from services.export_service import EXPORTADORES
+from services.stats_service import estadisticas_tareas
+from services.cache import cache_consultas
+from services.repositorio import TAREAS_SNAPSHOT, get_repositorio, cerrar_repositorio
+from services.metricas import HTTP, iniciar_server_timing, registro_metricas, server_timing_header
+from services.programador import RETRASADAS_HORA, ProgramadorDiario
+
+try:
+    import orjson  # noqa: F401  (ORJSONResponse lo necesita)
+    from fastapi.responses import ORJSONResponse as RespuestaJSON
+except ImportError:
+    from fastapi.responses import JSONResponse as RespuestaJSON
+
+try:
+    from brotli_asgi import BrotliMiddleware   # opcional: br para los clientes que lo aceptan
+except ImportError:
+    BrotliMiddleware = None
 
 load_dotenv()
 
+# Réplicas que solo sirven lecturas: sin uploads ni job diario, y sin importar pandas/openpyxl
+API_SOLO_LECTURA = os.getenv("API_SOLO_LECTURA", "0").strip().lower() in ("1", "true", "si", "sí")
+
+# Respuestas más chicas que esto se mandan sin comprimir
+COMPRESION_MIN_BYTES = int(os.getenv("COMPRESION_MIN_BYTES", "1024"))
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("api")
 
@@ -18,7 +50,43 @@ def get_origins_from_env() -> List[str]:
     origins = [o.strip().rstrip("/") for o in raw.split(",") if o.strip()]
     return origins or ["http://localhost:5173"]
 
-app = FastAPI(title="API Cambios de Ingeniería")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # el motor y sus clientes HTTP se crean en el primer uso; al apagar se cierran sus pools
+    if TAREAS_SNAPSHOT:
+        # la copia en memoria se carga en segundo plano: el arranque no espera a la base
+        threading.Thread(target=get_repositorio().precargar, name="snapshot", daemon=True).start()
+    # `retrasada` se fija al subir el Excel: una vez por día se marcan las que vencieron desde entonces
+    programador = None
+    if RETRASADAS_HORA and not API_SOLO_LECTURA:
+        programador = ProgramadorDiario("retrasadas", actualizar_retrasadas, RETRASADAS_HORA)
+    if programador:
+        programador.iniciar()
+    yield
+    if programador:
+        programador.detener()
+    await cerrar_repositorio()
+
+app = FastAPI(title="API Cambios de Ingeniería", lifespan=lifespan)
+
+# Compresión por dentro de server_timing: ve la respuesta entera (con su tamaño) y no el stream
+# que arma el middleware http, así respeta COMPRESION_MIN_BYTES
+if BrotliMiddleware is not None:
+    app.add_middleware(BrotliMiddleware, minimum_size=COMPRESION_MIN_BYTES, gzip_fallback=True)
+else:
+    app.add_middleware(GZipMiddleware, minimum_size=COMPRESION_MIN_BYTES)
+
+@app.middleware("http")
+async def server_timing(request: Request, call_next):
+    """Server-Timing con las fases medidas durante el request + histograma por ruta."""
+    t0 = time.perf_counter()
+    tiempos = iniciar_server_timing()
+    response = await call_next(request)
+    total = time.perf_counter() - t0
+    response.headers["Server-Timing"] = server_timing_header(tiempos, total)
+    ruta = request.scope.get("route")
+    HTTP.labels(request.method, getattr(ruta, "path", "sin_ruta"), str(response.status_code)).observe(total)
+    return response
 
 app.add_middleware(
     CORSMiddleware,
@@ -26,71 +94,272 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # el frontend puede leer el desglose de tiempos desde otro origen
+    expose_headers=["Server-Timing"],
 )
 
 @app.get("/health")
 def health():
     return {"status": "ok"}
 
-@app.post("/upload-tareas")
-async def upload_tareas(file: UploadFile = File(...)):
-    logger.info("📤 Archivo recibido: %s", file.filename)
-    tareas = procesar_excel(file)
-    logger.info("🗂️ Tareas procesadas: %d", len(tareas))
+@app.get("/health/db")
+async def health_db():
+    """Comprueba que el motor de tareas responde (503 si no)."""
+    try:
+        await get_repositorio().ping_async()
+    except Exception as e:
+        logger.warning("⚠️ Motor de tareas no disponible: %s", e)
+        raise HTTPException(status_code=503, detail="Motor de tareas no disponible")
+    return {"status": "ok"}
+
+def _uploads():
+    """
+    services.upload_jobs se importa con el primer upload: trae pandas, numpy, openpyxl y
+    pyarrow, que las instancias que solo consultan no necesitan para arrancar.
+    """
+    if API_SOLO_LECTURA:
+        raise HTTPException(status_code=403, detail="API en modo solo lectura (API_SOLO_LECTURA): uploads deshabilitados")
+    import services.upload_jobs as uploads
+    return uploads
+
+@app.post("/upload-tareas", status_code=202)
+async def upload_tareas(
+    response: Response,
+    file: UploadFile = File(...),
+    modo: str = Query("completo", pattern="^(completo|delta)$",
+                      description="delta = solo envía a la base las filas que cambiaron desde el último upload"),
+    detectar_eliminadas: bool = Query(False, description="marca eliminada=true en tareas de los tableros del archivo que no vinieron"),
+    idempotency_key: Optional[str] = Header(None, max_length=200),
+):
+    logger.info("📤 Archivo recibido: %s (modo %s)", file.filename, modo)
+    uploads = await run_in_threadpool(_uploads)
+    # solo se guarda el archivo; el parseo + upsert corre en el pool de uploads
+    try:
+        job = await run_in_threadpool(uploads.crear_job, file.filename, file.file, modo, detectar_eliminadas, idempotency_key)
+    except uploads.ConflictoIdempotencia as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-    insertadas, actualizadas = insertar_tareas(tareas)
-    tareas_cargadas = (insertadas or 0) + (actualizadas or 0)
+    if not job["duplicado"]:
+        logger.info("🧵 Job encolado: %s", job["job_id"])
+    elif job["resultado"] is not None:
+        # ya aplicado: se devuelve el resultado sin volver a procesar
+        response.status_code = 200
 
     return {
         "status": "ok",
-        "procesadas": len(tareas),
-        "insertadas": insertadas,
-        "actualizadas": actualizadas,
-        "tareas_cargadas": tareas_cargadas,
+        "job_id": job["job_id"],
+        "estado_url": f"/upload-jobs/{job['job_id']}",
+        "duplicado": job["duplicado"],
+        "resultado": job["resultado"],
+        # lector elegido; los tiempos de lectura/normalización quedan en el estado del job
+        "motor_excel": job["motor_excel"],
     }
 
-@app.get("/tareas-filtradas")
-def obtener_tareas(
+@app.post("/upload-tareas/lote", status_code=202)
+async def upload_tareas_lote(
+    response: Response,
+    files: List[UploadFile] = File(..., description="Varios .xlsx/.xlsm/.ods/.csv o .zip; se leen todas las hojas"),
+    modo: str = Query("completo", pattern="^(completo|delta)$"),
+    detectar_eliminadas: bool = Query(False),
+    idempotency_key: Optional[str] = Header(None, max_length=200),
+):
+    """Varios archivos en un solo job: parseo en paralelo, merge por id (gana el último) y un único upsert."""
+    logger.info("📤 Lote recibido: %d archivo(s) (modo %s)", len(files), modo)
+    uploads = await run_in_threadpool(_uploads)
+    try:
+        job = await run_in_threadpool(
+            uploads.crear_job_lote, [(f.filename, f.file) for f in files], modo, detectar_eliminadas, idempotency_key,
+        )
+    except uploads.ConflictoIdempotencia as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if not job["duplicado"]:
+        logger.info("🧵 Job encolado: %s", job["job_id"])
+    elif job["resultado"] is not None:
+        response.status_code = 200
+
+    return {
+        "status": "ok",
+        "job_id": job["job_id"],
+        "estado_url": f"/upload-jobs/{job['job_id']}",
+        "duplicado": job["duplicado"],
+        "resultado": job["resultado"],
+    }
+
+@app.post("/upload-tareas/preview")
+async def upload_tareas_preview(file: UploadFile = File(...)):
+    """
+    Parsea el archivo sin escribir en la base: mapeo de cabeceras, filas y cuántas se
+    insertarían / actualizarían / quedarían igual. Se confirma con /upload-tareas/commit/{digest}.
+    """
+    logger.info("🔎 Previsualización: %s", file.filename)
+    uploads = await run_in_threadpool(_uploads)
+    try:
+        previa = await run_in_threadpool(uploads.previsualizar, file.filename, file.file)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # sin cache de parseo no hay nada que confirmar: se sube con /upload-tareas
+    commit_url = f"/upload-tareas/commit/{previa['digest']}" if previa["confirmable"] else None
+    return {"status": "ok", **previa, "commit_url": commit_url}
+
+@app.post("/upload-tareas/commit/{digest}", status_code=202)
+async def upload_tareas_commit(
     response: Response,
+    digest: str = Path(..., pattern="^[0-9a-f]{40}$"),
+    modo: str = Query("completo", pattern="^(completo|delta)$"),
+    detectar_eliminadas: bool = Query(False),
+    idempotency_key: Optional[str] = Header(None, max_length=200),
+):
+    """Carga un archivo ya previsualizado desde el cache de parseos (sin volver a leer el Excel)."""
+    uploads = await run_in_threadpool(_uploads)
+    try:
+        job = await run_in_threadpool(uploads.crear_job_commit, digest, modo, detectar_eliminadas, idempotency_key)
+    except uploads.PreviaNoEncontrada as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except uploads.ConflictoIdempotencia as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    if not job["duplicado"]:
+        logger.info("🧵 Job encolado: %s (previsualizado)", job["job_id"])
+    elif job["resultado"] is not None:
+        response.status_code = 200
+
+    return {
+        "status": "ok",
+        "job_id": job["job_id"],
+        "estado_url": f"/upload-jobs/{job['job_id']}",
+        "duplicado": job["duplicado"],
+        "resultado": job["resultado"],
+        "motor_excel": job["motor_excel"],
+    }
+
+@app.get("/upload-jobs/{job_id}")
+def upload_job(job_id: str):
+    job = _uploads().obtener_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job no encontrado")
+    return {"status": "ok", "data": job}
+
+FECHA = r"^\d{4}-\d{2}-\d{2}$"
+
+def filtros_tareas(
     estado: Optional[str] = Query(None, description="CSV. Ej: Implementado,Efectividad verificada"),
     prioridad: Optional[str] = Query(None, description="CSV"),
     colaborador: Optional[str] = Query(None, description="CSV"),
     tablero: Optional[str] = Query(None),
-    desde: Optional[str] = Query(None, description="YYYY-MM-DD (fecha_creacion >=)", pattern=r"^\d{4}-\d{2}-\d{2}$"),
-    hasta: Optional[str] = Query(None, description="YYYY-MM-DD (fecha_creacion <=)", pattern=r"^\d{4}-\d{2}-\d{2}$"),
+    desde: Optional[str] = Query(None, description="YYYY-MM-DD (fecha_creacion >=)", pattern=FECHA),
+    hasta: Optional[str] = Query(None, description="YYYY-MM-DD (fecha_creacion <=)", pattern=FECHA),
     q: Optional[str] = Query(None, description="busca en nombre/descripcion"),
+    # extras
+    vencida: Optional[bool] = Query(None, description="retrasada (recalculada a diario, ver RETRASADAS_HORA)"),
+    vencimiento_desde: Optional[str] = Query(None, description="YYYY-MM-DD (fecha_vencimiento >=)", pattern=FECHA),
+    vencimiento_hasta: Optional[str] = Query(None, description="YYYY-MM-DD (fecha_vencimiento <=)", pattern=FECHA),
+    finalizacion_desde: Optional[str] = Query(None, description="YYYY-MM-DD (fecha_finalizacion >=)", pattern=FECHA),
+    finalizacion_hasta: Optional[str] = Query(None, description="YYYY-MM-DD (fecha_finalizacion <=)", pattern=FECHA),
+) -> Dict[str, Any]:
+    """Filtros comunes a /tareas-filtradas, /tareas-export, etc."""
+    return {
+        "estado": estado,
+        "prioridad": prioridad,
+        "colaborador": colaborador,
+        "tablero": tablero,
+        "desde": desde,
+        "hasta": hasta,
+        "q": q,
+        "vencida": vencida,
+        "vencimiento_desde": vencimiento_desde,
+        "vencimiento_hasta": vencimiento_hasta,
+        "finalizacion_desde": finalizacion_desde,
+        "finalizacion_hasta": finalizacion_hasta,
+    }
+
+@app.get("/tareas-filtradas")
+def obtener_tareas(
+    filtros: Dict[str, Any] = Depends(filtros_tareas),
     order_by: str = Query("fecha_creacion"),
     order_dir: str = Query("desc", pattern=r"^(asc|desc)$"),
     limit: int = Query(100, ge=1, le=1000),
     offset: int = Query(0, ge=0),
-    # extras
-    vencida: Optional[bool] = Query(None),
-    vencimiento_desde: Optional[str] = Query(None, description="YYYY-MM-DD (fecha_vencimiento >=)", pattern=r"^\d{4}-\d{2}-\d{2}$"),
-    vencimiento_hasta: Optional[str] = Query(None, description="YYYY-MM-DD (fecha_vencimiento <=)", pattern=r"^\d{4}-\d{2}-\d{2}$"),
-    finalizacion_desde: Optional[str] = Query(None, description="YYYY-MM-DD (fecha_finalizacion >=)", pattern=r"^\d{4}-\d{2}-\d{2}$"),
-    finalizacion_hasta: Optional[str] = Query(None, description="YYYY-MM-DD (fecha_finalizacion <=)", pattern=r"^\d{4}-\d{2}-\d{2}$"),
+    # paginación por cursor (keyset) y modo de conteo
+    paginacion: str = Query("offset", pattern=r"^(offset|cursor)$"),
+    cursor: Optional[str] = Query(None, description="next_cursor de la página anterior (implica paginacion=cursor)"),
+    conteo: str = Query("exact", pattern=r"^(exact|planned|estimated|none)$", description="none = sin total"),
+    # proyección y forma de la respuesta
+    fields: Optional[str] = Query(None, description="columnas separadas por coma (id y order_by se incluyen siempre)"),
+    formato: str = Query("rows", alias="format", pattern=r"^(rows|columns)$",
+                         description="columns = data como un arreglo por campo"),
+):
+    try:
+        data, total, next_cursor = filtrar_tareas(
+            **filtros,
+            order_by=order_by,
+            order_dir=order_dir,
+            limit=limit,
+            offset=offset,
+            paginacion=paginacion,
+            cursor=cursor,
+            conteo=conteo,
+            columnas=campos_pedidos(fields),
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    headers = {"X-Total-Count": str(total)} if total is not None else None
+    # las filas ya son JSON (vienen del motor o del cache): se serializan directo, sin jsonable_encoder
+    return RespuestaJSON(
+        {
+            "status": "ok",
+            "total": total,
+            "data": a_columnas(data) if formato == "columns" else data,
+            "next_cursor": next_cursor,
+        },
+        headers=headers,
+    )
+
+@app.get("/tareas-export")
+def exportar_tareas(
+    filtros: Dict[str, Any] = Depends(filtros_tareas),
+    formato: str = Query("csv", pattern=r"^(csv|ndjson|xlsx)$"),
+    order_by: str = Query("fecha_creacion"),
+    order_dir: str = Query("desc", pattern=r"^(asc|desc)$"),
 ):
-    data, total = filtrar_tareas(
-        estado=estado,
-        prioridad=prioridad,
-        colaborador=colaborador,
-        tablero=tablero,
-        desde=desde,
-        hasta=hasta,
-        q=q,
-        order_by=order_by,
-        order_dir=order_dir,
-        limit=limit,
-        offset=offset,
-        vencida=vencida,
-        vencimiento_desde=vencimiento_desde,
-        vencimiento_hasta=vencimiento_hasta,
-        finalizacion_desde=finalizacion_desde,
-        finalizacion_hasta=finalizacion_hasta,
+    filas = iterar_tareas_filtradas(**filtros, order_by=order_by, order_dir=order_dir)
+    media_type, cuerpo = EXPORTADORES[formato](filas)
+    return StreamingResponse(
+        cuerpo,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="tareas.{formato}"'},
     )
-    response.headers["X-Total-Count"] = str(total)
-    return {"status": "ok", "total": total, "data": data}
+
+@app.get("/tareas-stats")
+def tareas_stats(filtros: Dict[str, Any] = Depends(filtros_tareas)):
+    return {"status": "ok", "data": estadisticas_tareas(**filtros)}
+
+@app.get("/tareas-buscar")
+def tareas_buscar(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    tablero: Optional[str] = None,
+):
+    """Búsqueda de texto en nombre y descripción, ordenada por relevancia."""
+    data = buscar_tareas(q, limit=limit, tablero=tablero)
+    return {"status": "ok", "total": len(data), "data": data}
 
 @app.get("/facetas")
-def facetas():
-    return {"status": "ok", "data": obtener_facetas()}
+def facetas(request: Request, response: Response):
+    data, conteos, etag = obtener_facetas_detalle()
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return {"status": "ok", "data": data, "conteos": conteos}
+
+@app.get("/metrics")
+def metrics():
+    return Response(generate_latest(registro_metricas()), media_type=CONTENT_TYPE_LATEST)
+
+@app.get("/cache-stats")
+def cache_stats():
+    return {"status": "ok", "data": {"tareas_filtradas": cache_consultas.stats()}}
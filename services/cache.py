@@ -0,0 +1,234 @@
+import os, time, uuid, pickle, sqlite3, threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from services.multiproceso import MULTIPROCESO, ruta_compartida
+
+# memoria (del proceso) | sqlite (un archivo compartido por todos los workers)
+CACHE_BACKEND = (os.getenv("CACHE_BACKEND") or ("sqlite" if MULTIPROCESO else "memoria")).strip().lower()
+
+class CacheTTL:
+    """
+    Cache LRU acotado con TTL por entrada y contador de generación.
+    `invalidar()` sube la generación: todo lo guardado antes deja de servirse,
+    incluso resultados que estaban calculándose mientras se invalidaba.
+    La generación vuelve a 0 con cada cache nuevo (reinicio): lo que se guarde fuera
+    del cache junto con una generación tiene que guardar también `instancia`.
+    """
+
+    def __init__(self, nombre: str, maxsize: int, ttl: float):
+        self.nombre = nombre
+        self.maxsize = max(1, maxsize)
+        self.ttl = ttl
+        self._lock = threading.RLock()
+        self._datos: "OrderedDict[Hashable, Tuple[float, int, Any]]" = OrderedDict()
+        self._generacion = 0
+        self._propias = 0
+        self.instancia = uuid.uuid4().hex
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def generacion(self) -> int:
+        return self._generacion
+
+    def get(self, clave: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._datos.get(clave)
+            if item is not None:
+                expira, gen, valor = item
+                if gen == self._generacion and time.monotonic() < expira:
+                    self._datos.move_to_end(clave)
+                    self.hits += 1
+                    return valor
+                del self._datos[clave]
+            self.misses += 1
+            return default
+
+    def set(self, clave: Hashable, valor: Any, generacion: Optional[int] = None) -> None:
+        """`generacion`: la leída antes de calcular `valor` (si cambió, no se guarda)."""
+        with self._lock:
+            gen = self._generacion if generacion is None else generacion
+            if gen != self._generacion:
+                return
+            self._datos[clave] = (time.monotonic() + self.ttl, gen, valor)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.maxsize:
+                self._datos.popitem(last=False)
+                self.evictions += 1
+
+    def invalidar(self) -> int:
+        """Sube la generación y devuelve la nueva."""
+        with self._lock:
+            self._generacion += 1
+            self._propias += 1
+            self._datos.clear()
+            return self._generacion
+
+    def marca(self) -> Tuple[int, int]:
+        """(generación, invalidaciones hechas por este proceso), para cambios_ajenos()."""
+        with self._lock:
+            return self.generacion, self._propias
+
+    def cambios_ajenos(self, marca: Tuple[int, int]) -> bool:
+        """
+        Hubo escrituras de otro proceso desde `marca`: la generación subió más veces que las
+        invalidaciones propias. Lo usan las estructuras por proceso (índice de facetas, snapshot)
+        que ya aplican las escrituras propias y solo tienen que recargarse por las ajenas.
+        """
+        generacion, propias = marca
+        with self._lock:
+            return self.generacion - generacion != self._propias - propias
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "nombre": self.nombre,
+                "backend": "memoria",
+                "entradas": len(self._datos),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "generacion": self._generacion,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
+
+_ESQUEMA = """
+create table if not exists cache_generacion (nombre text primary key, valor integer not null);
+create table if not exists cache_instancia (nombre text primary key, instancia text not null);
+create table if not exists cache_entradas (
+    nombre text not null,
+    clave text not null,
+    generacion integer not null,
+    expira real not null,
+    valor blob not null,
+    primary key (nombre, clave)
+);
+create index if not exists cache_entradas_expira_idx on cache_entradas(nombre, expira);
+"""
+
+class CacheSQLite(CacheTTL):
+    """
+    CacheTTL sobre un archivo SQLite: todos los workers ven las mismas entradas y la misma
+    generación (una escritura en cualquier proceso invalida el cache de todos).
+    Claves por repr() y valores con pickle. El desalojo es por antigüedad de escritura
+    (marcar cada hit como usado costaría una escritura por lectura). hits/misses son del proceso.
+    """
+
+    def __init__(self, nombre: str, maxsize: int, ttl: float, ruta: str):
+        super().__init__(nombre, maxsize, ttl)
+        self.ruta = ruta
+        self._conn = sqlite3.connect(ruta, check_same_thread=False, isolation_level=None, timeout=30)
+        with self._lock:
+            if ruta != ":memory:":
+                self._conn.execute("pragma journal_mode=wal")
+            self._conn.execute("pragma synchronous=normal")
+            self._conn.executescript(_ESQUEMA)
+            self._conn.execute("insert or ignore into cache_generacion (nombre, valor) values (?, 0)", (nombre,))
+            # la misma para todos los workers mientras exista el archivo
+            self._conn.execute("insert or ignore into cache_instancia (nombre, instancia) values (?, ?)",
+                               (nombre, self.instancia))
+            self.instancia = self._conn.execute(
+                "select instancia from cache_instancia where nombre = ?", (nombre,),
+            ).fetchone()[0]
+
+    @property
+    def generacion(self) -> int:
+        with self._lock:
+            return self._conn.execute("select valor from cache_generacion where nombre = ?", (self.nombre,)).fetchone()[0]
+
+    def get(self, clave: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            fila = self._conn.execute(
+                "select e.valor from cache_entradas e join cache_generacion g on g.nombre = e.nombre"
+                " where e.nombre = ? and e.clave = ? and e.generacion = g.valor and e.expira > ?",
+                (self.nombre, repr(clave), time.time()),
+            ).fetchone()
+            if fila is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+        return pickle.loads(fila[0])
+
+    def set(self, clave: Hashable, valor: Any, generacion: Optional[int] = None) -> None:
+        dato = pickle.dumps(valor, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._conn.execute("begin immediate")
+            try:
+                actual = self._conn.execute(
+                    "select valor from cache_generacion where nombre = ?", (self.nombre,),
+                ).fetchone()[0]
+                if generacion is None or generacion == actual:
+                    self._conn.execute(
+                        "insert or replace into cache_entradas (nombre, clave, generacion, expira, valor)"
+                        " values (?, ?, ?, ?, ?)",
+                        (self.nombre, repr(clave), actual, time.time() + self.ttl, dato),
+                    )
+                    sobran = self._conn.execute(
+                        "select count(*) from cache_entradas where nombre = ?", (self.nombre,),
+                    ).fetchone()[0] - self.maxsize
+                    if sobran > 0:
+                        self._conn.execute(
+                            "delete from cache_entradas where rowid in (select rowid from cache_entradas"
+                            " where nombre = ? order by expira limit ?)", (self.nombre, sobran),
+                        )
+                        self.evictions += sobran
+                self._conn.execute("commit")
+            except BaseException:
+                self._conn.execute("rollback")
+                raise
+
+    def invalidar(self) -> int:
+        with self._lock:
+            self._conn.execute("begin immediate")
+            try:
+                generacion = self._conn.execute(
+                    "update cache_generacion set valor = valor + 1 where nombre = ? returning valor", (self.nombre,),
+                ).fetchone()[0]
+                self._conn.execute("delete from cache_entradas where nombre = ?", (self.nombre,))
+                self._conn.execute("commit")
+            except BaseException:
+                self._conn.execute("rollback")
+                raise
+            self._propias += 1
+            return generacion
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entradas = self._conn.execute(
+                "select count(*) from cache_entradas where nombre = ? and expira > ?", (self.nombre, time.time()),
+            ).fetchone()[0]
+            total = self.hits + self.misses
+            return {
+                "nombre": self.nombre,
+                "backend": "sqlite",
+                "entradas": entradas,
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "generacion": self._conn.execute(
+                    "select valor from cache_generacion where nombre = ?", (self.nombre,),
+                ).fetchone()[0],
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
+
+def nuevo_cache(nombre: str, maxsize: int, ttl: float) -> CacheTTL:
+    """Cache según CACHE_BACKEND (el de SQLite va en COMPARTIDO_DIR/cache.db, o CACHE_PATH)."""
+    if CACHE_BACKEND == "sqlite":
+        return CacheSQLite(nombre, maxsize, ttl, os.getenv("CACHE_PATH") or ruta_compartida("cache.db"))
+    if CACHE_BACKEND != "memoria":
+        raise RuntimeError(f"CACHE_BACKEND desconocido: {CACHE_BACKEND!r} (memoria | sqlite)")
+    return CacheTTL(nombre, maxsize, ttl)
+
+# Resultados de /tareas-filtradas, /facetas, /tareas-stats... por combinación de filtros
+cache_consultas = nuevo_cache(
+    "tareas_filtradas",
+    maxsize=int(os.getenv("CONSULTAS_CACHE_MAX", "512")),
+    ttl=float(os.getenv("CONSULTAS_CACHE_TTL", "60")),
+)
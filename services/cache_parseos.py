@@ -0,0 +1,191 @@
+import os, re, json, pickle, logging, tempfile, threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, List, Optional
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:   # sin pyarrow las filas se guardan con pickle
+    pa = pq = None
+
+# Errores al serializar las filas: el parseo no se cachea pero la previsualización sigue
+_ERRORES_ESCRITURA = (pa.ArrowException,) if pa is not None else (pickle.PicklingError,)
+
+logger = logging.getLogger("api.cache_parseos")
+
+# Archivos ya parseados por /upload-tareas/preview, para confirmarlos sin volver a leer el Excel
+PARSE_CACHE_DIR = os.getenv("PARSE_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "parse_cache")
+PARSE_CACHE_MAX_MB = int(os.getenv("PARSE_CACHE_MAX_MB", "512"))
+PARSE_CACHE_MAX = int(os.getenv("PARSE_CACHE_MAX", "50"))
+
+DIGEST = re.compile(r"^[0-9a-f]{40}$")
+_EXT_FILAS = ".parquet" if pq is not None else ".pkl"
+
+class CacheParseos:
+    """
+    Tareas normalizadas de un archivo (Parquet, o pickle sin pyarrow) + metadatos (JSON)
+    por digest del archivo, en disco y con desalojo LRU por cantidad y tamaño total.
+    El diff contra la base se guarda aparte (<digest>.diff.json): se recalcula cuando la
+    base cambió desde la previsualización sin tener que volver a parsear.
+    """
+
+    def __init__(self, directorio: str = PARSE_CACHE_DIR, max_mb: int = PARSE_CACHE_MAX_MB,
+                 max_entradas: int = PARSE_CACHE_MAX):
+        self.directorio = directorio
+        self.max_bytes = max_mb * 2**20
+        self.max_entradas = max(1, max_entradas)
+        self._lock = threading.Lock()
+        # digest → bytes en disco, de la usada hace más tiempo a la más reciente
+        self._lru: "OrderedDict[str, int]" = OrderedDict()
+        os.makedirs(directorio, exist_ok=True)
+        # lo que quedó de antes de reiniciar, ordenado por último uso (mtime de los metadatos)
+        metas = [n for n in os.listdir(directorio) if DIGEST.match(n[:-5]) and n.endswith(".json")]
+        for nombre in sorted(metas, key=lambda n: os.path.getmtime(os.path.join(directorio, n))):
+            digest = nombre[:-5]
+            if os.path.exists(self._ruta(digest, _EXT_FILAS)):
+                self._lru[digest] = self._tamano(digest)
+            else:
+                self._borrar(digest)
+
+    def _ruta(self, digest: str, ext: str) -> str:
+        if not DIGEST.match(digest):
+            raise ValueError(f"digest inválido: {digest!r}")
+        return os.path.join(self.directorio, digest + ext)
+
+    def _tamano(self, digest: str) -> int:
+        total = 0
+        for ext in (_EXT_FILAS, ".json", ".diff.json"):
+            try:
+                total += os.path.getsize(self._ruta(digest, ext))
+            except OSError:
+                pass
+        return total
+
+    def _borrar(self, digest: str) -> None:
+        for ext in (_EXT_FILAS, ".json", ".diff.json"):
+            try:
+                os.remove(self._ruta(digest, ext))
+            except OSError:
+                pass
+
+    def _escribir_json(self, ruta: str, datos: Any) -> None:
+        tmp = ruta + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(datos, f, ensure_ascii=False)
+        os.replace(tmp, ruta)
+
+    def _leer_json(self, ruta: str) -> Optional[Any]:
+        try:
+            with open(ruta, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _usar(self, digest: str) -> bool:
+        """Marca la entrada como recién usada; False si no está (también la que guardó otro worker)."""
+        presente = os.path.exists(self._ruta(digest, _EXT_FILAS)) and os.path.exists(self._ruta(digest, ".json"))
+        with self._lock:
+            if not presente:
+                # la desalojó otro worker
+                self._lru.pop(digest, None)
+                return False
+            if digest not in self._lru:
+                self._lru[digest] = self._tamano(digest)
+            self._lru.move_to_end(digest)
+        try:
+            os.utime(self._ruta(digest, ".json"))
+        except OSError:
+            pass
+        return True
+
+    def guardar(self, digest: str, tareas: List[dict], meta: Dict[str, Any]) -> bool:
+        """
+        Escribe filas y metadatos (reemplaza la entrada si existía) y desaloja las más viejas.
+        False si las filas no se pudieron escribir (p.ej. tipos que Arrow no acepta): no se cachea.
+        """
+        ruta = self._ruta(digest, _EXT_FILAS)
+        tmp = ruta + ".tmp"
+        try:
+            if pq is not None:
+                pq.write_table(pa.Table.from_pylist(tareas), tmp, compression="zstd")
+            else:
+                with open(tmp, "wb") as f:
+                    pickle.dump(tareas, f, protocol=pickle.HIGHEST_PROTOCOL)
+        except _ERRORES_ESCRITURA as e:
+            logger.warning("⚠️ No se pudo guardar el parseo %s en el cache: %s", digest[:12], e)
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            return False
+        os.replace(tmp, ruta)
+        try:
+            os.remove(self._ruta(digest, ".diff.json"))
+        except OSError:
+            pass
+        self._escribir_json(self._ruta(digest, ".json"), meta)
+
+        with self._lock:
+            self._lru[digest] = self._tamano(digest)
+            self._lru.move_to_end(digest)
+            desalojar = []
+            while len(self._lru) > 1 and (
+                len(self._lru) > self.max_entradas or sum(self._lru.values()) > self.max_bytes
+            ):
+                viejo, _ = self._lru.popitem(last=False)
+                desalojar.append(viejo)
+        for viejo in desalojar:
+            self._borrar(viejo)
+            logger.info("🧹 Parseo %s desalojado del cache", viejo[:12])
+        return True
+
+    def meta(self, digest: str) -> Optional[Dict[str, Any]]:
+        if not self._usar(digest):
+            return None
+        return self._leer_json(self._ruta(digest, ".json"))
+
+    def lotes(self, digest: str, tam_lote: int) -> Iterator[List[dict]]:
+        """Las tareas guardadas en lotes de a lo sumo `tam_lote` (Parquet se lee por partes)."""
+        if not self._usar(digest):
+            raise LookupError(f"No hay un parseo guardado para {digest}")
+        ruta = self._ruta(digest, _EXT_FILAS)
+        if pq is not None:
+            for batch in pq.ParquetFile(ruta).iter_batches(batch_size=tam_lote):
+                yield batch.to_pylist()
+        else:
+            with open(ruta, "rb") as f:
+                tareas = pickle.load(f)
+            for i in range(0, len(tareas), tam_lote):
+                yield tareas[i:i + tam_lote]
+
+    def diff(self, digest: str) -> Optional[Dict[str, Any]]:
+        """{"instancia", "generacion", "conteos", "existentes"} de la última previsualización, si hay."""
+        if not self._usar(digest):
+            return None
+        return self._leer_json(self._ruta(digest, ".diff.json"))
+
+    def guardar_diff(self, digest: str, diff: Dict[str, Any]) -> None:
+        if not self._usar(digest):
+            return
+        self._escribir_json(self._ruta(digest, ".diff.json"), diff)
+        with self._lock:
+            if digest in self._lru:
+                self._lru[digest] = self._tamano(digest)
+
+_cache: Optional[CacheParseos] = None
+_cache_lock = threading.Lock()
+
+def get_cache_parseos() -> CacheParseos:
+    """Instancia única sobre PARSE_CACHE_DIR (se crea en el primer uso)."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = CacheParseos()
+    return _cache
+
+def set_cache_parseos(cache: Optional[CacheParseos]) -> None:
+    """Reemplaza el cache en uso (benchmarks). None = volver a PARSE_CACHE_DIR."""
+    global _cache
+    with _cache_lock:
+        _cache = cache
@@ -1,7 +1,17 @@
+import io, os, csv, time
+import numpy as np
 import pandas as pd
-from typing import List, Any, Dict
-from datetime import datetime, date
-from io import BytesIO
+from typing import List, Dict, Iterator, Optional, Any, Tuple
+from datetime import date
+from openpyxl import load_workbook
+
+try:
+    from python_calamine import CalamineWorkbook   # lector en Rust, opcional
+except ImportError:
+    CalamineWorkbook = None
+
+from services.metricas import medir, observar
+from services.tareas_service import ESTADOS_CERRADOS
 
 # Estados canónicos para la UI / backend
 ESTADO_MAP = {
@@ -15,80 +25,80 @@ ESTADO_MAP = {
     "No efectivo": "No efectivo",
 }
 
-# ----------------- Helpers -----------------
-
-def _safe_date(val):
-    if val is None or (isinstance(val, float) and pd.isna(val)):
-        return None
-    s = str(val).strip()
-    if not s or s.lower() == "nan":
-        return None
-    for fmt in ("%d/%m/%Y", "%Y-%m-%d"):
-        try:
-            return datetime.strptime(s, fmt).date()
-        except Exception:
-            pass
-    try:
-        dt = pd.to_datetime(s, dayfirst=True, errors="coerce")
-        return dt.date() if pd.notna(dt) else None
-    except Exception:
-        return None
-
-def _limpiar_lista(val: Any) -> list:
-    if val is None or (isinstance(val, float) and pd.isna(val)):
-        return []
-    if isinstance(val, list):
-        items = [str(x).strip() for x in val]
-    else:
-        items = [x.strip() for x in str(val).split(";")]
-    return sorted({x for x in items if x})
+# Archivos que se aceptan en los uploads (sueltos o dentro de un .zip en los uploads por lote)
+EXTENSIONES_EXCEL = (".xlsx", ".xlsm", ".ods", ".csv")
 
-def _norm(s: str) -> str:
-    return (
-        s.lower()
-         .replace("\xa0", " ")
-         .strip()
-         .translate(str.maketrans("áéíóúñ", "aeioun"))
-         .replace("°", "")
-         .replace(".", "")
-         .replace("-", " ")
-    )
-
-def _build_renames(cols: list[str]) -> Dict[str, str]:
-    """Renombra cabeceras de Planner/canónicas a nombres canónicos de la tabla."""
-    syn: Dict[str, str] = {}
-    def add(canon: str, *aliases: str):
-        for a in aliases + (canon,):
-            syn[_norm(a)] = canon
+# Lector de .xlsx/.xlsm: auto | calamine | openpyxl. .ods necesita calamine; .csv se lee
+# siempre con el módulo csv. calamine es varias veces más rápido pero carga la hoja entera
+# en memoria; openpyxl read-only la recorre en streaming con memoria constante. En auto se
+# usa calamine (si está instalado) solo hasta EXCEL_CALAMINE_MAX_MB y openpyxl por encima.
+EXCEL_ENGINE = os.getenv("EXCEL_ENGINE", "auto").strip().lower()
+EXCEL_CALAMINE_MAX_MB = float(os.getenv("EXCEL_CALAMINE_MAX_MB", "20"))
 
-    add("id_tarea_planner", "Id. de tarea", "id de tarea", "id tarea", "id_tarea", "id")
-    add("estado", "Progreso", "Estado")
-    add("fecha_creacion", "Fecha de creación", "fecha de creacion")
-    add("fecha_vencimiento", "Fecha de vencimiento", "vencimiento", "due date")
-    add("fecha_finalizacion", "Fecha de finalización", "fecha de finalizacion")
-    add("nombre_tarea", "Nombre de la tarea", "titulo", "título")
-    add("descripcion", "Descripción", "descripcion", "description")
-    import pandas as pd
-from typing import List, Any, Dict
-from datetime import datetime, date
-from io import BytesIO
-
-# Estados canónicos para la UI / backend
-ESTADO_MAP = {
-    "No iniciado": "No iniciado",
-    "Informado": "En curso",                # tratar "Informado" como "En curso" si aplica
-    "En curso": "En curso",
-    "En procesos": "En curso",              # normalizar
-    "Completado": "Implementado",           # Planner → tablero
-    "Implementado": "Implementado",
-    "Efectividad verificada": "Efectividad verificada",
-    "No efectivo": "No efectivo",
-}
+# Filas por lote al leer el Excel en streaming (cada lote se normaliza por columnas)
+EXCEL_BATCH_SIZE = int(os.getenv("EXCEL_BATCH_SIZE", "5000"))
 
 # ----------------- Helpers -----------------
+# Normalización por columnas sobre cada lote: NaN/None se resuelven una sola vez
+# y las filas salen listas para JSON (fechas ISO, None en vez de NaN).
 
-def _limpiar_lista_vec(series: pd.Series) -> pd.Series:
-    return series.astype(str).apply(lambda x: sorted(list(set([item.strip() for item in x.split(';') if item.strip()]))))
+def _strip(col: pd.Series) -> pd.Series:
+    """Texto sin espacios en los bordes; NaN donde la celda no es texto."""
+    try:
+        return col.str.strip()
+    except AttributeError:
+        # columna sin ningún texto (solo números / fechas / vacías)
+        return pd.Series(np.nan, index=col.index, dtype=object)
+
+def _texto(col: pd.Series) -> pd.Series:
+    """
+    Celdas vacías (None / NaN / '') → NaN; el resto como str. Un número en una columna de
+    texto (2024, 1) queda "2024" / "1", igual que cuando se lee de vuelta de la base: el
+    row_hash de una fila recién parseada coincide con el de la misma fila guardada.
+    """
+    col = col.mask(_strip(col).eq(""))
+    return col.where(col.isna(), col.astype(str))
+
+def _fechas(col: pd.Series) -> pd.Series:
+    """
+    Celdas fecha de openpyxl, 'dd/mm/aaaa' o ISO → Timestamp (solo fecha); NaT si vacía o inválida.
+    Cada formato se prueba sobre toda la columna y el siguiente solo sobre lo que quedó sin parsear.
+    """
+    # datetime/date de openpyxl entran directo en el primer pase
+    fechas = pd.to_datetime(col, format="%d/%m/%Y", errors="coerce")
+    texto = _strip(col)
+    for fmt in ("ISO8601", "mixed"):
+        faltan = fechas.isna() & texto.notna() & texto.ne("")
+        if not faltan.any():
+            break
+        fechas[faltan] = pd.to_datetime(texto[faltan], format=fmt, dayfirst=True, errors="coerce")
+    return fechas.dt.normalize()
+
+def _iso(fechas: pd.Series) -> pd.Series:
+    """Timestamp → 'YYYY-MM-DD' con numpy (dt.strftime formatea fila por fila); NaT → NaN."""
+    texto = fechas.to_numpy(dtype="datetime64[D]").astype(str)
+    return pd.Series(texto, index=fechas.index, dtype=object).where(fechas.notna())
+
+def _listas(col: pd.Series) -> List[list]:
+    """'a; b;a' → ['a', 'b'] por fila (ordenada, sin repetidos ni vacíos); celda vacía → []."""
+    col = col.reset_index(drop=True)
+    items = col[col.notna()].astype(str).str.split(";").explode().str.strip()
+    items = items[items.ne("")]
+    pares = (
+        pd.DataFrame({"fila": items.index.to_numpy(), "valor": items.to_numpy()})
+          .drop_duplicates().sort_values(["fila", "valor"])
+    )
+    filas, valores = pares["fila"].to_numpy(), pares["valor"].to_numpy()
+
+    # los pares quedan agrupados por fila: se corta el arreglo donde cambia la fila
+    listas: List[list] = [[] for _ in range(len(col))]
+    if len(filas):
+        cortes = np.flatnonzero(np.diff(filas)) + 1
+        inicios, fines = np.r_[0, cortes], np.r_[cortes, len(filas)]
+        valores = valores.tolist()
+        for fila, a, b in zip(filas[inicios].tolist(), inicios.tolist(), fines.tolist()):
+            listas[fila] = valores[a:b]
+    return listas
 
 def _norm(s: str) -> str:
     return (
@@ -130,163 +140,253 @@ def _build_renames(cols: list[str]) -> Dict[str, str]:
             ren[c] = syn[key]
     return ren
 
-# ----------------- Parser -----------------
-
-def procesar_excel(file) -> List[dict]:
-    content = file.file.read()
-    df = pd.read_excel(BytesIO(content))
-    df.columns = [str(c).strip().replace("\xa0", " ") for c in df.columns]
-
-    renames = _build_renames(list(df.columns))
-    if renames:
-        df = df.rename(columns=renames)
-
-    print("🧭 Columnas (renombradas si aplica):", df.columns.tolist())
-
-    # Filter out rows with empty 'id_tarea_planner'
-    df = df[df['id_tarea_planner'].notna() & (df['id_tarea_planner'].astype(str).str.strip() != '')].copy()
-    df['id_tarea_planner'] = df['id_tarea_planner'].astype(str).str.strip()
+def _columna(df: pd.DataFrame, nombre: str) -> pd.Series:
+    return df[nombre] if nombre in df.columns else pd.Series(np.nan, index=df.index, dtype=object)
 
-    # Vectorize date parsing
-    for col in ["fecha_creacion", "fecha_vencimiento", "fecha_finalizacion"]:
-        if col in df.columns:
-            df[col] = pd.to_datetime(df[col], errors='coerce', dayfirst=True).dt.date
-
-    # Vectorize status mapping
-    if 'estado' in df.columns:
-        df['estado'] = df['estado'].astype(str).str.strip().map(ESTADO_MAP).fillna(df['estado'])
-
-    # Vectorize collaborator
-    if 'colaborador' in df.columns:
-        df['colaborador'] = df['colaborador'].astype(str).str.strip().replace('', 'Sin asignar').fillna('Sin asignar')
-    else:
-        df['colaborador'] = 'Sin asignar'
-
-    # Vectorize list cleaning for 'etiquetas' and 'checklist_items'
-    if 'etiquetas' in df.columns:
-        df['etiquetas'] = _limpiar_lista_vec(df['etiquetas'])
-    else:
-        df['etiquetas'] = [[]] * len(df)
-
-    if 'checklist_items' in df.columns:
-        df['checklist'] = _limpiar_lista_vec(df['checklist_items']).apply(lambda x: {'items': x} if x else None)
-    else:
-        df['checklist'] = [None] * len(df)
-
-    hoy = date.today()
+def _normalizar_lote(df: pd.DataFrame, hoy: date) -> List[dict]:
+    """Filas crudas (columnas canónicas) → tareas con las columnas de la tabla, JSON-safe."""
+    ids = _columna(df, "id_tarea_planner")
+    ids = ids[ids.notna()].astype(str).str.strip()
+    ids = ids[ids.ne("")]
+    df = df.loc[ids.index]
+    if df.empty:
+        return []
 
-    # Vectorize 'cerrada' and 'vencida' calculation
-    df['cerrada'] = df['estado'].isin(["Implementado", "Efectividad verificada", "No efectivo"])
-    df['vencida_calc'] = ((df['fecha_vencimiento'].notna()) & (hoy > df['fecha_vencimiento']) & (~df['cerrada']))
+    estado = _columna(df, "estado")
+    estado = estado[estado.notna()].astype(str).str.strip()
+    estado = estado.map(ESTADO_MAP).fillna(estado).reindex(df.index)
+
+    colaborador = _columna(df, "colaborador")
+    colaborador = colaborador[colaborador.notna()].astype(str).str.strip()
+    colaborador = colaborador[colaborador.ne("")].reindex(df.index).fillna("Sin asignar")
+
+    vencimiento = _fechas(_columna(df, "fecha_vencimiento"))
+    vencida = vencimiento.lt(pd.Timestamp(hoy)) & ~estado.isin(ESTADOS_CERRADOS)
+    # "retrasada" explícita en el archivo manda; si no, se calcula
+    retrasada = _columna(df, "retrasada")
+    retrasada = vencida.where(retrasada.isna(), retrasada.astype(bool)).astype(bool)
+
+    checklist = [{"items": items} if items else None for items in _listas(_columna(df, "checklist_items"))]
+    etiquetas = _listas(_columna(df, "etiquetas"))
+
+    out = pd.DataFrame({
+        "id_tarea_planner": ids,
+        "nombre_tarea": _texto(_columna(df, "nombre_tarea")),
+        "descripcion": _texto(_columna(df, "descripcion")),
+        "colaborador": colaborador,
+        "creado_por": _texto(_columna(df, "creado_por")),
+        "estado": estado,
+        "prioridad": _texto(_columna(df, "prioridad")),
+        "fecha_creacion": _iso(_fechas(_columna(df, "fecha_creacion"))),
+        "fecha_vencimiento": _iso(vencimiento),
+        "fecha_finalizacion": _iso(_fechas(_columna(df, "fecha_finalizacion"))),
+        "completado_por": _texto(_columna(df, "completado_por")),
+        "etiquetas": pd.Series(etiquetas, index=df.index, dtype=object),
+        "checklist": pd.Series(checklist, index=df.index, dtype=object),
+        "retrasada": retrasada,
+        "nombre_tablero": _texto(_columna(df, "nombre_tablero")),
+    })
+    # NaN/NaT → None columna por columna y armado de dicts con zip (to_dict("records") es mucho más lento)
+    nombres = list(out.columns)
+    valores = [out[c].astype(object).where(out[c].notna(), None).tolist() for c in nombres]
+    return [dict(zip(nombres, fila)) for fila in zip(*valores)]
+
+# ----------------- Lectores -----------------
+# Cada lector abre el archivo y devuelve una lista de hojas; cada hoja es un iterador
+# de filas crudas (cabecera primero) con None en las celdas vacías, como openpyxl.
+
+def motor_lectura(nombre: Optional[str], tamano: Optional[int] = None) -> str:
+    """
+    Lector que se usará para el archivo según su extensión, EXCEL_ENGINE y su tamaño en
+    bytes (en auto, por encima de EXCEL_CALAMINE_MAX_MB se lee en streaming con openpyxl).
+    """
+    ext = os.path.splitext(nombre or "")[1].lower() or ".xlsx"
+    if ext not in EXTENSIONES_EXCEL:
+        raise ValueError(f"Tipo de archivo no soportado: {nombre}")
+    if ext == ".csv":
+        return "csv"
+    if EXCEL_ENGINE not in ("auto", "calamine", "openpyxl"):
+        raise RuntimeError(f"EXCEL_ENGINE desconocido: {EXCEL_ENGINE!r} (auto | calamine | openpyxl)")
+    if ext == ".ods":
+        if CalamineWorkbook is None:
+            raise ValueError("Para leer .ods hay que instalar python-calamine")
+        return "calamine"
+    if EXCEL_ENGINE == "openpyxl" or CalamineWorkbook is None:
+        return "openpyxl"
+    if EXCEL_ENGINE == "auto" and tamano is not None and tamano > EXCEL_CALAMINE_MAX_MB * 2**20:
+        return "openpyxl"
+    return "calamine"
+
+def _tamano(origen) -> Optional[int]:
+    """Bytes de una ruta o de un archivo con seek (sin mover su posición); None si no se sabe."""
+    if isinstance(origen, (str, os.PathLike)):
+        return os.path.getsize(origen)
+    try:
+        pos = origen.tell()
+        fin = origen.seek(0, os.SEEK_END)
+        origen.seek(pos)
+        return fin
+    except (AttributeError, OSError):
+        return None
 
-    # Handle 'retrasada' column
-    if 'retrasada' in df.columns:
-        df['retrasada'] = df['retrasada'].fillna(False).astype(bool) | df['vencida_calc']
+def _hojas_openpyxl(origen, todas_las_hojas: bool):
+    wb = load_workbook(origen, read_only=True, data_only=True)
+    hojas = wb.worksheets if todas_las_hojas else wb.worksheets[:1]
+    return [ws.iter_rows(values_only=True) for ws in hojas], wb.close
+
+def _filas_calamine(hoja) -> Iterator[tuple]:
+    # calamine devuelve '' en celdas vacías y float en todo número (ids 123 → 123.0)
+    for fila in hoja.iter_rows():
+        yield tuple(
+            None if v == "" else int(v) if type(v) is float and v.is_integer() else v
+            for v in fila
+        )
+
+def _hojas_calamine(origen, todas_las_hojas: bool):
+    if isinstance(origen, (str, os.PathLike)):
+        wb = CalamineWorkbook.from_path(os.fspath(origen))
     else:
-        df['retrasada'] = df['vencida_calc']
-
-    # Select and rename columns to match the expected output dictionary structure
-    # Ensure all expected keys are present, even if they are None
-    output_columns = {
-        "id_tarea_planner": "id_tarea_planner",
-        "nombre_tarea": "nombre_tarea",
-        "descripcion": "descripcion",
-        "colaborador": "colaborador",
-        "creado_por": "creado_por",
-        "estado": "estado",
-        "prioridad": "prioridad",
-        "fecha_creacion": "fecha_creacion",
-        "fecha_vencimiento": "fecha_vencimiento",
-        "fecha_finalizacion": "fecha_finalizacion",
-        "completado_por": "completado_por",
-        "etiquetas": "etiquetas",
-        "checklist": "checklist",
-        "retrasada": "retrasada",
-        "nombre_tablero": "nombre_tablero",
-    }
-
-    # Ensure all output_columns are present in df, add as None if missing
-    for col_df, col_out in output_columns.items():
-        if col_df not in df.columns:
-            df[col_df] = None
-
-    # Convert DataFrame to list of dictionaries
-    tareas = df[list(output_columns.keys())].to_dict(orient='records')
-
-    print("🧾 Filas construidas:", len(tareas))
-    return tareas
-    add("creado_por", "Creado por")
-    add("completado_por", "Completado por")
-    add("etiquetas", "Etiquetas")
-    add("checklist_items", "Elementos de la lista de comprobación", "elementos de la lista de comprobacion", "checklist")
-    add("prioridad", "Priority", "Prioridad")
-    add("nombre_tablero", "Nombre del depósito", "Nombre del deposito", "tablero")
-
-    ren: Dict[str, str] = {}
-    for c in cols:
-        key = _norm(str(c))
-        if key in syn:
-            ren[c] = syn[key]
-    return ren
+        wb = CalamineWorkbook.from_filelike(origen)
+    n = len(wb.sheet_names) if todas_las_hojas else min(1, len(wb.sheet_names))
+    return [_filas_calamine(wb.get_sheet_by_index(i)) for i in range(n)], getattr(wb, "close", lambda: None)
+
+def _hojas_csv(origen, todas_las_hojas: bool):
+    binario = open(origen, "rb") if isinstance(origen, (str, os.PathLike)) else origen
+    texto = io.TextIOWrapper(binario, encoding="utf-8-sig", newline="")
+    # Excel en español exporta con ';'; se detecta con el comienzo del archivo
+    muestra = texto.read(64 * 1024)
+    texto.seek(0)
+    try:
+        dialecto = csv.Sniffer().sniff(muestra, delimiters=",;\t|")
+    except csv.Error:
+        dialecto = csv.excel
+    filas = (tuple(v if v != "" else None for v in fila) for fila in csv.reader(texto, dialecto))
+    # UploadFile.file no se cierra acá (es del request); detach lo deja abierto
+    cerrar = texto.close if binario is not origen else texto.detach
+    return [filas], cerrar
 
-def _obtener_colaborador(row: pd.Series) -> str:
-    v = row.get("colaborador")  # ya renombrado desde "Asignado a"
-    if pd.notna(v) and str(v).strip():
-        return str(v).strip()
-    return "Sin asignar"
+_LECTORES = {"openpyxl": _hojas_openpyxl, "calamine": _hojas_calamine, "csv": _hojas_csv}
 
 # ----------------- Parser -----------------
 
-def procesar_excel(file) -> List[dict]:
-    content = file.file.read()
-    df = pd.read_excel(BytesIO(content))
-    df.columns = [str(c).strip().replace("\xa0", " ") for c in df.columns]
-
-    renames = _build_renames(list(df.columns))
-    if renames:
-        df = df.rename(columns=renames)
-
-    print("🧭 Columnas (renombradas si aplica):", df.columns.tolist())
-
-    hoy = date.today()
-    tareas: List[dict] = []
-
-    for _, row in df.iterrows():
-        id_tarea = row.get("id_tarea_planner")
-        if pd.isna(id_tarea) or not str(id_tarea).strip():
-            continue
-
-        estado_in = str(row.get("estado")).strip() if pd.notna(row.get("estado")) else None
-        estado_tablero = ESTADO_MAP.get(estado_in, estado_in)
-
-        fecha_creacion     = _safe_date(row.get("fecha_creacion"))
-        fecha_vencimiento  = _safe_date(row.get("fecha_vencimiento"))
-        fecha_finalizacion = _safe_date(row.get("fecha_finalizacion"))
-
-        etiquetas = _limpiar_lista(row.get("etiquetas"))
-        checklist_items = _limpiar_lista(row.get("checklist_items"))
-
-        cerrada = estado_tablero in ("Implementado", "Efectividad verificada", "No efectivo")
-        vencida = bool(fecha_vencimiento and (hoy > fecha_vencimiento) and not cerrada)
-
-        # ⚠️ SOLO columnas que existen en la tabla
-        tareas.append({
-            "id_tarea_planner": str(id_tarea).strip(),
-            "nombre_tarea": row.get("nombre_tarea"),
-            "descripcion": row.get("descripcion"),
-            "colaborador": _obtener_colaborador(row),
-            "creado_por": row.get("creado_por"),
-            "estado": estado_tablero,
-            "prioridad": row.get("prioridad"),
-            "fecha_creacion": fecha_creacion,
-            "fecha_vencimiento": fecha_vencimiento,
-            "fecha_finalizacion": fecha_finalizacion,
-            "completado_por": row.get("completado_por"),
-            "etiquetas": etiquetas,
-            "checklist": {"items": checklist_items} if checklist_items else None,
-            "retrasada": bool(row.get("retrasada")) if pd.notna(row.get("retrasada")) else vencida,
-            "nombre_tablero": row.get("nombre_tablero"),
+def _sumar(lectura: Optional[Dict[str, Any]], fase: str, segundos: float) -> None:
+    """observar() + acumulado por archivo para el resultado del upload."""
+    observar(fase, segundos)
+    if lectura is not None:
+        clave = "segundos_normalizar" if fase == "excel_normalizar" else "segundos_lectura"
+        lectura[clave] = lectura.get(clave, 0.0) + segundos
+
+def _lotes_hoja(
+    filas: Iterator[tuple], tam_lote: int, hoy: date, lectura: Optional[Dict[str, Any]] = None,
+) -> Iterator[List[dict]]:
+    """Cabecera + filas crudas de una hoja → lotes de tareas normalizadas."""
+    t0 = time.perf_counter()
+    cabecera = next(filas, None)
+    if cabecera is None:
+        return
+    cols = [str(c).strip().replace("\xa0", " ") if c is not None else "" for c in cabecera]
+    renames = _build_renames(cols)
+
+    # índice de columna → nombre canónico (si hay alias repetidos, gana el primero)
+    indices: Dict[str, int] = {}
+    for i, c in enumerate(cols):
+        canon = renames.get(c, c)
+        if canon and canon not in indices:
+            indices[canon] = i
+
+    if lectura is not None:
+        # mapeo de cabeceras para /upload-tareas/preview
+        lectura.setdefault("hojas", []).append({
+            "columnas": {c: renames[c] for c in cols if c in renames},
+            "sin_mapear": [c for c in cols if c and c not in renames],
+            "omitida": "id_tarea_planner" not in indices,
         })
+    if "id_tarea_planner" not in indices:
+        # hojas de resumen / gráficos que vienen en el mismo libro
+        print("⏭️ Hoja sin columna de id de tarea, se omite:", cols[:5])
+        return
+    print("🧭 Columnas (renombradas si aplica):", list(indices.keys()))
+
+    canonicas, posiciones = list(indices.keys()), list(indices.values())
+
+    def normalizar(crudas: List[tuple]) -> List[dict]:
+        t = time.perf_counter()
+        # dtype=object: ids/números enteros no pasan a float por las celdas vacías;
+        # filas de distinto largo: DataFrame completa con NaN
+        df = pd.DataFrame(crudas, dtype=object).reindex(columns=posiciones)
+        df.columns = canonicas
+        lote = _normalizar_lote(df, hoy)
+        _sumar(lectura, "excel_normalizar", time.perf_counter() - t)
+        return lote
+
+    crudas: List[tuple] = []
+    total = 0
+    for valores in filas:
+        crudas.append(valores)
+        if len(crudas) >= tam_lote:
+            # lectura/decodificación del archivo de este lote
+            _sumar(lectura, "excel_lectura", time.perf_counter() - t0)
+            lote = normalizar(crudas)
+            crudas = []
+            if lote:
+                total += len(lote)
+                yield lote
+            t0 = time.perf_counter()
+
+    if crudas:
+        _sumar(lectura, "excel_lectura", time.perf_counter() - t0)
+        lote = normalizar(crudas)
+        if lote:
+            total += len(lote)
+            yield lote
+    print("🧾 Filas construidas:", total)
+
+def iterar_lotes_excel(
+    origen, tam_lote: int = EXCEL_BATCH_SIZE, todas_las_hojas: bool = False,
+    nombre: Optional[str] = None, lectura: Optional[Dict[str, Any]] = None,
+) -> Iterator[List[dict]]:
+    """
+    Lee el archivo fila a fila (sin DataFrame completo) y devuelve las tareas
+    normalizadas en lotes de a lo sumo `tam_lote`. Por defecto solo la primera hoja;
+    todas_las_hojas=True recorre todas (las que no tienen id se omiten).
+    `origen` puede ser una ruta o un archivo binario con seek (p.ej. UploadFile.file);
+    en ese caso `nombre` indica el tipo (.xlsx/.xlsm/.ods/.csv).
+    Si se pasa `lectura`, se completa con motor_excel, segundos_lectura, segundos_normalizar
+    y el mapeo de cabeceras de cada hoja (hojas).
+    """
+    if nombre is None and isinstance(origen, (str, os.PathLike)):
+        nombre = os.fspath(origen)
+    motor = motor_lectura(nombre, _tamano(origen))
+    if lectura is not None:
+        lectura.update(motor_excel=motor, segundos_lectura=0.0, segundos_normalizar=0.0)
+
+    t0 = time.perf_counter()
+    with medir("excel_abrir"):
+        hojas, cerrar = _LECTORES[motor](origen, todas_las_hojas)
+    if lectura is not None:
+        lectura["segundos_lectura"] += time.perf_counter() - t0
+    try:
+        hoy = date.today()
+        for filas in hojas:
+            yield from _lotes_hoja(filas, tam_lote, hoy, lectura)
+    finally:
+        cerrar()
+
+def parsear_archivo(ruta: str) -> Tuple[List[dict], Dict[str, Any]]:
+    """
+    Todas las tareas de todas las hojas de un archivo, más los datos de lectura.
+    Pensada para correr en un proceso aparte (uploads por lote): recibe una ruta
+    y devuelve datos picklables.
+    """
+    tareas: List[dict] = []
+    lectura: Dict[str, Any] = {}
+    for lote in iterar_lotes_excel(ruta, todas_las_hojas=True, lectura=lectura):
+        tareas.extend(lote)
+    return tareas, lectura
 
-    print("🧾 Filas construidas:", len(tareas))
+def procesar_excel(file) -> List[dict]:
+    """Versión no-streaming: todas las tareas del archivo en una sola lista."""
+    tareas: List[dict] = []
+    for lote in iterar_lotes_excel(file.file, nombre=getattr(file, "filename", None)):
+        tareas.extend(lote)
     return tareas
@@ -0,0 +1,87 @@
+import io, os, csv, json, tempfile
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Tuple
+
+from services.tareas_service import COMPARE_FIELDS
+
+# Columnas exportadas, en este orden
+EXPORT_COLUMNS = ["id_tarea_planner"] + COMPARE_FIELDS
+
+# Filas que se acumulan antes de emitir un trozo CSV/NDJSON
+EXPORT_FLUSH = 500
+
+def _celda(v: Any) -> Any:
+    """Valor plano para CSV/XLSX: listas y checklist como 'a;b' (igual que Planner)."""
+    if isinstance(v, list):
+        return ";".join(str(x) for x in v)
+    if isinstance(v, dict):
+        items = v.get("items")
+        if isinstance(items, list):
+            return ";".join(str(x) for x in items)
+        return json.dumps(v, ensure_ascii=False)
+    return v
+
+def _por_tandas(filas: Iterable[dict], n: int = EXPORT_FLUSH) -> Iterator[List[dict]]:
+    tanda: List[dict] = []
+    for f in filas:
+        tanda.append(f)
+        if len(tanda) >= n:
+            yield tanda
+            tanda = []
+    if tanda:
+        yield tanda
+
+def exportar_csv(filas: Iterable[dict]) -> Iterator[bytes]:
+    buf = io.StringIO()
+    w = csv.writer(buf)
+    # BOM para que Excel detecte UTF-8 (acentos)
+    buf.write("\ufeff")
+    w.writerow(EXPORT_COLUMNS)
+    for tanda in _por_tandas(filas):
+        for f in tanda:
+            w.writerow(["" if f.get(c) is None else _celda(f.get(c)) for c in EXPORT_COLUMNS])
+        yield buf.getvalue().encode("utf-8")
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode("utf-8")
+
+def exportar_ndjson(filas: Iterable[dict]) -> Iterator[bytes]:
+    for tanda in _por_tandas(filas):
+        yield "".join(
+            json.dumps({c: f.get(c) for c in EXPORT_COLUMNS}, ensure_ascii=False, default=str) + "\n"
+            for f in tanda
+        ).encode("utf-8")
+
+def exportar_xlsx(filas: Iterable[dict]) -> Iterator[bytes]:
+    """
+    openpyxl en modo write-only (las filas no quedan en memoria). El zip del .xlsx
+    recién existe al guardar, así que se arma en un temporal y después se transmite.
+    """
+    from openpyxl import Workbook   # solo al exportar .xlsx (no en el arranque)
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("tareas")
+    ws.append(EXPORT_COLUMNS)
+    for f in filas:
+        ws.append([_celda(f.get(c)) for c in EXPORT_COLUMNS])
+
+    fd, ruta = tempfile.mkstemp(suffix=".xlsx")
+    os.close(fd)
+    try:
+        wb.save(ruta)
+        with open(ruta, "rb") as fh:
+            while True:
+                trozo = fh.read(64 * 1024)
+                if not trozo:
+                    break
+                yield trozo
+    finally:
+        os.remove(ruta)
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# formato → (media_type, generador de bytes)
+EXPORTADORES: Dict[str, Callable[[Iterable[dict]], Tuple[str, Iterator[bytes]]]] = {
+    "csv": lambda filas: ("text/csv; charset=utf-8", exportar_csv(filas)),
+    "ndjson": lambda filas: ("application/x-ndjson", exportar_ndjson(filas)),
+    "xlsx": lambda filas: (XLSX_MEDIA_TYPE, exportar_xlsx(filas)),
+}
@@ -0,0 +1,136 @@
+import os, json, time, hashlib, threading
+from collections import Counter
+from typing import Dict, Any, Iterable, Optional, Tuple, Callable
+
+from services.cache import cache_consultas
+
+# Columnas que se exponen como facetas en /facetas
+FACET_COLUMNS = ["estado", "prioridad", "colaborador", "nombre_tablero", "etiquetas"]
+
+# Segundos antes de reconstruir el índice completo desde la base
+FACETAS_TTL = float(os.getenv("FACETAS_TTL", "600"))
+
+def _valores_fila(row: Dict[str, Any]) -> Tuple[Tuple[str, ...], ...]:
+    """Valores limpios de cada faceta para una fila (listas → varios valores)."""
+    out = []
+    for c in FACET_COLUMNS:
+        v = row.get(c)
+        items = v if isinstance(v, list) else ([] if v is None else [v])
+        out.append(tuple(sorted({str(x).strip() for x in items if str(x).strip()})))
+    return tuple(out)
+
+class IndiceFacetas:
+    """
+    Valores distintos + conteos por faceta, mantenido en memoria del proceso.
+    Se carga completo (con TTL) y se actualiza incrementalmente con cada upsert:
+    guarda la contribución de cada id_tarea_planner para poder restarla cuando cambia.
+    """
+
+    def __init__(self, ttl: float = FACETAS_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._carga_lock = threading.Lock()
+        self._por_id: Dict[str, Tuple[Tuple[str, ...], ...]] = {}
+        self._conteos: Dict[str, Counter] = {c: Counter() for c in FACET_COLUMNS}
+        self._cargado_en: Optional[float] = None
+        self._marca: Tuple[int, int] = (0, 0)
+        self._cargando = False
+        self._sucio = False
+        self._version = 0
+        self._etag: Optional[Tuple[int, str]] = None
+
+    def _sumar(self, valores, signo: int) -> None:
+        for c, vals in zip(FACET_COLUMNS, valores):
+            cnt = self._conteos[c]
+            for v in vals:
+                cnt[v] += signo
+                if cnt[v] <= 0:
+                    del cnt[v]
+
+    def vigente(self) -> bool:
+        """Cargado, dentro del TTL y sin escrituras de otros workers desde la carga."""
+        with self._lock:
+            if self._cargado_en is None or (time.time() - self._cargado_en) >= self.ttl:
+                return False
+            marca = self._marca
+        return not cache_consultas.cambios_ajenos(marca)
+
+    def asegurar(self, cargador: Callable[[], Iterable[Dict[str, Any]]]) -> None:
+        """Reconstruye el índice si venció; un solo hilo recarga, el resto espera."""
+        if self.vigente():
+            return
+        with self._carga_lock:
+            if self.vigente():
+                return
+            with self._lock:
+                self._cargando, self._sucio = True, False
+            marca = cache_consultas.marca()
+            try:
+                por_id: Dict[str, Tuple[Tuple[str, ...], ...]] = {}
+                for row in cargador():
+                    por_id[str(row.get("id_tarea_planner"))] = _valores_fila(row)
+            except Exception:
+                with self._lock:
+                    self._cargando = False
+                raise
+
+            with self._lock:
+                self._por_id = por_id
+                self._conteos = {c: Counter() for c in FACET_COLUMNS}
+                for valores in por_id.values():
+                    self._sumar(valores, 1)
+                # si hubo upserts durante la carga, el snapshot puede estar viejo
+                self._cargado_en = None if self._sucio else time.time()
+                self._marca = marca
+                self._cargando = False
+                self._version += 1
+
+    def aplicar(self, filas: Iterable[Dict[str, Any]]) -> None:
+        """Actualiza conteos con filas recién upserteadas (insertadas o modificadas)."""
+        with self._lock:
+            if self._cargando:
+                self._sucio = True
+                return
+            if self._cargado_en is None:
+                return
+            for row in filas:
+                id_ = str(row.get("id_tarea_planner"))
+                nuevos = _valores_fila(row)
+                viejos = self._por_id.get(id_)
+                if viejos == nuevos:
+                    continue
+                if viejos is not None:
+                    self._sumar(viejos, -1)
+                self._sumar(nuevos, 1)
+                self._por_id[id_] = nuevos
+                self._version += 1
+
+    def invalidar(self) -> None:
+        with self._lock:
+            self._cargado_en = None
+            if self._cargando:
+                self._sucio = True
+
+    def valores(self) -> Dict[str, list]:
+        with self._lock:
+            return {c: sorted(self._conteos[c]) for c in FACET_COLUMNS}
+
+    def conteos(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {c: dict(sorted(self._conteos[c].items())) for c in FACET_COLUMNS}
+
+    def etag(self) -> str:
+        """ETag por contenido (igual en todos los procesos con los mismos datos)."""
+        with self._lock:
+            if self._etag is None or self._etag[0] != self._version:
+                canon = json.dumps({c: sorted(self._conteos[c].items()) for c in FACET_COLUMNS},
+                                   ensure_ascii=False, separators=(",", ":"))
+                digest = hashlib.blake2b(canon.encode("utf-8"), digest_size=12).hexdigest()
+                self._etag = (self._version, f'"{digest}"')
+            return self._etag[1]
+
+indice_facetas = IndiceFacetas()
+
+def invalidar_facetas() -> None:
+    """Fuerza reconstruir el índice en la próxima consulta (p.ej. tras cambios por fuera de la API)."""
+    indice_facetas.invalidar()
@@ -0,0 +1,123 @@
+import os, sqlite3, threading
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# Huellas (id_tarea_planner → row_hash) de lo último que se escribió en la base, para
+# descartar filas sin cambios antes de consultar al motor (uploads en modo delta).
+# ":memory:" = solo mientras vive el proceso.
+HUELLAS_PATH = os.getenv("HUELLAS_PATH", "huellas.db")
+
+_ESQUEMA = """
+create table if not exists huellas (
+    id_tarea_planner text primary key,
+    row_hash text not null,
+    tablero text not null default '',
+    eliminada integer not null default 0
+);
+create index if not exists huellas_tablero_idx on huellas(tablero);
+"""
+
+# ids por sentencia `in (...)`
+_CHUNK = 900
+
+class HuellasLocales:
+    """
+    Almacén local de huellas sobre sqlite3. Se actualiza después de cada upsert exitoso
+    (en cualquier modo), así el modo delta parte de lo que realmente tiene la base.
+    Si la base se toca por fuera de la API, un upload en modo completo lo resincroniza.
+    """
+
+    def __init__(self, ruta: str = HUELLAS_PATH):
+        self.ruta = ruta
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(ruta, check_same_thread=False, timeout=30)
+        with self._lock, self._conn:
+            if ruta != ":memory:":
+                self._conn.execute("pragma journal_mode=wal")
+            self._conn.executescript(_ESQUEMA)
+
+    def separar(self, filas: Dict[str, dict], hash_field: str) -> Tuple[Dict[str, dict], List[str]]:
+        """
+        (filas nuevas o con cambios respecto de su huella, ids que estaban marcados como
+        eliminados y volvieron a aparecer).
+        """
+        ids = list(filas.keys())
+        conocidas: Dict[str, Tuple[str, int]] = {}
+        with self._lock:
+            for i in range(0, len(ids), _CHUNK):
+                chunk = ids[i:i+_CHUNK]
+                marcas = ",".join("?" * len(chunk))
+                for id_, h, elim in self._conn.execute(
+                    f"select id_tarea_planner, row_hash, eliminada from huellas where id_tarea_planner in ({marcas})",
+                    chunk,
+                ):
+                    conocidas[id_] = (h, elim)
+
+        cambiadas: Dict[str, dict] = {}
+        reaparecidas: List[str] = []
+        for id_, fila in filas.items():
+            huella = conocidas.get(id_)
+            if huella is None or huella[0] != fila[hash_field]:
+                cambiadas[id_] = fila
+            if huella is not None and huella[1]:
+                reaparecidas.append(id_)
+        return cambiadas, reaparecidas
+
+    def registrar(self, filas: Iterable[dict], hash_field: str) -> None:
+        """Guarda la huella de filas que ya están en la base (y las da por vigentes)."""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "insert into huellas (id_tarea_planner, row_hash, tablero, eliminada) values (?, ?, ?, 0)"
+                " on conflict(id_tarea_planner) do update set"
+                " row_hash=excluded.row_hash, tablero=excluded.tablero, eliminada=0",
+                ((f["id_tarea_planner"], f[hash_field], f.get("nombre_tablero") or "") for f in filas),
+            )
+
+    def vigentes(self, ids: List[str]) -> None:
+        """Quita la marca de eliminada (la tarea volvió a aparecer en un export)."""
+        with self._lock, self._conn:
+            for i in range(0, len(ids), _CHUNK):
+                chunk = ids[i:i+_CHUNK]
+                self._conn.execute(
+                    f"update huellas set eliminada = 0 where id_tarea_planner in ({','.join('?' * len(chunk))})", chunk
+                )
+
+    def faltantes(self, tableros: Set[Optional[str]], vistos: Set[str]) -> List[str]:
+        """Ids vigentes de esos tableros que no aparecen en `vistos` (no vinieron en el export)."""
+        claves = [t or "" for t in tableros]
+        faltan: List[str] = []
+        with self._lock:
+            for i in range(0, len(claves), _CHUNK):
+                chunk = claves[i:i+_CHUNK]
+                for (id_,) in self._conn.execute(
+                    f"select id_tarea_planner from huellas where eliminada = 0 and tablero in ({','.join('?' * len(chunk))})",
+                    chunk,
+                ):
+                    if id_ not in vistos:
+                        faltan.append(id_)
+        return faltan
+
+    def marcar_eliminadas(self, ids: List[str]) -> None:
+        with self._lock, self._conn:
+            for i in range(0, len(ids), _CHUNK):
+                chunk = ids[i:i+_CHUNK]
+                self._conn.execute(
+                    f"update huellas set eliminada = 1 where id_tarea_planner in ({','.join('?' * len(chunk))})", chunk
+                )
+
+_huellas: Optional[HuellasLocales] = None
+_huellas_lock = threading.Lock()
+
+def get_huellas() -> HuellasLocales:
+    """Instancia única sobre HUELLAS_PATH (se crea en el primer uso)."""
+    global _huellas
+    if _huellas is None:
+        with _huellas_lock:
+            if _huellas is None:
+                _huellas = HuellasLocales()
+    return _huellas
+
+def set_huellas(huellas: Optional[HuellasLocales]) -> None:
+    """Reemplaza el almacén en uso (benchmarks). None = volver a HUELLAS_PATH."""
+    global _huellas
+    with _huellas_lock:
+        _huellas = huellas
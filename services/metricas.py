@@ -0,0 +1,95 @@
+import os, time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from prometheus_client import CollectorRegistry, Counter, Histogram, multiprocess
+from prometheus_client.core import REGISTRY, CounterMetricFamily, GaugeMetricFamily
+
+from services.cache import cache_consultas
+
+# Buckets de 1 ms a ~30 s: sirven tanto para un chunk de PostgREST como para un upload entero
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+FASES = Histogram(
+    "api_fase_segundos", "Duración de cada fase de la ingesta y las consultas", ["fase"], buckets=BUCKETS,
+)
+SUPABASE_CHUNK = Histogram(
+    "supabase_chunk_segundos", "Latencia por chunk/request contra PostgREST (incluye reintentos)", ["op"], buckets=BUCKETS,
+)
+SUPABASE_REINTENTOS = Counter(
+    "supabase_reintentos", "Reintentos hechos por _retry", ["op"],
+)
+FILTRAR = Histogram(
+    "filtrar_tareas_segundos", "Latencia de filtrar_tareas por combinación de filtros", ["forma", "cache"], buckets=BUCKETS,
+)
+HTTP = Histogram(
+    "http_request_segundos", "Duración de los requests HTTP por ruta", ["metodo", "ruta", "status"], buckets=BUCKETS,
+)
+
+# Fases medidas en el request actual (None fuera de un request: jobs de upload, scripts)
+_server_timing: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("server_timing", default=None)
+
+def observar(fase: str, segundos: float) -> None:
+    FASES.labels(fase).observe(segundos)
+    tiempos = _server_timing.get()
+    if tiempos is not None:
+        tiempos.append((fase, segundos))
+
+@contextmanager
+def medir(fase: str) -> Iterator[None]:
+    """Mide el bloque en api_fase_segundos{fase} y lo suma al Server-Timing del request (si hay)."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        observar(fase, time.perf_counter() - t0)
+
+def iniciar_server_timing() -> List[Tuple[str, float]]:
+    tiempos: List[Tuple[str, float]] = []
+    _server_timing.set(tiempos)
+    return tiempos
+
+def server_timing_header(tiempos: List[Tuple[str, float]], total: float) -> str:
+    """'fase;dur=12.3, ...' (ms, sumando repeticiones de la misma fase) + total."""
+    por_fase: Dict[str, float] = {}
+    for fase, seg in tiempos:
+        por_fase[fase] = por_fase.get(fase, 0.0) + seg
+    partes = [f"{fase};dur={seg * 1000:.1f}" for fase, seg in por_fase.items()]
+    partes.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(partes)
+
+def forma_filtros(filtros: Dict[str, object]) -> str:
+    """Nombres de los filtros usados, ordenados ('estados+q'); acota la cardinalidad del label."""
+    return "+".join(sorted(k for k, v in filtros.items() if v not in (None, [], ""))) or "sin_filtros"
+
+class _CacheCollector:
+    """Expone los contadores de CacheTTL (ya llevan hits/misses) sin duplicarlos."""
+
+    def collect(self):
+        hits = CounterMetricFamily("cache_hits", "Hits del cache de consultas", labels=["cache"])
+        misses = CounterMetricFamily("cache_misses", "Misses del cache de consultas", labels=["cache"])
+        entradas = GaugeMetricFamily("cache_entradas", "Entradas vigentes en el cache", labels=["cache"])
+        hit_rate = GaugeMetricFamily("cache_hit_rate", "hits / (hits + misses) desde el arranque", labels=["cache"])
+        st = cache_consultas.stats()
+        hits.add_metric([st["nombre"]], st["hits"])
+        misses.add_metric([st["nombre"]], st["misses"])
+        entradas.add_metric([st["nombre"]], st["entradas"])
+        hit_rate.add_metric([st["nombre"]], st["hit_rate"])
+        return [hits, misses, entradas, hit_rate]
+
+REGISTRY.register(_CacheCollector())
+
+def registro_metricas() -> CollectorRegistry:
+    """
+    Lo que expone /metrics. Con PROMETHEUS_MULTIPROC_DIR (varios workers, ver Dockerfile) los
+    histogramas y contadores se suman desde los archivos de todos los procesos; las métricas
+    del cache son las del worker que responde (entradas y generación ya son globales con
+    CACHE_BACKEND=sqlite).
+    """
+    if not os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        return REGISTRY
+    registro = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registro)
+    registro.register(_CacheCollector())
+    return registro
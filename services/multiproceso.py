@@ -0,0 +1,73 @@
+import os, hashlib, tempfile, threading
+from contextlib import ExitStack, contextmanager
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+try:
+    import fcntl   # locks entre procesos (Linux / macOS)
+except ImportError:   # sin fcntl los locks solo valen dentro del proceso
+    fcntl = None
+
+# Procesos de uvicorn (--workers, ver Dockerfile). Con más de uno, el cache de consultas,
+# el registro de jobs y los locks de upload pasan a archivos compartidos en COMPARTIDO_DIR.
+WEB_CONCURRENCY = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+MULTIPROCESO = WEB_CONCURRENCY > 1
+COMPARTIDO_DIR = os.getenv("COMPARTIDO_DIR") or os.path.join(tempfile.gettempdir(), "api_compartido")
+
+def ruta_compartida(nombre: str) -> str:
+    """Ruta de un archivo en COMPARTIDO_DIR (la carpeta se crea si falta)."""
+    os.makedirs(COMPARTIDO_DIR, exist_ok=True)
+    return os.path.join(COMPARTIDO_DIR, nombre)
+
+_locks_locales: Dict[str, threading.Lock] = {}
+_locks_locales_lock = threading.Lock()
+
+def _lock_local(nombre: str) -> threading.Lock:
+    with _locks_locales_lock:
+        return _locks_locales.setdefault(nombre, threading.Lock())
+
+@contextmanager
+def bloqueo(nombre: str, esperar: bool = True) -> Iterator[bool]:
+    """
+    Lock exclusivo por nombre entre hilos y procesos (flock sobre COMPARTIDO_DIR/locks/<nombre>.lock;
+    cada entrada abre su propio descriptor, así también excluye a otros hilos del mismo proceso).
+    esperar=False no bloquea: entrega False si otro lo tiene.
+    """
+    if fcntl is None:
+        lock = _lock_local(nombre)
+        tomado = lock.acquire(esperar)
+        try:
+            yield tomado
+        finally:
+            if tomado:
+                lock.release()
+        return
+
+    ruta = ruta_compartida(os.path.join("locks", nombre + ".lock"))
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    with open(ruta, "a+") as fh:
+        try:
+            fcntl.flock(fh, fcntl.LOCK_EX if esperar else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+
+def _nombre_tablero(tablero: Any) -> str:
+    # str(): las filas armadas a mano (insertar_tareas) pueden traer un número
+    if tablero is None or tablero == "":
+        return "tablero-sin_nombre"
+    return "tablero-" + hashlib.blake2b(str(tablero).encode("utf-8"), digest_size=10).hexdigest()
+
+@contextmanager
+def bloquear_tableros(tableros: Iterable[Optional[str]]) -> Iterator[None]:
+    """
+    Locks de escritura de varios nombre_tablero, tomados siempre en el mismo orden
+    (dos uploads con tableros en común no se trancan entre sí).
+    """
+    with ExitStack() as pila:
+        for nombre in sorted({_nombre_tablero(t) for t in tableros}):
+            pila.enter_context(bloqueo(nombre))
+        yield
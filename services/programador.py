@@ -0,0 +1,79 @@
+import os, logging, threading
+from datetime import datetime, timedelta
+from typing import Any, Callable, Optional
+
+from services.multiproceso import bloqueo, ruta_compartida
+
+logger = logging.getLogger("api.programador")
+
+# Hora local (HH:MM) del recálculo diario de `retrasada`; vacío = desactivado
+RETRASADAS_HORA = os.getenv("RETRASADAS_HORA", "00:05").strip()
+
+def _proxima(ahora: datetime, hora: str) -> datetime:
+    """Próxima ocurrencia de `hora` (HH:MM) estrictamente después de `ahora`."""
+    hh, mm = (int(x) for x in hora.split(":"))
+    prox = ahora.replace(hour=hh, minute=mm, second=0, microsecond=0)
+    if prox <= ahora:
+        prox += timedelta(days=1)
+    return prox
+
+def _turno(ahora: datetime, hora: str) -> str:
+    """La última ocurrencia de `hora` hasta `ahora` (la corrida que corresponde)."""
+    return (_proxima(ahora, hora) - timedelta(days=1)).isoformat(timespec="minutes")
+
+class ProgramadorDiario:
+    """
+    Corre `tarea` en un hilo de fondo al iniciar (para ponerse al día si la app estuvo
+    apagada a la hora programada) y después una vez por día a `hora`.
+    Un error se loguea y no corta el ciclo.
+
+    Con varios workers cada uno tiene su programador, pero cada turno corre una sola vez:
+    el que toma el lock la ejecuta y anota el turno en COMPARTIDO_DIR; el resto lo saltea.
+    """
+
+    def __init__(self, nombre: str, tarea: Callable[[], Any], hora: str):
+        _proxima(datetime.now(), hora)   # valida el formato al crear
+        self.nombre = nombre
+        self.tarea = tarea
+        self.hora = hora
+        self._parar = threading.Event()
+        self._hilo: Optional[threading.Thread] = None
+
+    def _correr(self) -> None:
+        turno = _turno(datetime.now(), self.hora)
+        marca = ruta_compartida(f"programador-{self.nombre}.turno")
+        with bloqueo(f"programador-{self.nombre}", esperar=False) as tomado:
+            if not tomado:
+                logger.info("⏭️ %s: la está corriendo otro worker", self.nombre)
+                return
+            try:
+                with open(marca) as fh:
+                    if fh.read().strip() == turno:
+                        logger.info("⏭️ %s: el turno %s ya se corrió", self.nombre, turno)
+                        return
+            except OSError:
+                pass
+            try:
+                resultado = self.tarea()
+            except Exception:
+                logger.exception("❌ Falló la tarea programada %s", self.nombre)
+                return
+            with open(marca, "w") as fh:
+                fh.write(turno)
+            logger.info("⏰ %s (%s): %s", self.nombre, turno, resultado)
+
+    def _ciclo(self) -> None:
+        self._correr()
+        while True:
+            espera = (_proxima(datetime.now(), self.hora) - datetime.now()).total_seconds()
+            if self._parar.wait(max(espera, 0)):
+                return
+            self._correr()
+
+    def iniciar(self) -> None:
+        if self._hilo is None:
+            self._hilo = threading.Thread(target=self._ciclo, name=self.nombre, daemon=True)
+            self._hilo.start()
+
+    def detener(self) -> None:
+        self._parar.set()
@@ -0,0 +1,181 @@
+import os, json, sqlite3, threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+from services.multiproceso import MULTIPROCESO, ruta_compartida
+
+# Estado de los jobs de upload, digests y Idempotency-Key. Con un solo worker alcanza la
+# memoria del proceso; con varios va a un archivo para que cualquiera responda /upload-jobs/{id}
+# y el dedupe valga entre workers.
+UPLOAD_JOBS_PATH = os.getenv("UPLOAD_JOBS_PATH") or (ruta_compartida("upload_jobs.db") if MULTIPROCESO else ":memory:")
+
+_ESQUEMA = """
+create table if not exists jobs (
+    job_id text primary key,
+    fase text not null,
+    creado real not null,
+    datos text not null
+);
+create index if not exists jobs_creado_idx on jobs(creado);
+create table if not exists digests (
+    clave text primary key,
+    job_id text not null,
+    instancia text,
+    generacion integer,
+    resultado text,
+    usado integer not null
+);
+create index if not exists digests_job_idx on digests(job_id);
+create table if not exists claves (
+    clave text primary key,
+    job_id text not null,
+    clave_digest text not null,
+    usado integer not null
+);
+create index if not exists claves_job_idx on claves(job_id);
+"""
+
+def _cargar(texto: Optional[str]) -> Any:
+    return None if texto is None else json.loads(texto)
+
+class RegistroJobs:
+    """
+    Jobs, digests ya procesados e Idempotency-Key sobre sqlite3. Las lecturas y escrituras
+    que tienen que ser atómicas (chequear dedupe y dar de alta) van dentro de transaccion(),
+    que toma el lock de escritura de la base también frente a otros procesos.
+    Las claves de digest son (digest, modo, detectar_eliminadas) serializadas a JSON.
+    """
+
+    def __init__(self, ruta: str = UPLOAD_JOBS_PATH):
+        self.ruta = ruta
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(ruta, check_same_thread=False, isolation_level=None, timeout=30)
+        self._en_transaccion = False
+        with self._lock:
+            if ruta != ":memory:":
+                self._conn.execute("pragma journal_mode=wal")
+            self._conn.executescript(_ESQUEMA)
+
+    @contextmanager
+    def transaccion(self) -> Iterator["RegistroJobs"]:
+        with self._lock:
+            if self._en_transaccion:
+                yield self
+                return
+            self._conn.execute("begin immediate")
+            self._en_transaccion = True
+            try:
+                yield self
+            except BaseException:
+                self._conn.execute("rollback")
+                raise
+            else:
+                self._conn.execute("commit")
+            finally:
+                self._en_transaccion = False
+
+    # ---- jobs ----
+
+    def job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            fila = self._conn.execute("select datos from jobs where job_id = ?", (job_id,)).fetchone()
+        return None if fila is None else json.loads(fila[0])
+
+    def guardar_job(self, job: Dict[str, Any]) -> None:
+        with self._lock:
+            self._conn.execute(
+                "insert or replace into jobs (job_id, fase, creado, datos) values (?, ?, ?, ?)",
+                (job["job_id"], job["fase"], job["creado"], json.dumps(job, ensure_ascii=False)),
+            )
+
+    def actualizar(self, job_id: str, **campos: Any) -> None:
+        with self.transaccion():
+            job = self.job(job_id)
+            if job is not None:
+                job.update(campos)
+                self.guardar_job(job)
+
+    def recortar_jobs(self, maximo: int) -> None:
+        """Descarta los jobs terminados más viejos por encima de `maximo` (los en curso no)."""
+        with self._lock:
+            sobran = self._conn.execute("select count(*) from jobs").fetchone()[0] - maximo
+            if sobran > 0:
+                self._conn.execute(
+                    "delete from jobs where job_id in (select job_id from jobs"
+                    " where fase in ('completado', 'error') order by creado limit ?)", (sobran,),
+                )
+
+    # ---- digests / Idempotency-Key (LRU por `usado`) ----
+
+    def _usado(self, tabla: str) -> int:
+        return self._conn.execute(f"select coalesce(max(usado), 0) + 1 from {tabla}").fetchone()[0]
+
+    def _recortar(self, tabla: str, maximo: int) -> None:
+        sobran = self._conn.execute(f"select count(*) from {tabla}").fetchone()[0] - maximo
+        if sobran > 0:
+            self._conn.execute(
+                f"delete from {tabla} where clave in (select clave from {tabla} order by usado limit ?)", (sobran,),
+            )
+
+    def digest(self, clave: tuple) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            fila = self._conn.execute(
+                "select job_id, instancia, generacion, resultado from digests where clave = ?", (json.dumps(clave),),
+            ).fetchone()
+        if fila is None:
+            return None
+        return {"job_id": fila[0], "instancia": fila[1], "generacion": fila[2], "resultado": _cargar(fila[3])}
+
+    def recordar_digest(self, clave: tuple, job_id: str, maximo: int) -> None:
+        with self._lock:
+            self._conn.execute(
+                "insert or replace into digests (clave, job_id, instancia, generacion, resultado, usado)"
+                " values (?, ?, null, null, null, ?)",
+                (json.dumps(clave), job_id, self._usado("digests")),
+            )
+            self._recortar("digests", maximo)
+
+    def completar_digests(self, job_id: str, instancia: str, generacion: int, resultado: Dict[str, Any]) -> None:
+        with self._lock:
+            self._conn.execute(
+                "update digests set instancia = ?, generacion = ?, resultado = ? where job_id = ?",
+                (instancia, generacion, json.dumps(resultado), job_id),
+            )
+
+    def clave(self, clave: str) -> Optional[tuple]:
+        """Idempotency-Key → (job_id, clave_digest)."""
+        with self._lock:
+            fila = self._conn.execute("select job_id, clave_digest from claves where clave = ?", (clave,)).fetchone()
+        return None if fila is None else (fila[0], tuple(json.loads(fila[1])))
+
+    def recordar_clave(self, clave: str, job_id: str, clave_digest: tuple, maximo: int) -> None:
+        with self._lock:
+            self._conn.execute(
+                "insert or replace into claves (clave, job_id, clave_digest, usado) values (?, ?, ?, ?)",
+                (clave, job_id, json.dumps(clave_digest), self._usado("claves")),
+            )
+            self._recortar("claves", maximo)
+
+    def olvidar_job(self, job_id: str) -> None:
+        """Un job que falló: su archivo y su Idempotency-Key se pueden volver a usar."""
+        with self.transaccion():
+            self._conn.execute("delete from digests where job_id = ?", (job_id,))
+            self._conn.execute("delete from claves where job_id = ?", (job_id,))
+
+_registro: Optional[RegistroJobs] = None
+_registro_lock = threading.Lock()
+
+def get_registro_jobs() -> RegistroJobs:
+    """Instancia única sobre UPLOAD_JOBS_PATH (se crea en el primer uso)."""
+    global _registro
+    if _registro is None:
+        with _registro_lock:
+            if _registro is None:
+                _registro = RegistroJobs()
+    return _registro
+
+def set_registro_jobs(registro: Optional[RegistroJobs]) -> None:
+    """Reemplaza el registro en uso (benchmarks). None = volver a UPLOAD_JOBS_PATH."""
+    global _registro
+    with _registro_lock:
+        _registro = registro
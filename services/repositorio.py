@@ -0,0 +1,149 @@
+import os, re, asyncio, threading, unicodedata
+from contextlib import nullcontext
+from typing import Any, ContextManager, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Motor de almacenamiento de `tareas`: supabase (por defecto) | sqlite
+TAREAS_BACKEND = os.getenv("TAREAS_BACKEND", "supabase").strip().lower()
+# Copia columnar en memoria para las lecturas (services/snapshot.py), por encima del motor
+TAREAS_SNAPSHOT = os.getenv("TAREAS_SNAPSHOT", "0").strip().lower() in ("1", "true", "si", "sí")
+
+# Filas por página al recorrer la tabla completa
+PAGINA_COMPLETA = 1000
+
+def palabras_busqueda(q: str) -> List[str]:
+    """
+    Palabras de `q` en minúsculas y sin acentos (mismo plegado que f_unaccent / _norm),
+    listas para armar consultas de texto con prefijo.
+    """
+    plano = unicodedata.normalize("NFKD", q.lower())
+    plano = "".join(ch for ch in plano if not unicodedata.combining(ch))
+    return re.findall(r"\w+", plano)
+
+# Claves de `filtros` que reciben los motores (todas presentes, None = sin filtro)
+CLAVES_FILTROS = (
+    "estados", "prioridades", "colaboradores", "tablero", "desde", "hasta", "q", "vencida",
+    "vencimiento_desde", "vencimiento_hasta", "finalizacion_desde", "finalizacion_hasta",
+)
+
+class RepositorioTareas:
+    """
+    Operaciones de almacenamiento que necesita tareas_service. El diff, los caches
+    y el cursor viven arriba; cada motor solo resuelve consultas y escrituras.
+
+    `filtros` llega ya normalizado: estados/prioridades/colaboradores (listas o None),
+    tablero, desde, hasta, q, vencida, vencimiento_desde/hasta, finalizacion_desde/hasta.
+    vencida=True/False filtra por la columna `retrasada` (la mantiene al día marcar_retrasadas).
+    """
+
+    def buscar_hashes(self, ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """id_tarea_planner → {"id", "id_tarea_planner", "row_hash"} de las filas que existen."""
+        raise NotImplementedError
+
+    def upsert(self, filas: List[dict]) -> None:
+        """Inserta o actualiza por id_tarea_planner."""
+        raise NotImplementedError
+
+    def marcar_eliminadas(self, ids: List[str], eliminada: bool = True) -> None:
+        """Pone `eliminada` (sql/004_eliminada.sql) en las tareas indicadas."""
+        raise NotImplementedError
+
+    def vencidas_sin_marcar(self, hoy: str, cerrados: Iterable[str]) -> List[dict]:
+        """
+        Tareas abiertas (estado NULL o fuera de `cerrados`) con fecha_vencimiento anterior a
+        `hoy` que todavía no tienen retrasada=true, con todas las columnas.
+        """
+        raise NotImplementedError
+
+    def marcar_retrasadas(self, hashes: Dict[str, Tuple[Optional[str], str]]) -> List[str]:
+        """
+        retrasada=true y el row_hash nuevo, en un solo update, en las tareas de `hashes`
+        (id_tarea_planner → (row_hash leído, row_hash nuevo)) que no cambiaron desde que se
+        leyeron: mismo row_hash y retrasada todavía sin marcar. Devuelve sus id_tarea_planner.
+        """
+        raise NotImplementedError
+
+    def consultar(
+        self, filtros: Dict[str, Any], order_by: str, desc: bool, limit: int, offset: int,
+        keyset: Optional[Tuple[Any, Any]], conteo: str, columnas: Optional[List[str]],
+    ) -> Tuple[List[dict], Optional[int]]:
+        """
+        Filas filtradas/ordenadas por (order_by, id) y total según `conteo` (None si "none").
+        `keyset` = (valor, id) de la última fila vista: devuelve las siguientes, con NULLs
+        ordenados como en Postgres (al final en asc, al principio en desc).
+        """
+        raise NotImplementedError
+
+    def filas_facetas(self) -> Iterable[dict]:
+        """Todas las filas con id_tarea_planner + columnas de facetas."""
+        raise NotImplementedError
+
+    def buscar(self, palabras: List[str], limit: int, tablero: Optional[str]) -> List[dict]:
+        """Tareas que contienen todas las palabras (como prefijo), de mayor a menor relevancia."""
+        raise NotImplementedError
+
+    def stats(self, params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Agregados de /tareas-stats calculados en el motor, o None si no los soporta."""
+        return None
+
+    def todas_las_filas(self) -> Iterator[dict]:
+        """La tabla completa, todas las columnas, en páginas por keyset sobre id."""
+        filtros = dict.fromkeys(CLAVES_FILTROS)
+        keyset = None
+        while True:
+            filas, _ = self.consultar(filtros, "id", False, PAGINA_COMPLETA, 0, keyset, "none", None)
+            yield from filas
+            if len(filas) < PAGINA_COMPLETA:
+                break
+            keyset = (filas[-1]["id"], filas[-1]["id"])
+
+    def agrupar_escrituras(self) -> ContextManager[None]:
+        """
+        Envuelve todas las escrituras de un upload: el motor puede dejar para el final lo que
+        rehace en cada una (p.ej. índices en memoria). Sin efecto por defecto.
+        """
+        return nullcontext()
+
+    def precargar(self) -> None:
+        """Carga al arrancar lo que el motor mantenga en memoria (nada por defecto)."""
+
+    async def ping_async(self) -> None:
+        """Consulta mínima para comprobar que el motor responde (lanza si no). Por defecto, en un hilo."""
+        await asyncio.to_thread(
+            self.consultar, dict.fromkeys(CLAVES_FILTROS), "id", False, 1, 0, None, "none", ["id"],
+        )
+
+    async def cerrar_async(self) -> None:
+        """Libera conexiones al apagar la app."""
+
+_repo: Optional[RepositorioTareas] = None
+_repo_lock = threading.Lock()
+
+def get_repositorio() -> RepositorioTareas:
+    """Instancia única del motor elegido en TAREAS_BACKEND (se crea en el primer uso)."""
+    global _repo
+    if _repo is None:
+        with _repo_lock:
+            if _repo is None:
+                if TAREAS_BACKEND == "sqlite":
+                    from services.sqlite_service import RepositorioSQLite
+                    _repo = RepositorioSQLite()
+                elif TAREAS_BACKEND == "supabase":
+                    from services.supabase_service import RepositorioSupabase
+                    _repo = RepositorioSupabase()
+                else:
+                    raise RuntimeError(f"TAREAS_BACKEND desconocido: {TAREAS_BACKEND!r} (supabase | sqlite)")
+                if TAREAS_SNAPSHOT:
+                    from services.snapshot import RepositorioSnapshot
+                    _repo = RepositorioSnapshot(_repo)
+    return _repo
+
+async def cerrar_repositorio() -> None:
+    """Shutdown de la app: cierra el motor si se llegó a crear."""
+    if _repo is not None:
+        await _repo.cerrar_async()
+
+def set_repositorio(repo: Optional[RepositorioTareas]) -> None:
+    """Reemplaza el motor en uso (benchmarks, réplicas locales). None = volver a elegir por env."""
+    global _repo
+    with _repo_lock:
+        _repo = repo
@@ -0,0 +1,358 @@
+import os, time, logging, threading
+from contextlib import contextmanager
+import numpy as np
+import pandas as pd
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from services.cache import cache_consultas
+from services.metricas import medir
+from services.repositorio import RepositorioTareas, palabras_busqueda
+
+logger = logging.getLogger("api.snapshot")
+
+# Segundos antes de recargar la copia completa desde el motor (cambios hechos por fuera de la API)
+SNAPSHOT_TTL = float(os.getenv("SNAPSHOT_TTL", "300"))
+
+# Columnas con código categórico + posiciones por valor (filtros `in` / igualdad y orden)
+CATEGORICAS = ("estado", "prioridad", "colaborador", "nombre_tablero")
+FECHAS = ("fecha_creacion", "fecha_vencimiento", "fecha_finalizacion")
+
+# (columna, clave en filtros) de los filtros por lista de valores
+_FILTROS_EN = (("estado", "estados"), ("prioridad", "prioridades"), ("colaborador", "colaboradores"))
+# (columna, clave en filtros, operador) de los rangos de fechas
+_RANGOS = (
+    ("fecha_creacion", "desde", ">="), ("fecha_creacion", "hasta", "<="),
+    ("fecha_vencimiento", "vencimiento_desde", ">="), ("fecha_vencimiento", "vencimiento_hasta", "<="),
+    ("fecha_finalizacion", "finalizacion_desde", ">="), ("fecha_finalizacion", "finalizacion_hasta", "<="),
+)
+
+def _dia(valor: Any) -> np.datetime64:
+    try:
+        return np.datetime64(str(valor)[:10], "D")
+    except ValueError:
+        raise ValueError(f"fecha inválida: {valor!r}")
+
+class _Columnas:
+    """
+    Copia columnar e inmutable de la tabla: se arma de nuevo completa (fuera del lock)
+    y se reemplaza de una vez, así las lecturas no necesitan lock.
+    """
+
+    def __init__(self, filas: List[dict]):
+        self.filas = filas
+        self.n = len(filas)
+        self.ids = np.array([f.get("id") for f in filas], dtype=np.int64)
+
+        # categorías ordenadas (el código respeta el orden de los valores) y posiciones de cada valor
+        self.categorias: Dict[str, np.ndarray] = {}
+        self.codigos: Dict[str, np.ndarray] = {}
+        self.posiciones: Dict[str, Dict[str, np.ndarray]] = {}
+        for col in CATEGORICAS:
+            cat = pd.Categorical([None if f.get(col) is None else str(f.get(col)) for f in filas])
+            codigos = cat.codes.astype(np.int32)
+            orden = np.argsort(codigos, kind="stable")
+            cortes = np.searchsorted(codigos[orden], np.arange(len(cat.categories) + 1))
+            self.categorias[col] = np.asarray(cat.categories, dtype=object)
+            self.codigos[col] = codigos
+            self.posiciones[col] = {
+                v: orden[cortes[i]:cortes[i + 1]] for i, v in enumerate(cat.categories.tolist())
+            }
+
+        self.retrasada = np.array([f.get("retrasada") is True for f in filas], dtype=bool)
+        self.fechas = {
+            col: np.array([f.get(col) and str(f.get(col))[:10] for f in filas], dtype="datetime64[D]")
+            for col in FECHAS
+        }
+
+        # texto para `q`: palabras sin acentos (prefijo, como el FTS) y texto en minúsculas (como ILIKE)
+        nombres = [f.get("nombre_tarea") or "" for f in filas]
+        descripciones = [f.get("descripcion") or "" for f in filas]
+        self.palabras = pd.Series(
+            [" " + " ".join(palabras_busqueda(a + " " + b)) for a, b in zip(nombres, descripciones)], dtype=object,
+        )
+        self.texto = pd.Series([(a + "\n" + b).lower() for a, b in zip(nombres, descripciones)], dtype=object)
+
+        self._ordenes: Dict[str, np.ndarray] = {}
+
+    def clave(self, col: str) -> np.ndarray:
+        """Clave numérica de orden (NULL = +inf: al final en asc y al principio en desc, como Postgres)."""
+        if col == "id":
+            return self.ids.astype(np.float64)
+        if col in self.codigos:
+            k = self.codigos[col].astype(np.float64)
+            k[self.codigos[col] < 0] = np.inf
+        else:
+            fechas = self.fechas[col]
+            k = fechas.astype(np.int64).astype(np.float64)
+            k[np.isnat(fechas)] = np.inf
+        return k
+
+    def orden(self, col: str) -> np.ndarray:
+        """Posiciones ordenadas por (col, id) ascendente; desc = la misma al revés."""
+        perm = self._ordenes.get(col)
+        if perm is None:
+            perm = self._ordenes[col] = np.lexsort((self.ids, self.clave(col)))
+        return perm
+
+    def codificar(self, col: str, valor: Any) -> float:
+        """Valor del cursor en el espacio de clave(col) (si ya no existe, cae entre sus vecinos)."""
+        if valor is None:
+            return np.inf
+        if col in self.categorias:
+            cats = self.categorias[col]
+            i = int(np.searchsorted(cats, str(valor)))
+            return float(i) if i < len(cats) and cats[i] == str(valor) else i - 0.5
+        if col == "id":
+            return float(valor)
+        return float(_dia(valor).astype(np.int64))
+
+    def mascara(self, f: Dict[str, Any]) -> np.ndarray:
+        mask = np.ones(self.n, dtype=bool)
+        en = [(col, f[clave]) for col, clave in _FILTROS_EN if f[clave]]
+        if f["tablero"]:
+            en.append(("nombre_tablero", [f["tablero"]]))
+        for col, valores in en:
+            m = np.zeros(self.n, dtype=bool)
+            for v in valores:
+                pos = self.posiciones[col].get(v)
+                if pos is not None:
+                    m[pos] = True
+            mask &= m
+
+        if f["vencida"] is not None:
+            mask &= self.retrasada if f["vencida"] else ~self.retrasada
+
+        for col, clave, op in _RANGOS:
+            if f[clave]:
+                d = _dia(f[clave])
+                mask &= (self.fechas[col] >= d) if op == ">=" else (self.fechas[col] <= d)
+
+        if f["q"]:
+            palabras = palabras_busqueda(f["q"])
+            if palabras:
+                for p in palabras:
+                    mask &= self.palabras.str.contains(" " + p, regex=False).to_numpy()
+            else:
+                mask &= self.texto.str.contains(f["q"].lower(), regex=False).to_numpy()
+        return mask
+
+class RepositorioSnapshot(RepositorioTareas):
+    """
+    Lecturas (consultar / filas_facetas) desde una copia en memoria de toda la tabla;
+    escrituras, búsqueda rankeada y stats van al motor. Las escrituras hechas por la API
+    se aplican también a la copia; las de afuera se ven al recargar (SNAPSHOT_TTL).
+    Dentro de agrupar_escrituras() (un upload) la copia columnar se rearma una sola vez,
+    al salir: mientras tanto las lecturas ven el estado de antes del upload.
+    """
+
+    def __init__(self, motor: RepositorioTareas, ttl: float = SNAPSHOT_TTL):
+        self.motor = motor
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._carga_lock = threading.Lock()
+        self._armado_lock = threading.Lock()
+        self._filas: Dict[str, dict] = {}
+        self._datos: Optional[_Columnas] = None
+        self._cargado_en: Optional[float] = None
+        self._marca: Tuple[int, int] = (0, 0)
+        self._cargando = False
+        self._sucio = False
+        self._cargas = 0        # cargas completas hechas (descarta un rearmado hecho sobre la anterior)
+        self._agrupadas = 0     # agrupar_escrituras() abiertos
+        self._pendiente = False # _filas tiene cambios que _datos todavía no
+
+    # ---- carga ----
+
+    def vigente(self) -> bool:
+        """Cargada, dentro del TTL y sin escrituras de otros workers desde la carga."""
+        with self._lock:
+            if self._cargado_en is None or (time.time() - self._cargado_en) >= self.ttl:
+                return False
+            marca = self._marca
+        return not cache_consultas.cambios_ajenos(marca)
+
+    def asegurar(self) -> _Columnas:
+        """Copia vigente; si venció la recarga un solo hilo y el resto espera."""
+        if self.vigente():
+            return self._datos
+        with self._carga_lock:
+            if self.vigente():
+                return self._datos
+            with self._lock:
+                self._cargando, self._sucio = True, False
+            marca = cache_consultas.marca()
+            try:
+                with medir("snapshot_carga"):
+                    filas = {f["id_tarea_planner"]: f for f in self.motor.todas_las_filas()}
+                    datos = _Columnas(list(filas.values()))
+            except Exception:
+                with self._lock:
+                    self._cargando = False
+                raise
+            with self._lock:
+                self._filas, self._datos = filas, datos
+                self._cargas += 1
+                self._pendiente = False
+                # si hubo escrituras durante la carga, la copia puede no tenerlas
+                self._cargado_en = None if self._sucio else time.time()
+                self._marca = marca
+                self._cargando = False
+            logger.info("📸 Snapshot de tareas cargado: %d filas", datos.n)
+            return datos
+
+    def precargar(self) -> None:
+        try:
+            self.asegurar()
+        except Exception:
+            logger.exception("❌ No se pudo cargar el snapshot de tareas (se reintenta en la próxima consulta)")
+
+    def _cargada(self) -> bool:
+        """Hay copia a la que aplicar una escritura (si se está cargando, queda marcada para recargar)."""
+        with self._lock:
+            if self._cargando:
+                self._sucio = True
+                return False
+            return self._cargado_en is not None
+
+    def _actualizar(self, cambios: Dict[str, dict]) -> None:
+        """Reemplaza filas de la copia (ya escritas en el motor); la rearma salvo dentro de agrupar_escrituras()."""
+        with self._lock:
+            if self._cargando:
+                self._sucio = True
+                return
+            if self._cargado_en is None:
+                return
+            self._filas.update(cambios)
+            self._pendiente = True
+            if self._agrupadas:
+                return
+        self._rearmar()
+
+    def _rearmar(self) -> bool:
+        """Arma la copia columnar con las filas actuales sin tomar el lock de lectura y la reemplaza."""
+        with self._armado_lock:
+            with self._lock:
+                if not self._pendiente or self._cargado_en is None:
+                    return False
+                filas, cargas = list(self._filas.values()), self._cargas
+                self._pendiente = False
+            with medir("snapshot_indices"):
+                datos = _Columnas(filas)
+            with self._lock:
+                if self._cargas != cargas:   # hubo una carga completa mientras tanto
+                    return False
+                self._datos = datos
+            return True
+
+    @contextmanager
+    def agrupar_escrituras(self) -> Iterator[None]:
+        with self._lock:
+            self._agrupadas += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._agrupadas -= 1
+            # al terminar cada upload (aunque haya otro en curso, para no postergarlo sin límite);
+            # lo cacheado con la copia vieja durante el upload se descarta
+            if self._rearmar():
+                cache_consultas.invalidar()
+
+    # ---- escrituras: motor + copia ----
+
+    def buscar_hashes(self, ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        return self.motor.buscar_hashes(ids)
+
+    def upsert(self, filas: List[dict]) -> None:
+        self.motor.upsert(filas)
+        if not self._cargada():
+            return
+        # las insertadas no traen `id` (lo asigna la base): se pide solo para esas
+        nuevas = [f["id_tarea_planner"] for f in filas if f.get("id") is None and f["id_tarea_planner"] not in self._filas]
+        ids = self.motor.buscar_hashes(nuevas) if nuevas else {}
+        cambios: Dict[str, dict] = {}
+        for f in filas:
+            id_ = f["id_tarea_planner"]
+            fila = {**self._filas.get(id_, {"eliminada": False}), **f}
+            if fila.get("id") is None:
+                if id_ not in ids:
+                    # no debería pasar; sin id no se puede ordenar/paginar: que recargue
+                    self.invalidar()
+                    return
+                fila["id"] = ids[id_]["id"]
+            cambios[id_] = fila
+        self._actualizar(cambios)
+
+    def marcar_eliminadas(self, ids: List[str], eliminada: bool = True) -> None:
+        self.motor.marcar_eliminadas(ids, eliminada)
+        if self._cargada():
+            self._actualizar({i: {**self._filas[i], "eliminada": eliminada} for i in ids if i in self._filas})
+
+    def vencidas_sin_marcar(self, hoy: str, cerrados: Iterable[str]) -> List[dict]:
+        return self.motor.vencidas_sin_marcar(hoy, cerrados)
+
+    def marcar_retrasadas(self, hashes: Dict[str, Tuple[Optional[str], str]]) -> List[str]:
+        ids = self.motor.marcar_retrasadas(hashes)
+        if ids and self._cargada():
+            self._actualizar({
+                i: {**self._filas[i], "retrasada": True, "row_hash": hashes[i][1]} for i in ids if i in self._filas
+            })
+        return ids
+
+    def invalidar(self) -> None:
+        with self._lock:
+            self._cargado_en = None
+            if self._cargando:
+                self._sucio = True
+
+    # ---- lecturas desde la copia ----
+
+    def consultar(self, filtros, order_by, desc, limit, offset, keyset, conteo, columnas):
+        datos = self.asegurar()
+        mask = datos.mascara(filtros)
+        perm = datos.orden(order_by)
+        if desc:
+            perm = perm[::-1]
+        sel = perm[mask[perm]]
+        total = int(len(sel)) if conteo != "none" else None
+
+        if keyset is not None:
+            valor, id_ = keyset
+            k, ids = datos.clave(order_by)[sel], datos.ids[sel]
+            kv = datos.codificar(order_by, valor)
+            if desc:
+                sel = sel[(k < kv) | ((k == kv) & (ids < int(id_)))]
+            else:
+                sel = sel[(k > kv) | ((k == kv) & (ids > int(id_)))]
+            offset = 0
+
+        pagina = sel[offset:offset + limit].tolist()
+        if columnas:
+            return [{c: datos.filas[i].get(c) for c in columnas} for i in pagina], total
+        return [dict(datos.filas[i]) for i in pagina], total
+
+    def _filas_actuales(self) -> List[dict]:
+        """Todas las filas, con las escrituras que la copia columnar todavía no tiene."""
+        datos = self.asegurar()
+        with self._lock:
+            return list(self._filas.values()) if self._pendiente else datos.filas
+
+    def filas_facetas(self) -> Iterable[dict]:
+        return self._filas_actuales()
+
+    def todas_las_filas(self) -> Iterator[dict]:
+        return iter(self._filas_actuales())
+
+    # ---- el resto va al motor ----
+
+    def buscar(self, palabras: List[str], limit: int, tablero: Optional[str]) -> List[dict]:
+        return self.motor.buscar(palabras, limit, tablero)
+
+    def stats(self, params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        return self.motor.stats(params)
+
+    async def ping_async(self) -> None:
+        await self.motor.ping_async()
+
+    async def cerrar_async(self) -> None:
+        await self.motor.cerrar_async()
@@ -0,0 +1,258 @@
+import os, json, sqlite3, threading
+from typing import List, Dict, Any, Tuple, Optional, Iterable
+
+from services.facetas_cache import FACET_COLUMNS
+from services.repositorio import RepositorioTareas, palabras_busqueda
+
+# Archivo de la base local (":memory:" = solo en RAM, útil para tests/bench)
+SQLITE_PATH = os.getenv("SQLITE_PATH", "tareas.db")
+
+# Columnas de la tabla (mismas que en Supabase) y cuáles se guardan como JSON
+COLUMNAS = [
+    "id_tarea_planner", "nombre_tarea", "descripcion", "colaborador", "creado_por",
+    "estado", "prioridad", "fecha_creacion", "fecha_vencimiento", "fecha_finalizacion",
+    "completado_por", "etiquetas", "checklist", "retrasada", "nombre_tablero", "row_hash",
+]
+JSON_COLS = {"etiquetas", "checklist"}
+BOOL_COLS = {"retrasada", "eliminada"}
+
+_ESQUEMA = """
+create table if not exists tareas (
+    id integer primary key autoincrement,
+    id_tarea_planner text not null unique,
+    nombre_tarea text, descripcion text, colaborador text, creado_por text,
+    estado text, prioridad text,
+    fecha_creacion text, fecha_vencimiento text, fecha_finalizacion text,
+    completado_por text, etiquetas text, checklist text,
+    retrasada integer, nombre_tablero text, row_hash text,
+    eliminada integer not null default 0
+);
+create index if not exists tareas_estado_idx on tareas(estado);
+create index if not exists tareas_prioridad_idx on tareas(prioridad);
+create index if not exists tareas_colaborador_idx on tareas(colaborador);
+create index if not exists tareas_tablero_idx on tareas(nombre_tablero);
+create index if not exists tareas_fecha_creacion_idx on tareas(fecha_creacion);
+create index if not exists tareas_fecha_vencimiento_idx on tareas(fecha_vencimiento);
+create index if not exists tareas_fecha_finalizacion_idx on tareas(fecha_finalizacion);
+create index if not exists tareas_retrasada_idx on tareas(fecha_vencimiento) where retrasada = 1;
+"""
+
+# Índice de texto para `q` (sin acentos: 'accion' encuentra 'Acción'), sincronizado por triggers
+_ESQUEMA_FTS = """
+create virtual table if not exists tareas_fts using fts5(
+    nombre_tarea, descripcion, content='tareas', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2'
+);
+create trigger if not exists tareas_fts_ai after insert on tareas begin
+    insert into tareas_fts(rowid, nombre_tarea, descripcion) values (new.id, new.nombre_tarea, new.descripcion);
+end;
+create trigger if not exists tareas_fts_ad after delete on tareas begin
+    insert into tareas_fts(tareas_fts, rowid, nombre_tarea, descripcion) values ('delete', old.id, old.nombre_tarea, old.descripcion);
+end;
+create trigger if not exists tareas_fts_au after update of nombre_tarea, descripcion on tareas begin
+    insert into tareas_fts(tareas_fts, rowid, nombre_tarea, descripcion) values ('delete', old.id, old.nombre_tarea, old.descripcion);
+    insert into tareas_fts(rowid, nombre_tarea, descripcion) values (new.id, new.nombre_tarea, new.descripcion);
+end;
+"""
+
+def _a_sql(col: str, v: Any) -> Any:
+    if col in JSON_COLS:
+        return None if v is None else json.dumps(v, ensure_ascii=False)
+    if col in BOOL_COLS:
+        return None if v is None else int(bool(v))
+    return v
+
+def _de_sql(row: sqlite3.Row) -> Dict[str, Any]:
+    out = dict(row)
+    for c in JSON_COLS:
+        if out.get(c) is not None:
+            out[c] = json.loads(out[c])
+    for c in BOOL_COLS:
+        if out.get(c) is not None:
+            out[c] = bool(out[c])
+    return out
+
+def _fts_query(palabras: List[str]) -> str:
+    """Cada palabra como prefijo ('cambi' encuentra 'cambios'), todas requeridas."""
+    return " ".join(f'"{p}"*' for p in palabras)
+
+class RepositorioSQLite(RepositorioTareas):
+    """
+    Motor local sobre sqlite3 (stdlib): réplica de lectura offline y backend rápido
+    para tests/benchmarks. Una conexión compartida protegida por lock (":memory:" no
+    admite varias conexiones sobre la misma base).
+    """
+
+    def __init__(self, ruta: str = SQLITE_PATH):
+        self.ruta = ruta
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(ruta, check_same_thread=False, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            if ruta != ":memory:":
+                self._conn.execute("pragma journal_mode=wal")
+            self._conn.executescript(_ESQUEMA)
+            # bases creadas antes de la columna `eliminada`
+            existentes = {r["name"] for r in self._conn.execute("pragma table_info(tareas)")}
+            if "eliminada" not in existentes:
+                self._conn.execute("alter table tareas add column eliminada integer not null default 0")
+            try:
+                self._conn.executescript(_ESQUEMA_FTS)
+                self.fts = True
+            except sqlite3.OperationalError:
+                # sqlite sin FTS5: `q` cae a LIKE
+                self.fts = False
+
+    def buscar_hashes(self, ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        existentes: Dict[str, Dict[str, Any]] = {}
+        with self._lock:
+            # sqlite acepta como mucho ~32k parámetros por sentencia
+            for i in range(0, len(ids), 900):
+                chunk = ids[i:i+900]
+                marcas = ",".join("?" * len(chunk))
+                for r in self._conn.execute(
+                    f"select id, id_tarea_planner, row_hash from tareas where id_tarea_planner in ({marcas})", chunk
+                ):
+                    existentes[r["id_tarea_planner"]] = dict(r)
+        return existentes
+
+    def upsert(self, filas: List[dict]) -> None:
+        cols = ",".join(COLUMNAS)
+        marcas = ",".join("?" * len(COLUMNAS))
+        sets = ",".join(f"{c}=excluded.{c}" for c in COLUMNAS if c != "id_tarea_planner")
+        sql = f"insert into tareas ({cols}) values ({marcas}) on conflict(id_tarea_planner) do update set {sets}"
+        with self._lock, self._conn:
+            self._conn.executemany(sql, ([_a_sql(c, f.get(c)) for c in COLUMNAS] for f in filas))
+
+    def marcar_eliminadas(self, ids: List[str], eliminada: bool = True) -> None:
+        with self._lock, self._conn:
+            for i in range(0, len(ids), 900):
+                chunk = ids[i:i+900]
+                self._conn.execute(
+                    f"update tareas set eliminada = ? where id_tarea_planner in ({','.join('?' * len(chunk))})",
+                    [int(eliminada), *chunk],
+                )
+
+    def vencidas_sin_marcar(self, hoy: str, cerrados: Iterable[str]) -> List[dict]:
+        cerrados = list(cerrados)
+        with self._lock:
+            filas = self._conn.execute(
+                "select * from tareas where fecha_vencimiento < ? and coalesce(retrasada, 0) = 0"
+                f" and coalesce(estado, '') not in ({','.join('?' * len(cerrados))})",
+                [hoy, *cerrados],
+            ).fetchall()
+        return [_de_sql(r) for r in filas]
+
+    def marcar_retrasadas(self, hashes: Dict[str, Tuple[Optional[str], str]]) -> List[str]:
+        marcadas: List[str] = []
+        with self._lock, self._conn:
+            for id_, (anterior, nuevo) in hashes.items():
+                cur = self._conn.execute(
+                    "update tareas set retrasada = 1, row_hash = ?"
+                    " where id_tarea_planner = ? and row_hash is ? and coalesce(retrasada, 0) = 0",
+                    (nuevo, id_, anterior),
+                )
+                if cur.rowcount:
+                    marcadas.append(id_)
+        return marcadas
+
+    def _where(self, f: Dict[str, Any]) -> Tuple[List[str], List[Any]]:
+        conds: List[str] = []
+        params: List[Any] = []
+
+        def en(col: str, valores: Optional[List[str]]):
+            if valores:
+                conds.append(f"{col} in ({','.join('?' * len(valores))})")
+                params.extend(valores)
+
+        en("estado", f["estados"])
+        en("prioridad", f["prioridades"])
+        en("colaborador", f["colaboradores"])
+        if f["tablero"]:
+            conds.append("nombre_tablero = ?"); params.append(f["tablero"])
+        if f["vencida"] is not None:
+            conds.append("retrasada = 1" if f["vencida"] else "coalesce(retrasada, 0) = 0")
+
+        for col, clave, op in (
+            ("fecha_creacion", "desde", ">="), ("fecha_creacion", "hasta", "<="),
+            ("fecha_vencimiento", "vencimiento_desde", ">="), ("fecha_vencimiento", "vencimiento_hasta", "<="),
+            ("fecha_finalizacion", "finalizacion_desde", ">="), ("fecha_finalizacion", "finalizacion_hasta", "<="),
+        ):
+            if f[clave]:
+                conds.append(f"{col} {op} ?"); params.append(f[clave])
+
+        if f["q"]:
+            consulta = _fts_query(palabras_busqueda(f["q"])) if self.fts else ""
+            if consulta:
+                conds.append("id in (select rowid from tareas_fts where tareas_fts match ?)")
+                params.append(consulta)
+            else:
+                conds.append("(nombre_tarea like ? or descripcion like ?)")
+                params.extend([f"%{f['q']}%"] * 2)
+        return conds, params
+
+    def consultar(self, filtros, order_by, desc, limit, offset, keyset, conteo, columnas):
+        conds, params = self._where(filtros)
+        where = (" where " + " and ".join(conds)) if conds else ""
+
+        total = None
+        with self._lock:
+            if conteo != "none":
+                total = self._conn.execute(f"select count(*) from tareas{where}", params).fetchone()[0]
+
+            # mismo orden que Postgres: NULLs al final en asc y al principio en desc
+            dir_ = "desc" if desc else "asc"
+            nulls = "nulls first" if desc else "nulls last"
+            orden = f" order by {order_by} {dir_} {nulls}, id {dir_}"
+
+            conds_k, params_k = list(conds), list(params)
+            if keyset is not None:
+                valor, id_ = keyset
+                op = "<" if desc else ">"
+                if valor is None:
+                    conds_k.append(f"(({order_by} is null and id {op} ?) or {order_by} is not null)" if desc
+                                   else f"({order_by} is null and id {op} ?)")
+                    params_k.append(id_)
+                else:
+                    extra = "" if desc else f" or {order_by} is null"
+                    conds_k.append(f"({order_by} {op} ? or ({order_by} = ? and id {op} ?){extra})")
+                    params_k.extend([valor, valor, id_])
+                offset = 0
+            where_k = (" where " + " and ".join(conds_k)) if conds_k else ""
+
+            select = ",".join(columnas) if columnas else "*"
+            filas = self._conn.execute(
+                f"select {select} from tareas{where_k}{orden} limit ? offset ?",
+                params_k + [limit, offset],
+            ).fetchall()
+        return [_de_sql(r) for r in filas], total
+
+    def filas_facetas(self) -> Iterable[dict]:
+        with self._lock:
+            filas = self._conn.execute(
+                f"select id_tarea_planner,{','.join(FACET_COLUMNS)} from tareas"
+            ).fetchall()
+        return [_de_sql(r) for r in filas]
+
+    def buscar(self, palabras: List[str], limit: int, tablero: Optional[str]) -> List[dict]:
+        if not self.fts:
+            filtros = dict.fromkeys(("estados", "prioridades", "colaboradores", "desde", "hasta", "vencida",
+                                     "vencimiento_desde", "vencimiento_hasta", "finalizacion_desde", "finalizacion_hasta"))
+            filtros.update(tablero=tablero, q=" ".join(palabras))
+            return self.consultar(filtros, "fecha_creacion", True, limit, 0, None, "none", None)[0]
+
+        # bm25: menor = más relevante; el nombre pesa 10 veces más que la descripción
+        sql = (
+            "select t.*, -bm25(tareas_fts, 10.0, 1.0) as relevancia"
+            " from tareas_fts join tareas t on t.id = tareas_fts.rowid"
+            " where tareas_fts match ?"
+        )
+        params: List[Any] = [_fts_query(palabras)]
+        if tablero:
+            sql += " and t.nombre_tablero = ?"
+            params.append(tablero)
+        sql += " order by bm25(tareas_fts, 10.0, 1.0), t.id limit ?"
+        params.append(limit)
+        with self._lock:
+            filas = self._conn.execute(sql, params).fetchall()
+        return [_de_sql(r) for r in filas]
@@ -0,0 +1,87 @@
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+from services.cache import cache_consultas
+from services.metricas import medir
+from services.tareas_service import _split, iterar_tareas_filtradas, rpc_tareas_stats
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Columnas que necesita el cálculo local (fallback sin RPC)
+STATS_COLUMNS = ["estado", "colaborador", "nombre_tablero", "retrasada", "fecha_creacion", "fecha_finalizacion"]
+
+def _params_rpc(filtros: Dict[str, Any]) -> Dict[str, Any]:
+    params = {
+        "p_estados": _split(filtros.get("estado")),
+        "p_prioridades": _split(filtros.get("prioridad")),
+        "p_colaboradores": _split(filtros.get("colaborador")),
+        "p_tablero": filtros.get("tablero") or None,
+        "p_desde": filtros.get("desde"),
+        "p_hasta": filtros.get("hasta"),
+        "p_q": (filtros.get("q") or "").strip() or None,
+        "p_vencimiento_desde": filtros.get("vencimiento_desde"),
+        "p_vencimiento_hasta": filtros.get("vencimiento_hasta"),
+        "p_finalizacion_desde": filtros.get("finalizacion_desde"),
+        "p_finalizacion_hasta": filtros.get("finalizacion_hasta"),
+    }
+    # p_vencida existe desde sql/005_retrasadas.sql: solo se manda si se usa
+    if filtros.get("vencida") is not None:
+        params["p_vencida"] = filtros["vencida"]
+    return params
+
+def _conteos(col: "pd.Series") -> Dict[str, int]:
+    vc = col.dropna().astype(str).str.strip()
+    vc = vc[vc != ""].value_counts()
+    return {k: int(v) for k, v in sorted(vc.items())}
+
+def _mensual(df: "pd.DataFrame") -> List[Dict[str, Any]]:
+    import pandas as pd
+    creadas = pd.to_datetime(df["fecha_creacion"], errors="coerce").dt.strftime("%Y-%m").value_counts()
+    finalizadas = pd.to_datetime(df["fecha_finalizacion"], errors="coerce").dt.strftime("%Y-%m").value_counts()
+    serie = pd.concat({"creadas": creadas, "finalizadas": finalizadas}, axis=1).fillna(0).astype(int).sort_index()
+    return [
+        {"mes": mes, "creadas": int(fila["creadas"]), "finalizadas": int(fila["finalizadas"])}
+        for mes, fila in serie.iterrows()
+    ]
+
+def agregar_filas(filas: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Mismos agregados que tareas_stats(), vectorizados con pandas sobre las filas filtradas.
+    pandas se importa recién acá: solo lo usa el fallback sin RPC, no el arranque.
+    """
+    import pandas as pd
+    df = pd.DataFrame(filas, columns=STATS_COLUMNS)
+    return {
+        "total": int(len(df)),
+        "retrasadas": int(df["retrasada"].eq(True).sum()),
+        "por_estado": _conteos(df["estado"]),
+        "por_colaborador": _conteos(df["colaborador"]),
+        "por_tablero": _conteos(df["nombre_tablero"]),
+        "mensual": _mensual(df),
+    }
+
+def estadisticas_tareas(**filtros) -> Dict[str, Any]:
+    """
+    Conteos agrupados y serie mensual (creadas vs finalizadas) para los filtros dados.
+    Usa la función SQL tareas_stats si existe; si no, trae solo STATS_COLUMNS y agrega local.
+    """
+    params = _params_rpc(filtros)
+    clave = ("stats",) + tuple((k, tuple(v) if isinstance(v, list) else v) for k, v in sorted(params.items()))
+    cacheado = cache_consultas.get(clave)
+    if cacheado is not None:
+        return cacheado
+    generacion = cache_consultas.generacion
+
+    stats: Optional[Dict[str, Any]] = rpc_tareas_stats(params)
+    origen = "rpc"
+    if stats is None:
+        with medir("stats_local"):
+            stats = agregar_filas(list(iterar_tareas_filtradas(**filtros, columnas=STATS_COLUMNS)))
+        origen = "local"
+
+    total = stats.get("total") or 0
+    stats["ratio_retrasadas"] = round((stats.get("retrasadas") or 0) / total, 4) if total else 0.0
+    stats["origen"] = origen
+
+    cache_consultas.set(clave, stats, generacion=generacion)
+    return stats
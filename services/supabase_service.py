@@ -1,261 +1,429 @@
-import os, json, time, math
-from typing import List, Dict, Any, Tuple, Optional
+import os, time, random, asyncio, threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Tuple, Optional, Iterable, Callable, Awaitable
+import httpx
 from dotenv import load_dotenv
-from supabase import create_client, Client
+from postgrest import SyncPostgrestClient, AsyncPostgrestClient
+from postgrest.constants import DEFAULT_POSTGREST_CLIENT_HEADERS
+from postgrest.exceptions import APIError
+from postgrest.utils import SyncClient, AsyncClient
+
+from services.facetas_cache import FACET_COLUMNS
+from services.metricas import SUPABASE_CHUNK, SUPABASE_REINTENTOS
+from services.repositorio import RepositorioTareas, palabras_busqueda
 
 load_dotenv()
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-if not SUPABASE_URL or not SUPABASE_KEY:
-    raise RuntimeError("Faltan SUPABASE_URL / SUPABASE_KEY")
-
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-
-# Solo columnas que EXISTEN en la tabla
-COMPARE_FIELDS = [
-    "nombre_tarea","descripcion","colaborador","creado_por",
-    "estado","prioridad",
-    "fecha_creacion","fecha_vencimiento","fecha_finalizacion",
-    "completado_por","etiquetas","checklist",
-    "retrasada","nombre_tablero",
-]
-
-SAFE_ORDER_COLUMNS = {
-    "fecha_creacion","fecha_vencimiento","fecha_finalizacion",
-    "prioridad","estado","colaborador","nombre_tablero"
-}
-
-def _retry(callable_):
-    delay = 0.5
-    for i in range(4):
-        try:
-            return callable_()
-        except Exception:
-            if i == 3:
-                raise
-            time.sleep(delay)
-            delay *= 2
-
-def _normalize(obj):
-    if isinstance(obj, list):
-        return sorted([_normalize(x) for x in obj], key=lambda x: json.dumps(x, sort_keys=True, ensure_ascii=False))
-    if isinstance(obj, dict):
-        return {k: _normalize(v) for k, v in sorted(obj.items())}
-    return obj
-
-def _sanitize_json(v):
-    """Convierte NaN/±Infinity en None y limpia diccionarios/listas recursivamente."""
-    if isinstance(v, float):
-        if math.isnan(v) or math.isinf(v):
-            return None
-        return v
-    if isinstance(v, list):
-        out = []
-        for x in v:
-            sx = _sanitize_json(x)
-            # mantenemos None en listas solo si se quiere; acá los filtramos
-            if sx is not None:
-                out.append(sx)
-        return out
-    if isinstance(v, dict):
-        out = {}
-        for k, x in v.items():
-            sx = _sanitize_json(x)
-            out[k] = sx  
-        return out
-    return v  
-
-def _coerce_types(t: Dict[str, Any]) -> Dict[str, Any]:
-    out = dict(t)
-
-    # listas
-    et = out.get("etiquetas")
-    if isinstance(et, str):
-        et = [x.strip() for x in et.split(";") if x.strip()]
-    out["etiquetas"] = et or []
-
-    # checklist -> None si vacío
-    cl = out.get("checklist")
-    if not cl or (isinstance(cl, dict) and not cl.get("items")):
-        out["checklist"] = None
-
-    # fechas a ISO (YYYY-MM-DD)
-    for k in ("fecha_creacion","fecha_vencimiento","fecha_finalizacion"):
-        v = out.get(k)
-        if hasattr(v, "isoformat"):
-            out[k] = v.isoformat()
-
-    # 🚿 sanitizar NaN/Infinity en TODO el payload
-    for k, v in list(out.items()):
-        out[k] = _sanitize_json(v)
-
-    return out
-
-def _payload_for_hash(t: Dict[str, Any]) -> Dict[str, Any]:
-    # Solo campos comparables
-    return {k: _normalize(t.get(k)) for k in COMPARE_FIELDS}
-
-def _equal_rows(a: Dict[str, Any], b: Dict[str, Any]) -> bool:
-    return json.dumps(_payload_for_hash(a), sort_keys=True, ensure_ascii=False, default=str) == \
-           json.dumps(_payload_for_hash(b), sort_keys=True, ensure_ascii=False, default=str)
+
+# Tamaño de cada chunk y máximo de requests simultáneos contra PostgREST
+SELECT_CHUNK = int(os.getenv("SUPABASE_SELECT_CHUNK", "400"))
+UPSERT_CHUNK = int(os.getenv("SUPABASE_UPSERT_CHUNK", "500"))
+MAX_INFLIGHT = max(1, int(os.getenv("SUPABASE_MAX_INFLIGHT", "4")))
+
+# PostgREST corta cada respuesta en max-rows (1000 por defecto): se pagina
+SCAN_PAGE = 1000
+
+# Columnas de una tarea cuando no se piden fields= (las mismas que en SQLite). No `*`: la columna
+# generada `busqueda` (sql/003_busqueda.sql) es un tsvector que no tiene que viajar en cada fila
+COLUMNAS_TAREA = ",".join([
+    "id", "id_tarea_planner", "nombre_tarea", "descripcion", "colaborador", "creado_por",
+    "estado", "prioridad", "fecha_creacion", "fecha_vencimiento", "fecha_finalizacion",
+    "completado_por", "etiquetas", "checklist", "retrasada", "nombre_tablero", "row_hash", "eliminada",
+])
+
+# Pool HTTP hacia PostgREST (uno por cliente, compartido por todos los hilos del proceso)
+HTTP_MAX_CONEXIONES = int(os.getenv("SUPABASE_MAX_CONEXIONES", "20"))
+HTTP_KEEPALIVE = int(os.getenv("SUPABASE_KEEPALIVE", "10"))
+HTTP_KEEPALIVE_S = float(os.getenv("SUPABASE_KEEPALIVE_S", "30"))
+HTTP_TIMEOUT_S = float(os.getenv("SUPABASE_TIMEOUT_S", "30"))
+HTTP_CONNECT_TIMEOUT_S = float(os.getenv("SUPABASE_CONNECT_TIMEOUT_S", "5"))
+
+def _limites() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=HTTP_MAX_CONEXIONES,
+        max_keepalive_connections=HTTP_KEEPALIVE,
+        keepalive_expiry=HTTP_KEEPALIVE_S,
+    )
+
+class _PostgrestPool(SyncPostgrestClient):
+    """PostgREST con límites de conexiones y keep-alive propios (la librería no los expone)."""
+
+    def create_session(self, base_url, headers, timeout, verify=True) -> SyncClient:
+        return SyncClient(base_url=base_url, headers=headers, timeout=timeout, verify=verify,
+                          follow_redirects=True, http2=True, limits=_limites())
+
+class _PostgrestPoolAsync(AsyncPostgrestClient):
+    """Variante async (endpoints async): mismo pool y timeouts sin ocupar hilos."""
+
+    def create_session(self, base_url, headers, timeout, verify=True) -> AsyncClient:
+        return AsyncClient(base_url=base_url, headers=headers, timeout=timeout, verify=verify,
+                           follow_redirects=True, http2=True, limits=_limites())
+
+def _parametros_cliente() -> Dict[str, Any]:
+    if not SUPABASE_URL or not SUPABASE_KEY:
+        raise RuntimeError("Faltan SUPABASE_URL / SUPABASE_KEY")
+    return {
+        "base_url": f"{SUPABASE_URL.rstrip('/')}/rest/v1",
+        "headers": {**DEFAULT_POSTGREST_CLIENT_HEADERS, "apiKey": SUPABASE_KEY,
+                    "Authorization": f"Bearer {SUPABASE_KEY}"},
+        "timeout": httpx.Timeout(HTTP_TIMEOUT_S, connect=HTTP_CONNECT_TIMEOUT_S),
+    }
+
+# Solo se usa PostgREST (table/rpc): clientes de postgrest directos, sin auth/storage/realtime
+supabase: Optional[SyncPostgrestClient] = None
+supabase_async: Optional[AsyncPostgrestClient] = None
+_client_lock = threading.Lock()
+
+def get_client() -> SyncPostgrestClient:
+    """Cliente PostgREST de Supabase, creado en el primer uso (no al importar el módulo)."""
+    global supabase
+    if supabase is None:
+        with _client_lock:
+            if supabase is None:
+                p = _parametros_cliente()
+                supabase = _PostgrestPool(p.pop("base_url"), **p)
+    return supabase
+
+def get_async_client() -> AsyncPostgrestClient:
+    """Igual que get_client para código async (el pool queda atado al event loop de la app)."""
+    global supabase_async
+    if supabase_async is None:
+        with _client_lock:
+            if supabase_async is None:
+                p = _parametros_cliente()
+                supabase_async = _PostgrestPoolAsync(p.pop("base_url"), **p)
+    return supabase_async
+
+async def cerrar_clientes() -> None:
+    """Cierra los pools HTTP (shutdown de la app). Si se vuelven a usar, se crean de nuevo."""
+    global supabase, supabase_async, _chunk_pool
+    with _client_lock:
+        cliente, cliente_async, supabase, supabase_async = supabase, supabase_async, None, None
+    with _chunk_pool_lock:
+        pool, _chunk_pool = _chunk_pool, None
+    if pool is not None:
+        pool.shutdown(wait=False)
+    if cliente is not None:
+        cliente.aclose()
+    if cliente_async is not None:
+        await cliente_async.aclose()
+
+def _error_permanente(e: Exception) -> bool:
+    """Errores de PostgREST/SQL que no se arreglan reintentando (columna/función inexistente, datos inválidos)."""
+    # con respuestas que no son JSON (proxy, 5xx) postgrest pone el status HTTP (int) como code
+    code = str(getattr(e, "code", None) or "")
+    return isinstance(e, APIError) and (code.startswith("PGRST") or code[:2] in ("22", "23", "42"))
+
+REINTENTOS = 4
+
+def _espera(intento: int) -> float:
+    """Backoff exponencial (0.5 s, 1 s, 2 s) con jitter: entre la mitad y el total, para no reintentar en tandas."""
+    base = 0.5 * 2 ** intento
+    return random.uniform(base / 2, base)
+
+def _retry(callable_, op: str = "consulta"):
+    """Reintenta con backoff; la latencia total (con reintentos) va a supabase_chunk_segundos{op}."""
+    t0 = time.perf_counter()
+    try:
+        for i in range(REINTENTOS):
+            try:
+                return callable_()
+            except Exception as e:
+                if i == REINTENTOS - 1 or _error_permanente(e):
+                    raise
+                SUPABASE_REINTENTOS.labels(op).inc()
+                time.sleep(_espera(i))
+    finally:
+        SUPABASE_CHUNK.labels(op).observe(time.perf_counter() - t0)
+
+async def _retry_async(coro_fn: Callable[[], Awaitable[Any]], op: str = "consulta"):
+    """_retry para el cliente async: espera con asyncio.sleep sin bloquear el event loop."""
+    t0 = time.perf_counter()
+    try:
+        for i in range(REINTENTOS):
+            try:
+                return await coro_fn()
+            except Exception as e:
+                if i == REINTENTOS - 1 or _error_permanente(e):
+                    raise
+                SUPABASE_REINTENTOS.labels(op).inc()
+                await asyncio.sleep(_espera(i))
+    finally:
+        SUPABASE_CHUNK.labels(op).observe(time.perf_counter() - t0)
 
 def _chunks(lst, n=500):
     for i in range(0, len(lst), n):
         yield lst[i:i+n]
 
-def insertar_tareas(tareas: List[dict]) -> Tuple[int,int]:
-    if not tareas:
-        return (0,0)
-
-    # normalizo tipos + sanitizo
-    tareas = [_coerce_types(t) for t in tareas]
-
-    # IDs únicos
-    ids = list({t["id_tarea_planner"] for t in tareas if t.get("id_tarea_planner")})
-    if not ids:
-        return (0,0)
-
-    # Traer existentes con TODAS las columnas comparables
-    campos_select = "id,id_tarea_planner," + ",".join(COMPARE_FIELDS)
-    existentes: Dict[str, Any] = {}
-    for chunk in _chunks(ids, 400):
-        res = _retry(lambda: supabase.table("tareas")
-                     .select(campos_select)
-                     .in_("id_tarea_planner", chunk)
-                     .execute())
-        for r in (res.data or []):
-            existentes[r["id_tarea_planner"]] = r
-
-    insertadas, actualizadas = 0, 0
-    a_upsert: List[dict] = []
-
-    for nueva in tareas:
-        id_ = nueva["id_tarea_planner"]
-        actual = existentes.get(id_)
-
-        if not actual:
-            insertadas += 1
-            a_upsert.append(nueva)
-            continue
-
-        # comparar contenido (sin row_hash)
-        if _equal_rows(nueva, actual):
-            continue  
-
-        upd = dict(nueva)
-        upd["id"] = actual["id"]  
-        actualizadas += 1
-        a_upsert.append(upd)
-
-    if not a_upsert:
-        return (insertadas, actualizadas)
-
-    for chunk in _chunks(a_upsert, 500):
-        _retry(lambda: supabase.table("tareas")
-               .upsert(chunk, on_conflict="id_tarea_planner")
-               .execute())
-
-    return (insertadas, actualizadas)
-
-# -------- filtros / facetas (ajustado a columnas existentes) --------
-
-def filtrar_tareas(
-    estado: Optional[str]=None, prioridad: Optional[str]=None, colaborador: Optional[str]=None, tablero: Optional[str]=None,
-    desde: Optional[str]=None, hasta: Optional[str]=None, q: Optional[str]=None, order_by: str="fecha_creacion",
-    order_dir: str="desc", limit: int=100, offset: int=0,
-    vencida: Optional[bool]=None,   
-    vencimiento_desde: Optional[str]=None, vencimiento_hasta: Optional[str]=None,
-    finalizacion_desde: Optional[str]=None, finalizacion_hasta: Optional[str]=None,
-):
-    def _split(v):
-        return [x.strip() for x in v.split(",") if x.strip()] if v else None
-
-    estados = _split(estado)
-    prioridades = _split(prioridad)
-    colaboradores = _split(colaborador)
-
-    count_q = supabase.table("tareas").select("id", count="exact")
-    qy = supabase.table("tareas").select("*")
-
-    if estados: count_q = count_q.in_("estado", estados); qy = qy.in_("estado", estados)
-    if prioridades: count_q = count_q.in_("prioridad", prioridades); qy = qy.in_("prioridad", prioridades)
-    if colaboradores: count_q = count_q.in_("colaborador", colaboradores); qy = qy.in_("colaborador", colaboradores)
-    if tablero: count_q = count_q.eq("nombre_tablero", tablero); qy = qy.eq("nombre_tablero", tablero)
-
-    if desde: count_q = count_q.gte("fecha_creacion", desde); qy = qy.gte("fecha_creacion", desde)
-    if hasta: count_q = count_q.lte("fecha_creacion", hasta); qy = qy.lte("fecha_creacion", hasta)
-
-    estados = _split(estado)
-    prioridades = _split(prioridad)
-    colaboradores = _split(colaborador)
-
-    qy = supabase.table("tareas").select("*", count="exact")
-
-    if estados: qy = qy.in_("estado", estados)
-    if prioridades: qy = qy.in_("prioridad", prioridades)
-    if colaboradores: qy = qy.in_("colaborador", colaboradores)
-    if tablero: qy = qy.eq("nombre_tablero", tablero)
-
-    if desde: qy = qy.gte("fecha_creacion", desde)
-    if hasta: qy = qy.lte("fecha_creacion", hasta)
-
-    if vencimiento_desde: qy = qy.gte("fecha_vencimiento", vencimiento_desde)
-    if vencimiento_hasta: qy = qy.lte("fecha_vencimiento", vencimiento_hasta)
-    if finalizacion_desde: qy = qy.gte("fecha_finalizacion", finalizacion_desde)
-    if finalizacion_hasta: qy = qy.lte("fecha_finalizacion", finalizacion_hasta)
-
-    if q:
-        like = f"%{q}%"
-        qy = qy.or_(f"nombre_tarea.ilike.{like},descripcion.ilike.{like}")
-
-    if order_by not in SAFE_ORDER_COLUMNS:
-        order_by = "fecha_creacion"
-
-    limit = max(1, min(1000, int(limit)))
-    offset = max(0, int(offset))
-
-    qy = qy.order(order_by, desc=(order_dir.lower() == "desc")).range(offset, offset + limit - 1)
-
-    res = _retry(qy.execute)
-    data = res.data or []
-    total = res.count or 0
-    return data, total
-
-
-    if q:
-        like = f"%{q}%"
-        count_q = count_q.or_(f"nombre_tarea.ilike.{like},descripcion.ilike.{like}")
-        qy = qy.or_(f"nombre_tarea.ilike.{like},descripcion.ilike.{like}")
-
-    if order_by not in SAFE_ORDER_COLUMNS:
-        order_by = "fecha_creacion"
-
-    limit = max(1, min(1000, int(limit)))
-    offset = max(0, int(offset))
-
-    qy = qy.order(order_by, desc=(order_dir.lower() == "desc")).range(offset, offset + limit - 1)
-
-    total = _retry(count_q.execute).count or 0
-    data = _retry(qy.execute).data or []
-    return data, total
-
-def obtener_facetas() -> Dict[str, list]:
-    cols = ["estado","prioridad","colaborador","nombre_tablero","etiquetas"]
-    results: Dict[str, list] = {c: [] for c in cols}
-
-    # Fetch all relevant columns in a single query
-    res = _retry(lambda: supabase.table("tareas").select(",".join(cols)).execute())
-
-    for row in res.data or []:
-        for c in cols:
-            v = row.get(c)
-            if isinstance(v, list):
-                results[c].extend(v)
-            elif v is not None:
-                results[c].append(v)
-
-    # Process and sort unique values for each facet
-    for c in cols:
-        results[c] = sorted({str(x).strip() for x in results[c] if str(x).strip()})
-
-    return results
+# Pool compartido por todos los uploads: acota los requests en vuelo del proceso
+_chunk_pool: Optional[ThreadPoolExecutor] = None
+_chunk_pool_lock = threading.Lock()
+
+def _get_chunk_pool() -> ThreadPoolExecutor:
+    global _chunk_pool
+    with _chunk_pool_lock:
+        if _chunk_pool is None:
+            _chunk_pool = ThreadPoolExecutor(max_workers=MAX_INFLIGHT, thread_name_prefix="supabase")
+        return _chunk_pool
+
+def _en_paralelo(fn: Callable[[list], Any], chunks: Iterable[list], op: str) -> List[Any]:
+    """Ejecuta fn(chunk) con _retry por chunk, hasta MAX_INFLIGHT a la vez. Respeta el orden."""
+    chunks = list(chunks)
+    if len(chunks) <= 1 or MAX_INFLIGHT == 1:
+        return [_retry(lambda c=c: fn(c), op) for c in chunks]
+    pool = _get_chunk_pool()
+    futures = [pool.submit(_retry, lambda c=c: fn(c), op) for c in chunks]
+    return [f.result() for f in futures]
+
+def _pgrst_valor(v: Any) -> str:
+    """Valor entre comillas para árboles or=/and= de PostgREST (comas, paréntesis, etc.)."""
+    s = str(v).replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{s}"'
+
+def _tsquery(palabras: List[str]) -> str:
+    """'cambio ingen' → 'cambio:* & ingen:*' (todas las palabras, cada una como prefijo)."""
+    return " & ".join(f"{p}:*" for p in palabras)
+
+def _filtro_keyset(qy, order_by: str, desc: bool, valor: Any, id_: Any):
+    """
+    Posiciona después de (valor, id). Usa el orden por defecto de Postgres:
+    asc → NULLs al final, desc → NULLs al principio; id desempata en la misma dirección.
+    """
+    op = "lt" if desc else "gt"
+    id_cond = f"id.{op}.{_pgrst_valor(id_)}"
+    if valor is None:
+        if desc:
+            # NULLs ya vienen primero: resto de NULLs + todos los no nulos
+            return qy.or_(f"and({order_by}.is.null,{id_cond}),{order_by}.not.is.null")
+        return qy.is_(order_by, "null").gt("id", id_)
+    v = _pgrst_valor(valor)
+    conds = [f"{order_by}.{op}.{v}", f"and({order_by}.eq.{v},{id_cond})"]
+    if not desc:
+        conds.append(f"{order_by}.is.null")
+    return qy.or_(",".join(conds))
+
+class RepositorioSupabase(RepositorioTareas):
+    """Tabla `tareas` vía PostgREST (motor por defecto)."""
+
+    def __init__(self, client: Optional[SyncPostgrestClient] = None):
+        self._client = client
+
+    @property
+    def client(self) -> SyncPostgrestClient:
+        return self._client or get_client()
+
+    async def ping_async(self) -> None:
+        if self._client is not None:
+            return await super().ping_async()
+        await _retry_async(
+            lambda: get_async_client().table("tareas").select("id").limit(1).execute(), "ping",
+        )
+
+    async def cerrar_async(self) -> None:
+        if self._client is None:
+            await cerrar_clientes()
+
+    def buscar_hashes(self, ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        existentes: Dict[str, Dict[str, Any]] = {}
+        resultados = _en_paralelo(
+            lambda chunk: self.client.table("tareas")
+                          .select("id,id_tarea_planner,row_hash")
+                          .in_("id_tarea_planner", chunk)
+                          .execute(),
+            _chunks(ids, SELECT_CHUNK),
+            "select_hashes",
+        )
+        for res in resultados:
+            for r in (res.data or []):
+                existentes[r["id_tarea_planner"]] = r
+        return existentes
+
+    def upsert(self, filas: List[dict]) -> None:
+        _en_paralelo(
+            lambda chunk: self.client.table("tareas")
+                          .upsert(chunk, on_conflict="id_tarea_planner")
+                          .execute(),
+            _chunks(filas, UPSERT_CHUNK),
+            "upsert",
+        )
+
+    def marcar_eliminadas(self, ids: List[str], eliminada: bool = True) -> None:
+        _en_paralelo(
+            lambda chunk: self.client.table("tareas")
+                          .update({"eliminada": eliminada})
+                          .in_("id_tarea_planner", chunk)
+                          .execute(),
+            _chunks(ids, SELECT_CHUNK),
+            "marcar_eliminadas",
+        )
+
+    def vencidas_sin_marcar(self, hoy: str, cerrados: Iterable[str]) -> List[dict]:
+        abiertas = f"estado.is.null,estado.not.in.({','.join(_pgrst_valor(c) for c in cerrados)})"
+        filas: List[dict] = []
+        offset = 0
+        while True:
+            res = _retry(lambda: self.client.table("tareas")
+                         .select(COLUMNAS_TAREA)
+                         .lt("fecha_vencimiento", hoy)
+                         .not_.is_("retrasada", "true")
+                         .or_(abiertas)
+                         .order("id")
+                         .range(offset, offset + SCAN_PAGE - 1)
+                         .execute(), "vencidas")
+            pagina = res.data or []
+            filas.extend(pagina)
+            if len(pagina) < SCAN_PAGE:
+                return filas
+            offset += SCAN_PAGE
+
+    # función de sql/007_retrasadas_hash.sql; sin ella, un PATCH por tarea
+    _rpc_retrasadas_disponible = True
+
+    def marcar_retrasadas(self, hashes: Dict[str, Tuple[Optional[str], str]]) -> List[str]:
+        filas = [
+            {"id_tarea_planner": i, "row_hash_anterior": anterior, "row_hash": nuevo}
+            for i, (anterior, nuevo) in hashes.items()
+        ]
+        if self._rpc_retrasadas_disponible:
+            try:
+                resultados = _en_paralelo(
+                    lambda chunk: self.client.rpc("marcar_retrasadas", {"p_filas": chunk}).execute(),
+                    _chunks(filas, UPSERT_CHUNK),
+                    "rpc_retrasadas",
+                )
+                return [i for res in resultados for i in (res.data or [])]
+            except APIError as e:
+                if e.code not in ("PGRST202", "42883"):   # función inexistente
+                    raise
+                self._rpc_retrasadas_disponible = False
+
+        def marcar(chunk: List[dict]) -> List[str]:
+            f = chunk[0]
+            qy = (self.client.table("tareas")
+                  .update({"retrasada": True, "row_hash": f["row_hash"]})
+                  .eq("id_tarea_planner", f["id_tarea_planner"])
+                  .not_.is_("retrasada", "true"))
+            if f["row_hash_anterior"] is None:
+                qy = qy.is_("row_hash", "null")
+            else:
+                qy = qy.eq("row_hash", f["row_hash_anterior"])
+            return [r["id_tarea_planner"] for r in (qy.execute().data or [])]
+
+        # de a una tarea por request: un reintento no pierde las que ya se marcaron
+        resultados = _en_paralelo(marcar, _chunks(filas, 1), "marcar_retrasadas")
+        return [i for ids in resultados for i in ids]
+
+    # columna `busqueda` de sql/003_busqueda.sql; si no existe se vuelve a ILIKE
+    _fts_disponible = True
+
+    def consultar(self, filtros, order_by, desc, limit, offset, keyset, conteo, columnas):
+        try:
+            return self._consultar(filtros, order_by, desc, limit, offset, keyset, conteo, columnas)
+        except APIError as e:
+            if filtros["q"] and self._fts_disponible and e.code == "42703":   # columna inexistente
+                self._fts_disponible = False
+                return self._consultar(filtros, order_by, desc, limit, offset, keyset, conteo, columnas)
+            raise
+
+    def _consultar(self, filtros, order_by, desc, limit, offset, keyset, conteo, columnas):
+        select = ",".join(columnas) if columnas else COLUMNAS_TAREA
+        if conteo == "none":
+            qy = self.client.table("tareas").select(select)
+        else:
+            qy = self.client.table("tareas").select(select, count=conteo)
+
+        f = filtros
+        if f["estados"]: qy = qy.in_("estado", f["estados"])
+        if f["prioridades"]: qy = qy.in_("prioridad", f["prioridades"])
+        if f["colaboradores"]: qy = qy.in_("colaborador", f["colaboradores"])
+        if f["tablero"]: qy = qy.eq("nombre_tablero", f["tablero"])
+        if f["vencida"] is not None:
+            qy = qy.is_("retrasada", "true") if f["vencida"] else qy.not_.is_("retrasada", "true")
+
+        if f["desde"]: qy = qy.gte("fecha_creacion", f["desde"])
+        if f["hasta"]: qy = qy.lte("fecha_creacion", f["hasta"])
+
+        if f["vencimiento_desde"]: qy = qy.gte("fecha_vencimiento", f["vencimiento_desde"])
+        if f["vencimiento_hasta"]: qy = qy.lte("fecha_vencimiento", f["vencimiento_hasta"])
+        if f["finalizacion_desde"]: qy = qy.gte("fecha_finalizacion", f["finalizacion_desde"])
+        if f["finalizacion_hasta"]: qy = qy.lte("fecha_finalizacion", f["finalizacion_hasta"])
+
+        if f["q"]:
+            palabras = palabras_busqueda(f["q"])
+            if self._fts_disponible and palabras:
+                qy = qy.filter("busqueda", "fts(simple)", _tsquery(palabras))
+            else:
+                like = f"%{f['q']}%"
+                qy = qy.or_(f"nombre_tarea.ilike.{like},descripcion.ilike.{like}")
+
+        if keyset is not None:
+            qy = _filtro_keyset(qy, order_by, desc, *keyset)
+            qy = qy.order(order_by, desc=desc).order("id", desc=desc).limit(limit)
+        else:
+            qy = qy.order(order_by, desc=desc).order("id", desc=desc).range(offset, offset + limit - 1)
+
+        res = _retry(qy.execute, "consultar")
+        total = (res.count or 0) if conteo != "none" else None
+        return res.data or [], total
+
+    def filas_facetas(self) -> Iterable[dict]:
+        """Recorre la tabla completa por páginas, solo con las columnas de facetas."""
+        campos = "id_tarea_planner," + ",".join(FACET_COLUMNS)
+        offset = 0
+        while True:
+            res = _retry(lambda: self.client.table("tareas")
+                         .select(campos)
+                         .order("id")
+                         .range(offset, offset + SCAN_PAGE - 1)
+                         .execute(), "facetas")
+            filas = res.data or []
+            yield from filas
+            if len(filas) < SCAN_PAGE:
+                break
+            offset += SCAN_PAGE
+
+    def buscar(self, palabras: List[str], limit: int, tablero: Optional[str]) -> List[dict]:
+        if self._fts_disponible:
+            try:
+                res = _retry(lambda: self.client.rpc(
+                    "buscar_tareas", {"p_q": _tsquery(palabras), "p_limit": limit, "p_tablero": tablero}
+                ).execute(), "rpc_buscar")
+                return res.data or []
+            except APIError as e:
+                if e.code not in ("PGRST202", "42883"):   # función inexistente
+                    raise
+                self._fts_disponible = False
+        # sin la migración: ILIKE sin ranking
+        filtros = dict.fromkeys(("estados", "prioridades", "colaboradores", "desde", "hasta", "vencida",
+                                 "vencimiento_desde", "vencimiento_hasta", "finalizacion_desde", "finalizacion_hasta"))
+        filtros.update(tablero=tablero, q=" ".join(palabras))
+        data, _ = self._consultar(filtros, "fecha_creacion", True, limit, 0, None, "none", None)
+        return data
+
+    _rpc_stats_disponible = True
+    # firma con p_vencida (sql/005_retrasadas.sql); una base con solo sql/002 no la tiene
+    _rpc_stats_vencida = True
+
+    def stats(self, params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Agregados calculados en la base (sql/002_tareas_stats.sql; `q` con el mismo FTS que
+        filtrar_tareas desde sql/006_stats_busqueda.sql). None si la función
+        no está instalada; se recuerda para no volver a intentarlo en cada request.
+        Si lo que falta es solo la firma con p_vencida, se deja de usar para ese filtro y
+        el resto de las consultas sigue yendo a la función.
+        """
+        con_vencida = "p_vencida" in params
+        if not self._rpc_stats_disponible or (con_vencida and not self._rpc_stats_vencida):
+            return None
+        try:
+            res = _retry(lambda: self.client.rpc("tareas_stats", params).execute(), "rpc_stats")
+        except APIError as e:
+            if e.code in ("PGRST202", "42883"):   # función (o firma) inexistente
+                if con_vencida:
+                    self._rpc_stats_vencida = False
+                else:
+                    self._rpc_stats_disponible = False
+                return None
+            raise
+        return res.data
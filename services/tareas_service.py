@@ -0,0 +1,466 @@
+import json, time, base64, hashlib
+from datetime import date
+from typing import List, Dict, Any, Set, Tuple, Optional, Iterable, Iterator, Callable
+
+from services.cache import cache_consultas
+from services.facetas_cache import indice_facetas
+from services.huellas import get_huellas
+from services.metricas import medir, FILTRAR, forma_filtros
+from services.multiproceso import bloquear_tableros
+from services.repositorio import get_repositorio, palabras_busqueda
+
+# Solo columnas que EXISTEN en la tabla
+COMPARE_FIELDS = [
+    "nombre_tarea","descripcion","colaborador","creado_por",
+    "estado","prioridad",
+    "fecha_creacion","fecha_vencimiento","fecha_finalizacion",
+    "completado_por","etiquetas","checklist",
+    "retrasada","nombre_tablero",
+]
+
+# Estados en los que una tarea ya no puede quedar retrasada
+ESTADOS_CERRADOS = ("Implementado", "Efectividad verificada", "No efectivo")
+
+# Columna con el hash de contenido de COMPARE_FIELDS (ver sql/001_row_hash.sql)
+HASH_FIELD = "row_hash"
+
+# Columnas que se pueden pedir con fields= (SQLite interpola los nombres en el select)
+CAMPOS_TAREA = ["id", "id_tarea_planner", *COMPARE_FIELDS, "eliminada"]
+
+SAFE_ORDER_COLUMNS = {
+    "fecha_creacion","fecha_vencimiento","fecha_finalizacion",
+    "prioridad","estado","colaborador","nombre_tablero"
+}
+
+def _coerce_types(t: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Forma canónica para el hash y el upsert. Las filas de excel_service ya llegan así
+    (listas ordenadas, fechas ISO, None en vez de NaN) y pasan sin cambios; esto cubre
+    filas armadas a mano (un solo nivel, sin recorrer el payload recursivamente).
+    """
+    out = dict(t)
+
+    et = out.get("etiquetas")
+    if isinstance(et, str):
+        et = et.split(";")
+    # orden canónico: el row_hash no debe depender del orden de entrada
+    out["etiquetas"] = sorted({str(x).strip() for x in (et or []) if str(x).strip()})
+
+    # checklist -> None si vacío
+    cl = out.get("checklist")
+    if not cl or (isinstance(cl, dict) and not cl.get("items")):
+        out["checklist"] = None
+    elif isinstance(cl, dict) and isinstance(cl.get("items"), list):
+        out["checklist"] = {**cl, "items": sorted(cl["items"], key=str)}
+
+    # fechas a ISO (YYYY-MM-DD)
+    for k in ("fecha_creacion","fecha_vencimiento","fecha_finalizacion"):
+        v = out.get(k)
+        if hasattr(v, "isoformat"):
+            out[k] = v.isoformat()
+
+    return out
+
+def _row_hash(t: Dict[str, Any]) -> str:
+    """
+    Hash estable del contenido comparable: valores de COMPARE_FIELDS en orden fijo,
+    serializados en JSON compacto. Espera una fila ya pasada por _coerce_types.
+    """
+    canon = json.dumps([t.get(k) for k in COMPARE_FIELDS], sort_keys=True,
+                       ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.blake2b(canon.encode("utf-8"), digest_size=16).hexdigest()
+
+def _preparar(tareas: List[dict]) -> Dict[str, dict]:
+    """Forma canónica + hash por fila, indexado por id; si un ID viene repetido gana la última."""
+    por_id: Dict[str, dict] = {}
+    with medir("preparar"):
+        for t in tareas:
+            t = _coerce_types(t)
+            t[HASH_FIELD] = _row_hash(t)
+            if t.get("id_tarea_planner"):
+                por_id[t["id_tarea_planner"]] = t
+    return por_id
+
+def calcular_diff(
+    por_id: Dict[str, dict], existentes: Dict[str, Dict[str, Any]],
+) -> Tuple[List[dict], int, int]:
+    """
+    Compara por row_hash contra `existentes` (salida de buscar_hashes). Devuelve
+    (filas a upsertar, insertadas, actualizadas); las actualizadas llevan el id de la base.
+    """
+    insertadas, actualizadas = 0, 0
+    a_upsert: List[dict] = []
+
+    for nueva in por_id.values():
+        id_ = nueva["id_tarea_planner"]
+        actual = existentes.get(id_)
+
+        if not actual:
+            insertadas += 1
+            a_upsert.append(nueva)
+            continue
+
+        # filas sin row_hash (previas a la columna) se reescriben y quedan con hash
+        if actual.get(HASH_FIELD) == nueva[HASH_FIELD]:
+            continue
+
+        upd = dict(nueva)
+        upd["id"] = actual["id"]
+        actualizadas += 1
+        a_upsert.append(upd)
+
+    return a_upsert, insertadas, actualizadas
+
+def _aplicar(por_id: Dict[str, dict], existentes: Optional[Dict[str, Dict[str, Any]]] = None) -> Tuple[int,int]:
+    """
+    Diff contra el motor por row_hash + upsert de lo que cambió. Devuelve (insertadas, actualizadas).
+    `existentes`: hashes ya consultados (p.ej. en una previsualización); si no, se piden al motor.
+    """
+    ids = list(por_id.keys())
+    if not ids:
+        return (0,0)
+
+    # Traer existentes: solo id + hash (no hace falta el contenido para comparar)
+    repo = get_repositorio()
+    if existentes is None:
+        with medir("buscar_hashes"):
+            existentes = repo.buscar_hashes(ids)
+
+    with medir("diff"):
+        a_upsert, insertadas, actualizadas = calcular_diff(por_id, existentes)
+
+    if a_upsert:
+        with medir("upsert"):
+            repo.upsert(a_upsert)
+        with medir("indices"):
+            indice_facetas.aplicar(a_upsert)
+            cache_consultas.invalidar()
+
+    # todo el lote quedó igual a la base: se guarda su huella para el modo delta
+    with medir("huellas"):
+        get_huellas().registrar(por_id.values(), HASH_FIELD)
+    return (insertadas, actualizadas)
+
+def diff_lotes(lotes: Iterable[List[dict]]) -> Tuple[Dict[str, int], Dict[str, Dict[str, Any]]]:
+    """
+    Lo que haría insertar_lotes sin escribir nada: ({procesadas, insertadas, actualizadas,
+    sin_cambios}, hashes de la base de las filas que ya existen, para reusar al confirmar).
+    """
+    repo = get_repositorio()
+    conteos = dict(procesadas=0, insertadas=0, actualizadas=0, sin_cambios=0)
+    existentes: Dict[str, Dict[str, Any]] = {}
+    for lote in lotes:
+        por_id = _preparar(lote)
+        with medir("buscar_hashes"):
+            actuales = repo.buscar_hashes(list(por_id.keys()))
+        with medir("diff"):
+            _, ins, act = calcular_diff(por_id, actuales)
+        existentes.update(actuales)
+        conteos["procesadas"] += len(lote)
+        conteos["insertadas"] += ins
+        conteos["actualizadas"] += act
+        conteos["sin_cambios"] += len(por_id) - ins - act
+    return conteos, existentes
+
+def _tableros(por_id: Dict[str, dict]) -> Set[Optional[str]]:
+    return {t.get("nombre_tablero") for t in por_id.values()}
+
+def insertar_tareas(tareas: List[dict]) -> Tuple[int,int]:
+    if not tareas:
+        return (0,0)
+    por_id = _preparar(tareas)
+    with bloquear_tableros(_tableros(por_id)):
+        return _aplicar(por_id)
+
+MODOS_IMPORTACION = ("completo", "delta")
+
+def insertar_lotes(
+    lotes: Iterable[List[dict]],
+    progreso: Optional[Callable[[Dict[str, int]], None]] = None,
+    modo: str = "completo",
+    detectar_eliminadas: bool = False,
+    existentes: Optional[Dict[str, Dict[str, Any]]] = None,
+    generacion: Optional[int] = None,
+) -> Dict[str, int]:
+    """
+    Consume los lotes de a uno (diff + upsert por lote) para que la memoria no
+    crezca con el tamaño del archivo. `progreso` recibe los acumulados después de cada lote.
+
+    modo="delta" descarta antes de tocar el motor las filas cuyo hash coincide con la
+    huella local (services/huellas.py): un re-upload con pocos cambios solo consulta y
+    escribe esos pocos. detectar_eliminadas marca `eliminada` en las tareas conocidas de
+    los tableros presentes en el archivo que no vinieron en él (al terminar sin errores).
+    `existentes` (de diff_lotes, leído en la generación `generacion` de cache_consultas)
+    evita volver a pedir los hashes al motor: las filas que no están ahí se insertan.
+    Se descarta en cuanto hay una escritura que no es de este upload.
+
+    Cada lote hace lectura de hashes + diff + upsert con sus tableros bloqueados
+    (services/multiproceso.py): dos uploads del mismo tablero, en hilos o workers
+    distintos, no escriben sobre un diff viejo. Todo el upload va dentro de
+    agrupar_escrituras() del repositorio (el snapshot se rearma una vez, al final).
+
+    Devuelve {procesadas, insertadas, actualizadas, sin_cambios, eliminadas}.
+    """
+    huellas = get_huellas()
+    resumen = dict(procesadas=0, insertadas=0, actualizadas=0, sin_cambios=0, eliminadas=0)
+    vistos: Set[str] = set()
+    tableros: Set[Optional[str]] = set()
+
+    # generación en la que `existentes` es válido; se corre con cada invalidación propia
+    esperada = cache_consultas.generacion if generacion is None else generacion
+
+    with get_repositorio().agrupar_escrituras():
+        for lote in lotes:
+            resumen["procesadas"] += len(lote)
+            por_id = _preparar(lote)
+            if detectar_eliminadas:
+                vistos.update(por_id)
+                tableros.update(_tableros(por_id))
+
+            with bloquear_tableros(_tableros(por_id)):
+                with medir("huellas"):
+                    cambiadas, reaparecidas = huellas.separar(por_id, HASH_FIELD)
+                if reaparecidas:
+                    get_repositorio().marcar_eliminadas(reaparecidas, False)
+                    huellas.vigentes(reaparecidas)
+                    cache_consultas.invalidar()
+                    esperada += 1
+
+                if existentes is not None and cache_consultas.generacion != esperada:
+                    existentes = None   # alguien más escribió: el diff previo puede estar viejo
+
+                aplicar = cambiadas if modo == "delta" else por_id
+                ins, act = _aplicar(aplicar, None if existentes is None else
+                                    {i: existentes[i] for i in aplicar if i in existentes})
+                if ins or act:
+                    esperada += 1
+            resumen["insertadas"] += ins
+            resumen["actualizadas"] += act
+            resumen["sin_cambios"] += len(por_id) - ins - act
+            if progreso:
+                progreso(dict(resumen))
+
+        if detectar_eliminadas and vistos:
+            with bloquear_tableros(tableros):
+                faltan = huellas.faltantes(tableros, vistos)
+                if faltan:
+                    get_repositorio().marcar_eliminadas(faltan, True)
+                    huellas.marcar_eliminadas(faltan)
+                    cache_consultas.invalidar()
+            resumen["eliminadas"] = len(faltan)
+    return resumen
+
+def actualizar_retrasadas(hoy: Optional[date] = None) -> int:
+    """
+    Marca retrasada=true en las tareas abiertas que vencieron desde el último upload
+    (en el Excel se calcula con la fecha del día en que se subió). Devuelve cuántas marcó.
+    El row_hash (y la huella) se recalcula con retrasada=true: un re-upload del mismo
+    export no vuelve a escribir esas filas.
+    """
+    hoy = hoy or date.today()
+    repo = get_repositorio()
+    with medir("retrasadas"):
+        nuevas: Dict[str, dict] = {}
+        anteriores: Dict[str, Optional[str]] = {}
+        eliminadas: Set[str] = set()
+        for fila in repo.vencidas_sin_marcar(hoy.isoformat(), ESTADOS_CERRADOS):
+            t = _coerce_types({k: fila.get(k) for k in ("id_tarea_planner", *COMPARE_FIELDS)})
+            t["retrasada"] = True
+            t[HASH_FIELD] = _row_hash(t)
+            nuevas[t["id_tarea_planner"]] = t
+            anteriores[t["id_tarea_planner"]] = fila.get(HASH_FIELD)
+            if fila.get("eliminada"):
+                eliminadas.add(t["id_tarea_planner"])
+        if not nuevas:
+            return 0
+        # una tarea que cambió entre la lectura y el update (p.ej. un upload) queda afuera
+        ids = repo.marcar_retrasadas({i: (anteriores[i], t[HASH_FIELD]) for i, t in nuevas.items()})
+    if ids:
+        # registrar() da la huella por vigente: las marcadas como eliminadas se dejan como están
+        get_huellas().registrar((nuevas[i] for i in ids if i not in eliminadas), HASH_FIELD)
+        cache_consultas.invalidar()
+    return len(ids)
+
+def _split(v: Optional[str]) -> Optional[List[str]]:
+    """CSV → lista ordenada sin repetidos (así 'a,b' y 'b,a' son la misma consulta)."""
+    if not v:
+        return None
+    return sorted({x.strip() for x in v.split(",") if x.strip()}) or None
+
+# Modos de conteo: exact = count(*) real; planned/estimated = estimación del planner; none = sin conteo
+COUNT_MODES = {"exact", "planned", "estimated", "none"}
+
+def _encode_cursor(order_by: str, desc: bool, fila: Dict[str, Any]) -> str:
+    raw = json.dumps([order_by, desc, fila.get(order_by), fila.get("id")], default=str, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+def _decode_cursor(cursor: str, order_by: str, desc: bool) -> Tuple[Any, Any]:
+    try:
+        pad = "=" * (-len(cursor) % 4)
+        col, c_desc, valor, id_ = json.loads(base64.urlsafe_b64decode(cursor + pad))
+    except Exception:
+        raise ValueError("cursor inválido")
+    if col != order_by or bool(c_desc) != desc:
+        raise ValueError("el cursor no corresponde a order_by/order_dir pedidos")
+    return valor, id_
+
+def campos_pedidos(fields: Optional[str]) -> Optional[List[str]]:
+    """'nombre_tarea,estado' → lista en el orden pedido, sin repetidos; None = todas las columnas."""
+    if not fields:
+        return None
+    campos = list(dict.fromkeys(c.strip() for c in fields.split(",") if c.strip()))
+    desconocidos = [c for c in campos if c not in CAMPOS_TAREA]
+    if desconocidos:
+        raise ValueError(f"fields desconocidos: {', '.join(desconocidos)}")
+    return campos or None
+
+def a_columnas(data: List[dict]) -> Dict[str, list]:
+    """Filas → un arreglo por campo (mismo orden de filas); formato compacto para la grilla."""
+    if not data:
+        return {}
+    return {c: [f.get(c) for f in data] for c in data[0]}
+
+def filtrar_tareas(
+    estado: Optional[str]=None, prioridad: Optional[str]=None, colaborador: Optional[str]=None, tablero: Optional[str]=None,
+    desde: Optional[str]=None, hasta: Optional[str]=None, q: Optional[str]=None, order_by: str="fecha_creacion",
+    order_dir: str="desc", limit: int=100, offset: int=0,
+    vencida: Optional[bool]=None,
+    vencimiento_desde: Optional[str]=None, vencimiento_hasta: Optional[str]=None,
+    finalizacion_desde: Optional[str]=None, finalizacion_hasta: Optional[str]=None,
+    paginacion: str="offset", cursor: Optional[str]=None, conteo: str="exact",
+    usar_cache: bool=True, columnas: Optional[List[str]]=None,
+) -> Tuple[List[dict], Optional[int], Optional[str]]:
+    """
+    Devuelve (data, total, next_cursor).
+    paginacion="cursor" (o pasar `cursor`) pagina por keyset sobre (order_by, id) e ignora offset;
+    next_cursor es None cuando no hay más filas. total es None con conteo="none".
+    usar_cache=False para recorridos completos (exportaciones) que no conviene guardar.
+    columnas limita el select (id y order_by se agregan siempre: los necesita el cursor).
+    """
+    filtros = {
+        "estados": _split(estado),
+        "prioridades": _split(prioridad),
+        "colaboradores": _split(colaborador),
+        "tablero": tablero or None,
+        "desde": desde,
+        "hasta": hasta,
+        "q": q.strip() if q and q.strip() else None,
+        "vencida": vencida,
+        "vencimiento_desde": vencimiento_desde,
+        "vencimiento_hasta": vencimiento_hasta,
+        "finalizacion_desde": finalizacion_desde,
+        "finalizacion_hasta": finalizacion_hasta,
+    }
+
+    if order_by not in SAFE_ORDER_COLUMNS:
+        order_by = "fecha_creacion"
+    desc = order_dir.lower() == "desc"
+
+    limit = max(1, min(1000, int(limit)))
+    offset = max(0, int(offset))
+
+    por_cursor = paginacion == "cursor" or bool(cursor)
+    if por_cursor:
+        offset = 0
+    if conteo not in COUNT_MODES:
+        conteo = "exact"
+    if columnas and not set(columnas) <= set(CAMPOS_TAREA):
+        raise ValueError("columnas desconocidas: " + ", ".join(c for c in columnas if c not in CAMPOS_TAREA))
+    campos = list(dict.fromkeys(["id", order_by, *columnas])) if columnas else None
+
+    clave = (
+        tuple((k, tuple(v) if isinstance(v, list) else v) for k, v in filtros.items()),
+        order_by, desc, limit, offset, por_cursor, cursor, conteo, tuple(campos or ()),
+    )
+    t0 = time.perf_counter()
+    forma = forma_filtros(filtros)
+    if usar_cache:
+        cacheado = cache_consultas.get(clave)
+        if cacheado is not None:
+            FILTRAR.labels(forma, "hit").observe(time.perf_counter() - t0)
+            return cacheado
+    generacion = cache_consultas.generacion
+
+    keyset = _decode_cursor(cursor, order_by, desc) if cursor else None
+    # en modo cursor, una fila extra para saber si hay página siguiente sin contar
+    with medir("consultar"):
+        data, total = get_repositorio().consultar(
+            filtros, order_by=order_by, desc=desc,
+            limit=limit + 1 if por_cursor else limit, offset=offset,
+            keyset=keyset, conteo=conteo, columnas=campos,
+        )
+
+    next_cursor = None
+    if por_cursor and len(data) > limit:
+        data = data[:limit]
+        next_cursor = _encode_cursor(order_by, desc, data[-1])
+
+    if usar_cache:
+        cache_consultas.set(clave, (data, total, next_cursor), generacion=generacion)
+    FILTRAR.labels(forma, "miss" if usar_cache else "sin_cache").observe(time.perf_counter() - t0)
+    return data, total, next_cursor
+
+# Filas por página al recorrer un resultado completo
+EXPORT_PAGE = 1000
+
+def iterar_tareas_filtradas(order_by: str="fecha_creacion", order_dir: str="desc", **filtros) -> Iterator[dict]:
+    """Todas las filas que cumplen los filtros, página a página por cursor y sin conteo."""
+    cursor = None
+    while True:
+        data, _, cursor = filtrar_tareas(
+            **filtros, order_by=order_by, order_dir=order_dir, limit=EXPORT_PAGE,
+            paginacion="cursor", cursor=cursor, conteo="none", usar_cache=False,
+        )
+        yield from data
+        if not cursor:
+            break
+
+def buscar_tareas(q: str, limit: int=20, tablero: Optional[str]=None) -> List[dict]:
+    """
+    Tareas que contienen todas las palabras de `q` (prefijo, sin acentos), de mayor a menor
+    relevancia: coincidencias en el nombre pesan más que en la descripción.
+    """
+    palabras = palabras_busqueda(q or "")
+    if not palabras:
+        return []
+    limit = max(1, min(100, int(limit)))
+    tablero = tablero or None
+
+    clave = ("buscar", tuple(palabras), limit, tablero)
+    cacheado = cache_consultas.get(clave)
+    if cacheado is not None:
+        return cacheado
+    generacion = cache_consultas.generacion
+
+    with medir("buscar"):
+        data = get_repositorio().buscar(palabras, limit, tablero)
+    cache_consultas.set(clave, data, generacion=generacion)
+    return data
+
+def rpc_tareas_stats(params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Agregados calculados por el backend; None si no los soporta (se calculan en stats_service)."""
+    with medir("stats_motor"):
+        return get_repositorio().stats(params)
+
+def _filas_facetas() -> Iterable[dict]:
+    return get_repositorio().filas_facetas()
+
+def obtener_facetas() -> Dict[str, list]:
+    indice_facetas.asegurar(_filas_facetas)
+    return indice_facetas.valores()
+
+def obtener_facetas_detalle() -> Tuple[Dict[str, list], Dict[str, Dict[str, int]], str]:
+    """
+    Valores, conteos por valor y ETag del índice de facetas. Pasa por cache_consultas:
+    con varios workers, el que arma el índice lo deja para el resto.
+    """
+    clave = ("facetas",)
+    cacheado = cache_consultas.get(clave)
+    if cacheado is not None:
+        return cacheado
+    generacion = cache_consultas.generacion
+    with medir("facetas"):
+        indice_facetas.asegurar(_filas_facetas)
+    detalle = (indice_facetas.valores(), indice_facetas.conteos(), indice_facetas.etag())
+    cache_consultas.set(clave, detalle, generacion=generacion)
+    return detalle
@@ -0,0 +1,417 @@
+import os, time, uuid, shutil, zipfile, hashlib, logging, tempfile, threading, multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Dict, Any, Optional, BinaryIO, Callable, Iterable, Iterator, List, Tuple
+
+from services.cache import cache_consultas
+from services.cache_parseos import get_cache_parseos
+from services.excel_service import (
+    EXCEL_BATCH_SIZE, EXTENSIONES_EXCEL, iterar_lotes_excel, motor_lectura, parsear_archivo,
+)
+from services.registro_jobs import get_registro_jobs
+from services.tareas_service import diff_lotes, insertar_lotes
+
+logger = logging.getLogger("api.upload")
+
+# Uploads procesados en paralelo y cantidad de jobs que se recuerdan para consulta
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", "2"))
+UPLOAD_JOBS_MAX = int(os.getenv("UPLOAD_JOBS_MAX", "200"))
+UPLOAD_DIR = os.getenv("UPLOAD_DIR") or tempfile.gettempdir()
+# Digests de archivos / Idempotency-Key recientes que se recuerdan para no reprocesar
+UPLOAD_DIGESTS_MAX = int(os.getenv("UPLOAD_DIGESTS_MAX", "100"))
+# Procesos para parsear archivos de un upload por lote (openpyxl/pandas no sueltan el GIL)
+UPLOAD_PROCESOS = int(os.getenv("UPLOAD_PROCESOS") or min(4, os.cpu_count() or 1))
+# Tope de lo que se descomprime de un .zip (MB)
+UPLOAD_ZIP_MAX_MB = int(os.getenv("UPLOAD_ZIP_MAX_MB", "500"))
+
+_executor = ThreadPoolExecutor(max_workers=UPLOAD_WORKERS, thread_name_prefix="upload")
+
+_proc_pool: Optional[ProcessPoolExecutor] = None
+_proc_pool_lock = threading.Lock()
+
+def _get_proc_pool() -> ProcessPoolExecutor:
+    global _proc_pool
+    with _proc_pool_lock:
+        if _proc_pool is None:
+            # spawn: no heredar hilos/locks del servidor al hacer fork
+            _proc_pool = ProcessPoolExecutor(max_workers=UPLOAD_PROCESOS, mp_context=multiprocessing.get_context("spawn"))
+        return _proc_pool
+
+# Jobs, digests e Idempotency-Key viven en services/registro_jobs.py (compartido entre workers).
+# Digest (digest, modo, detectar_eliminadas) → {"job_id", "instancia", "generacion", "resultado"}:
+# instancia/generacion = las de cache_consultas al terminar; si después hubo escrituras
+# (otro archivo) o un reinicio, el mismo archivo vuelve a procesarse porque ya no está
+# garantizado que la base lo refleje.
+
+class ConflictoIdempotencia(ValueError):
+    """La Idempotency-Key ya se usó con otro archivo u otras opciones."""
+
+class PreviaNoEncontrada(LookupError):
+    """No hay un parseo guardado para ese digest (nunca se previsualizó o ya se desalojó)."""
+
+# fases: en_cola → procesando → completado | error
+
+def _diff_vigente(diff: Dict[str, Any]) -> bool:
+    """
+    El diff (o el resultado de un digest) se calculó contra la base tal como está: misma
+    instancia y generación de cache_consultas (los diffs en disco sobreviven a un reinicio;
+    la generación vuelve a 0).
+    """
+    return diff.get("instancia") == cache_consultas.instancia and diff["generacion"] == cache_consultas.generacion
+
+def _actualizar(job_id: str, **campos) -> None:
+    get_registro_jobs().actualizar(job_id, **campos)
+
+def _ejecutar(
+    job_id: str, rutas: List[str], modo: str, detectar_eliminadas: bool,
+    lotes: Callable[[str, List[str]], Iterable[List[dict]]],
+    diff_previo: Optional[Dict[str, Any]] = None,
+) -> None:
+    # el diff de la previsualización sirve si nadie escribió en la base desde entonces
+    # (insertar_lotes lo vuelve a comprobar antes de cada lote)
+    existentes, generacion = None, None
+    if diff_previo is not None and _diff_vigente(diff_previo):
+        existentes, generacion = diff_previo["existentes"], diff_previo["generacion"]
+    _actualizar(job_id, fase="procesando", iniciado=time.time(), diff_reusado=existentes is not None)
+
+    def progreso(resumen: Dict[str, int]):
+        _actualizar(job_id, **resumen)
+
+    try:
+        resumen = insertar_lotes(
+            lotes(job_id, rutas), progreso=progreso, modo=modo, detectar_eliminadas=detectar_eliminadas,
+            existentes=existentes, generacion=generacion,
+        )
+        _actualizar(job_id, fase="completado", **resumen,
+                    tareas_cargadas=resumen["insertadas"] + resumen["actualizadas"], finalizado=time.time())
+        resultado = {**resumen, "tareas_cargadas": resumen["insertadas"] + resumen["actualizadas"]}
+        get_registro_jobs().completar_digests(job_id, cache_consultas.instancia, cache_consultas.generacion, resultado)
+        logger.info("✅ Job %s (%s): %d procesadas, %d insertadas, %d actualizadas, %d sin cambios, %d eliminadas",
+                    job_id, modo, resumen["procesadas"], resumen["insertadas"], resumen["actualizadas"],
+                    resumen["sin_cambios"], resumen["eliminadas"])
+    except Exception as e:
+        logger.exception("❌ Job %s falló", job_id)
+        _actualizar(job_id, fase="error", error=str(e), finalizado=time.time())
+        # un archivo que falló se puede volver a subir (también con la misma Idempotency-Key)
+        get_registro_jobs().olvidar_job(job_id)
+    finally:
+        for ruta in rutas:
+            try:
+                os.remove(ruta)
+            except OSError:
+                pass
+
+def _datos_lectura(lectura: Dict[str, Any]) -> Dict[str, Any]:
+    """Motor y tiempos de lectura para el estado del job (segundos redondeados)."""
+    return {k: round(v, 3) if isinstance(v, float) else v for k, v in lectura.items()}
+
+def _lotes_archivo(job_id: str, rutas: List[str]) -> Iterator[List[dict]]:
+    """Un archivo, primera hoja, en streaming."""
+    lectura: Dict[str, Any] = {}
+    yield from iterar_lotes_excel(rutas[0], lectura=lectura)
+    _actualizar(job_id, **_datos_lectura(lectura))
+
+def _expandir_zip(ruta: str, destino: List[str]) -> None:
+    """Extrae los Excel de un .zip a temporales y agrega sus rutas a `destino` (ignora carpetas y otros archivos)."""
+    total = 0
+    with zipfile.ZipFile(ruta) as zf:
+        for info in zf.infolist():
+            nombre = os.path.basename(info.filename)
+            if info.is_dir() or nombre.startswith((".", "~$")) or "__MACOSX" in info.filename:
+                continue
+            if not nombre.lower().endswith(EXTENSIONES_EXCEL):
+                continue
+            total += info.file_size
+            if total > UPLOAD_ZIP_MAX_MB * 2**20:
+                raise ValueError(f"El .zip supera {UPLOAD_ZIP_MAX_MB} MB descomprimido")
+            with zf.open(info) as origen, tempfile.NamedTemporaryFile(
+                delete=False, suffix=os.path.splitext(nombre)[1], dir=UPLOAD_DIR,
+            ) as tmp:
+                destino.append(tmp.name)
+                shutil.copyfileobj(origen, tmp, 1024 * 1024)
+
+def _lotes_consolidados(job_id: str, rutas: List[str]) -> Iterator[List[dict]]:
+    """
+    Varios archivos (y .zip) con todas sus hojas: se parsean en paralelo en procesos,
+    se unen por id_tarea_planner (gana el último archivo/hoja/fila) y se entregan en
+    lotes para un único diff/upsert.
+    """
+    archivos: List[str] = []
+    extraidos: List[str] = []
+    try:
+        for ruta in rutas:
+            if ruta.lower().endswith(".zip"):
+                n = len(extraidos)
+                _expandir_zip(ruta, extraidos)
+                archivos.extend(extraidos[n:])
+            else:
+                archivos.append(ruta)
+    finally:
+        # los extraídos se borran al final del job junto con los subidos
+        rutas.extend(extraidos)
+    if not archivos:
+        raise ValueError("No se encontraron archivos Excel en el upload")
+    _actualizar(job_id, archivos_procesados=len(archivos))
+
+    por_id: Dict[str, dict] = {}
+    leidas = 0
+    motores: List[str] = []
+    lectura = {"segundos_lectura": 0.0, "segundos_normalizar": 0.0}
+    t0 = time.perf_counter()
+    # map respeta el orden de entrada: el merge es determinista aunque terminen en otro orden
+    for tareas, datos in _get_proc_pool().map(parsear_archivo, archivos):
+        leidas += len(tareas)
+        for t in tareas:
+            por_id[t["id_tarea_planner"]] = t
+        if datos["motor_excel"] not in motores:
+            motores.append(datos["motor_excel"])
+        # suma de lo que tardó cada proceso (no el tiempo de pared: eso es segundos_parseo)
+        lectura["segundos_lectura"] += datos["segundos_lectura"]
+        lectura["segundos_normalizar"] += datos["segundos_normalizar"]
+    _actualizar(job_id, filas_leidas=leidas, duplicadas=leidas - len(por_id),
+                segundos_parseo=round(time.perf_counter() - t0, 3),
+                **_datos_lectura({"motor_excel": ", ".join(motores), **lectura}))
+
+    filas = list(por_id.values())
+    del por_id
+    for i in range(0, len(filas), EXCEL_BATCH_SIZE):
+        yield filas[i:i + EXCEL_BATCH_SIZE]
+
+def _vivo(pid: Optional[int]) -> bool:
+    """El worker que tiene el job sigue corriendo (si murió, el job no va a terminar)."""
+    if pid is None or pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def _previo(clave_digest: tuple) -> Optional[Dict[str, Any]]:
+    """Job ya hecho (o en curso) con el mismo archivo y opciones, si sigue siendo válido."""
+    registro = get_registro_jobs()
+    entrada = registro.digest(clave_digest)
+    if entrada is None:
+        return None
+    if entrada["generacion"] is None:
+        job = registro.job(entrada["job_id"])
+        if job is not None and job["fase"] in ("en_cola", "procesando") and _vivo(job.get("pid")):
+            return {"job_id": entrada["job_id"], "duplicado": True, "resultado": None}
+        return None
+    if _diff_vigente(entrada):
+        return {"job_id": entrada["job_id"], "duplicado": True, "resultado": entrada["resultado"]}
+    return None
+
+def _guardar(fobj: BinaryIO, sufijo: str) -> Tuple[str, str]:
+    """Copia el upload a un temporal calculando su digest al vuelo. Devuelve (ruta, digest)."""
+    h = hashlib.blake2b(digest_size=20)
+    with tempfile.NamedTemporaryFile(delete=False, suffix=sufijo, dir=UPLOAD_DIR) as tmp:
+        while True:
+            bloque = fobj.read(1024 * 1024)
+            if not bloque:
+                break
+            h.update(bloque)
+            tmp.write(bloque)
+    return tmp.name, h.hexdigest()
+
+def _encolar(
+    nombre: Optional[str], digest: str, rutas: List[str], modo: str, detectar_eliminadas: bool,
+    idempotency_key: Optional[str], lotes: Callable[[str, List[str]], Iterable[List[dict]]],
+    diff_previo: Optional[Dict[str, Any]] = None, **extra: Any,
+) -> Dict[str, Any]:
+    """Dedupe por digest / Idempotency-Key y alta del job. Devuelve {"job_id", "duplicado", "resultado"}."""
+    clave_digest = (digest, modo, detectar_eliminadas)
+
+    registro = get_registro_jobs()
+    # chequeo de dedupe + alta en una transacción: dos workers con el mismo archivo no encolan dos jobs
+    with registro.transaccion():
+        previo = None
+        usada = registro.clave(idempotency_key) if idempotency_key else None
+        if usada is not None:
+            job_previo, clave_previa = usada
+            if clave_previa != clave_digest:
+                previo = ConflictoIdempotencia("Idempotency-Key ya usada con otro archivo u otras opciones")
+            else:
+                entrada = registro.digest(clave_digest) or {}
+                previo = {"job_id": job_previo, "duplicado": True, "resultado": entrada.get("resultado")}
+        if previo is None:
+            previo = _previo(clave_digest)
+            # la clave queda atada al job reusado: con otro archivo después es un conflicto
+            if previo is not None and idempotency_key:
+                registro.recordar_clave(idempotency_key, previo["job_id"], clave_digest, UPLOAD_DIGESTS_MAX)
+
+        if previo is None:
+            job_id = uuid.uuid4().hex
+            registro.guardar_job({
+                "job_id": job_id,
+                "archivo": nombre,
+                "digest": digest,
+                **extra,
+                "fase": "en_cola",
+                "modo": modo,
+                "pid": os.getpid(),
+                "procesadas": 0,
+                "insertadas": 0,
+                "actualizadas": 0,
+                "sin_cambios": 0,
+                "eliminadas": 0,
+                "tareas_cargadas": 0,
+                "error": None,
+                "creado": time.time(),
+                "iniciado": None,
+                "finalizado": None,
+            })
+            registro.recordar_digest(clave_digest, job_id, UPLOAD_DIGESTS_MAX)
+            if idempotency_key:
+                registro.recordar_clave(idempotency_key, job_id, clave_digest, UPLOAD_DIGESTS_MAX)
+            # descartar los jobs más viejos ya terminados
+            registro.recortar_jobs(UPLOAD_JOBS_MAX)
+
+    if previo is not None:
+        for ruta in rutas:
+            os.remove(ruta)
+        if isinstance(previo, ConflictoIdempotencia):
+            raise previo
+        logger.info("♻️ Archivo %s ya procesado (digest %s): job %s", nombre, digest[:12], previo["job_id"])
+        return previo
+
+    _executor.submit(_ejecutar, job_id, rutas, modo, detectar_eliminadas, lotes, diff_previo)
+    return {"job_id": job_id, "duplicado": False, "resultado": None}
+
+def crear_job(
+    nombre_archivo: Optional[str], fobj: BinaryIO, modo: str = "completo", detectar_eliminadas: bool = False,
+    idempotency_key: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Guarda el archivo subido en disco (calculando su digest al vuelo) y encola su procesamiento.
+    Si el mismo archivo ya se aplicó y la base no cambió desde entonces, o ya está en curso,
+    o la Idempotency-Key ya se usó, no se vuelve a procesar.
+    Devuelve {"job_id", "duplicado", "resultado", "motor_excel"} (resultado: conteos del job
+    original si terminó; motor_excel: lector elegido según extensión, tamaño y EXCEL_ENGINE).
+    ValueError si el tipo de archivo no está soportado.
+    """
+    motor_lectura(nombre_archivo)   # ValueError si no se puede leer, antes de copiarlo
+    ruta, digest = _guardar(fobj, os.path.splitext(nombre_archivo or "")[1].lower() or ".xlsx")
+    motor = motor_lectura(nombre_archivo, os.path.getsize(ruta))
+    job = _encolar(nombre_archivo, digest, [ruta], modo, detectar_eliminadas, idempotency_key,
+                   _lotes_archivo, motor_excel=motor)
+    return {**job, "motor_excel": motor}
+
+def crear_job_lote(
+    archivos: List[Tuple[Optional[str], BinaryIO]], modo: str = "completo", detectar_eliminadas: bool = False,
+    idempotency_key: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Igual que crear_job para varios archivos (.xlsx/.xlsm/.ods/.csv o .zip con varios), todas las hojas.
+    El digest del lote depende del contenido y el orden de los archivos (el orden define
+    qué fila gana cuando un id se repite).
+    """
+    rutas: List[str] = []
+    digests: List[str] = []
+    nombres: List[str] = []
+    try:
+        for nombre, fobj in archivos:
+            nombre = nombre or "archivo.xlsx"
+            es_zip = nombre.lower().endswith(".zip")
+            if not es_zip:
+                motor_lectura(nombre)   # ValueError si no se puede leer
+            ruta, digest = _guardar(fobj, ".zip" if es_zip else os.path.splitext(nombre)[1])
+            rutas.append(ruta)
+            digests.append(digest)
+            nombres.append(nombre)
+    except Exception:
+        for ruta in rutas:
+            os.remove(ruta)
+        raise
+
+    digest = hashlib.blake2b("|".join(digests).encode(), digest_size=20).hexdigest()
+    return _encolar(", ".join(nombres), digest, rutas, modo, detectar_eliminadas, idempotency_key,
+                    _lotes_consolidados, archivos=nombres)
+
+def _existentes_json(existentes: Dict[str, Dict[str, Any]]) -> Dict[str, list]:
+    return {k: [v["id"], v.get("row_hash")] for k, v in existentes.items()}
+
+def _existentes_dict(existentes: Dict[str, list]) -> Dict[str, Dict[str, Any]]:
+    return {k: {"id": id_, "id_tarea_planner": k, "row_hash": h} for k, (id_, h) in existentes.items()}
+
+def previsualizar(nombre_archivo: Optional[str], fobj: BinaryIO) -> Dict[str, Any]:
+    """
+    Parsea el archivo como /upload-tareas (primera hoja) sin escribir en la base: devuelve
+    el mapeo de cabeceras, cantidad de filas y cuántas se insertarían/actualizarían/quedarían
+    igual. Las filas normalizadas quedan en el cache de parseos (por digest del archivo)
+    para confirmarlas con crear_job_commit; el mismo archivo no se vuelve a parsear.
+    Si no se pudieron cachear, el diff sale de las filas en memoria y "confirmable" es False.
+    ValueError si el tipo de archivo no está soportado.
+    """
+    motor_lectura(nombre_archivo)
+    ruta, digest = _guardar(fobj, os.path.splitext(nombre_archivo or "")[1].lower() or ".xlsx")
+    cache = get_cache_parseos()
+    try:
+        meta = cache.meta(digest)
+        en_cache = meta is not None
+        if meta is None:
+            lectura: Dict[str, Any] = {}
+            tareas = [t for lote in iterar_lotes_excel(ruta, lectura=lectura) for t in lote]
+            meta = {
+                "archivo": nombre_archivo,
+                "filas": len(tareas),
+                "duplicadas": len(tareas) - len({t["id_tarea_planner"] for t in tareas}),
+                **_datos_lectura(lectura),
+            }
+            if not cache.guardar(digest, tareas, meta):
+                conteos, _ = diff_lotes(
+                    tareas[i:i + EXCEL_BATCH_SIZE] for i in range(0, len(tareas), EXCEL_BATCH_SIZE)
+                )
+                logger.warning("🔎 Previsualización de %s (digest %s) sin cachear: %s",
+                               nombre_archivo, digest[:12], conteos)
+                return {"digest": digest, "en_cache": False, "confirmable": False, **meta, "diff": conteos}
+            del tareas
+    finally:
+        os.remove(ruta)
+
+    diff = cache.diff(digest)
+    if diff is None or not _diff_vigente(diff):
+        instancia, generacion = cache_consultas.instancia, cache_consultas.generacion
+        conteos, existentes = diff_lotes(cache.lotes(digest, EXCEL_BATCH_SIZE))
+        diff = {"instancia": instancia, "generacion": generacion,
+                "conteos": conteos, "existentes": _existentes_json(existentes)}
+        cache.guardar_diff(digest, diff)
+    logger.info("🔎 Previsualización de %s (digest %s, %s): %s", nombre_archivo, digest[:12],
+                "cache" if en_cache else "parseado", diff["conteos"])
+    return {"digest": digest, "en_cache": en_cache, "confirmable": True, **meta, "diff": diff["conteos"]}
+
+def crear_job_commit(
+    digest: str, modo: str = "completo", detectar_eliminadas: bool = False, idempotency_key: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Encola la carga de un archivo ya previsualizado, leyendo las filas del cache de parseos
+    (y reusando su diff si la base no cambió). Mismo dedupe que crear_job: el digest es el del archivo.
+    PreviaNoEncontrada si ese digest no está en el cache.
+    """
+    cache = get_cache_parseos()
+    meta = cache.meta(digest)
+    if meta is None:
+        raise PreviaNoEncontrada(f"No hay una previsualización guardada para {digest} (volver a llamar a /upload-tareas/preview)")
+    diff = cache.diff(digest)
+    diff_previo = None
+    if diff is not None:
+        diff_previo = {"instancia": diff.get("instancia"), "generacion": diff["generacion"],
+                       "existentes": _existentes_dict(diff["existentes"])}
+
+    def lotes(job_id: str, rutas: List[str]) -> Iterator[List[dict]]:
+        _actualizar(job_id, **{k: meta[k] for k in ("motor_excel", "segundos_lectura", "segundos_normalizar") if k in meta})
+        yield from cache.lotes(digest, EXCEL_BATCH_SIZE)
+
+    job = _encolar(meta.get("archivo"), digest, [], modo, detectar_eliminadas, idempotency_key,
+                   lotes, diff_previo, previa=True)
+    return {**job, "motor_excel": meta.get("motor_excel")}
+
+def obtener_job(job_id: str) -> Optional[Dict[str, Any]]:
+    job = get_registro_jobs().job(job_id)
+    if job is None:
+        return None
+
+    fin = job["finalizado"] or time.time()
+    job["segundos"] = round(fin - job["creado"], 3)
+    return job
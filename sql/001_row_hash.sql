@@ -0,0 +1,5 @@
+-- Hash de contenido por tarea: insertar_tareas compara solo id_tarea_planner + row_hash
+-- en lugar de traer y comparar todas las columnas.
+-- Las filas existentes quedan con NULL y se completan en el próximo upload que las incluya.
+alter table public.tareas
+  add column if not exists row_hash text;
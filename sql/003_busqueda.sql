@@ -0,0 +1,36 @@
+-- Búsqueda de texto para `q`: tsvector sin acentos (nombre con más peso que descripción) + índice GIN.
+-- filtrar_tareas filtra con  busqueda=fts(simple).palabra:* & otra:*  y /tareas-buscar usa buscar_tareas()
+-- para resultados ordenados por relevancia. Sin esta migración la API vuelve a ILIKE.
+create extension if not exists unaccent;
+
+-- unaccent() no es IMMUTABLE y no puede usarse en columnas generadas / índices: wrapper con diccionario fijo
+create or replace function public.f_unaccent(text) returns text
+language sql immutable parallel safe strict
+as $$ select public.unaccent('public.unaccent'::regdictionary, $1) $$;
+
+alter table public.tareas
+  add column if not exists busqueda tsvector
+  generated always as (
+    setweight(to_tsvector('simple', public.f_unaccent(coalesce(nombre_tarea, ''))), 'A') ||
+    setweight(to_tsvector('simple', public.f_unaccent(coalesce(descripcion, ''))), 'B')
+  ) stored;
+
+create index if not exists tareas_busqueda_idx on public.tareas using gin (busqueda);
+
+-- p_q: tsquery ya armado por la API (palabras sin acentos, prefijo con :*)
+create or replace function public.buscar_tareas(p_q text, p_limit int default 20, p_tablero text default null)
+returns jsonb
+language sql stable
+as $$
+  select coalesce(jsonb_agg(r.fila order by r.rank desc, r.id), '[]'::jsonb)
+  from (
+    select t.id,
+           ts_rank(t.busqueda, to_tsquery('simple', p_q)) as rank,
+           (to_jsonb(t) - 'busqueda') || jsonb_build_object('relevancia', ts_rank(t.busqueda, to_tsquery('simple', p_q))) as fila
+    from public.tareas t
+    where t.busqueda @@ to_tsquery('simple', p_q)
+      and (p_tablero is null or t.nombre_tablero = p_tablero)
+    order by rank desc, t.id
+    limit greatest(1, least(coalesce(p_limit, 20), 100))
+  ) r;
+$$;
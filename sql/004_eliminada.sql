@@ -0,0 +1,6 @@
+-- Tareas que dejaron de venir en el export de su tablero (upload con detectar_eliminadas=true).
+-- No se borran: quedan marcadas y se desmarcan si vuelven a aparecer.
+alter table public.tareas
+  add column if not exists eliminada boolean not null default false;
+
+create index if not exists tareas_eliminada_idx on public.tareas (nombre_tablero) where eliminada;
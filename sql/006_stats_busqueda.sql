@@ -0,0 +1,69 @@
+-- tareas_stats filtra `q` igual que filtrar_tareas (sql/003_busqueda.sql): todas las palabras, sin
+-- acentos y como prefijo, contra la columna `busqueda`; si `q` no tiene palabras (p.ej. "++"), ILIKE.
+-- Las palabras se arman como palabras_busqueda() en services/repositorio.py. Misma firma que en
+-- sql/005_retrasadas.sql: solo cambia el cuerpo.
+
+create or replace function public.tareas_stats(
+  p_estados text[] default null,
+  p_prioridades text[] default null,
+  p_colaboradores text[] default null,
+  p_tablero text default null,
+  p_desde date default null,
+  p_hasta date default null,
+  p_q text default null,
+  p_vencimiento_desde date default null,
+  p_vencimiento_hasta date default null,
+  p_finalizacion_desde date default null,
+  p_finalizacion_hasta date default null,
+  p_vencida boolean default null
+) returns jsonb
+language sql stable
+as $$
+  with q as (
+    select (
+      select to_tsquery('simple', string_agg(m[1] || ':*', ' & '))
+      from regexp_matches(lower(public.f_unaccent(p_q)), '(\w+)', 'g') m
+    ) as tsq
+  ),
+  t as (
+    select estado, colaborador, nombre_tablero, retrasada, fecha_creacion, fecha_finalizacion
+    from public.tareas, q
+    where (p_estados is null or estado = any(p_estados))
+      and (p_prioridades is null or prioridad = any(p_prioridades))
+      and (p_colaboradores is null or colaborador = any(p_colaboradores))
+      and (p_tablero is null or nombre_tablero = p_tablero)
+      and (p_desde is null or fecha_creacion >= p_desde)
+      and (p_hasta is null or fecha_creacion <= p_hasta)
+      and (p_vencimiento_desde is null or fecha_vencimiento >= p_vencimiento_desde)
+      and (p_vencimiento_hasta is null or fecha_vencimiento <= p_vencimiento_hasta)
+      and (p_finalizacion_desde is null or fecha_finalizacion >= p_finalizacion_desde)
+      and (p_finalizacion_hasta is null or fecha_finalizacion <= p_finalizacion_hasta)
+      and (p_vencida is null or coalesce(retrasada, false) = p_vencida)
+      and (p_q is null
+           or (q.tsq is not null and busqueda @@ q.tsq)
+           or (q.tsq is null and (nombre_tarea ilike '%' || p_q || '%' or descripcion ilike '%' || p_q || '%')))
+  ),
+  meses as (
+    select mes, sum(creadas)::int as creadas, sum(finalizadas)::int as finalizadas
+    from (
+      select to_char(fecha_creacion, 'YYYY-MM') as mes, 1 as creadas, 0 as finalizadas
+      from t where fecha_creacion is not null
+      union all
+      select to_char(fecha_finalizacion, 'YYYY-MM'), 0, 1
+      from t where fecha_finalizacion is not null
+    ) x
+    group by mes
+  )
+  select jsonb_build_object(
+    'total', (select count(*) from t),
+    'retrasadas', (select count(*) from t where retrasada),
+    'por_estado', coalesce((select jsonb_object_agg(estado, n order by estado)
+                            from (select estado, count(*) n from t where coalesce(estado, '') <> '' group by estado) s), '{}'::jsonb),
+    'por_colaborador', coalesce((select jsonb_object_agg(colaborador, n order by colaborador)
+                            from (select colaborador, count(*) n from t where coalesce(colaborador, '') <> '' group by colaborador) s), '{}'::jsonb),
+    'por_tablero', coalesce((select jsonb_object_agg(nombre_tablero, n order by nombre_tablero)
+                            from (select nombre_tablero, count(*) n from t where coalesce(nombre_tablero, '') <> '' group by nombre_tablero) s), '{}'::jsonb),
+    'mensual', coalesce((select jsonb_agg(jsonb_build_object('mes', mes, 'creadas', creadas, 'finalizadas', finalizadas) order by mes)
+                         from meses), '[]'::jsonb)
+  );
+$$;
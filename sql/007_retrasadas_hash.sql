@@ -0,0 +1,28 @@
+-- marcar_retrasadas() de sql/005_retrasadas.sql ponía retrasada = true sin tocar row_hash (el siguiente
+-- upload completo reescribía esas filas aunque no cambiaran) y salteaba las tareas con estado NULL.
+-- Ahora la API lee las vencidas, recalcula el hash con retrasada = true y esta función aplica los dos
+-- en un solo update, solo en las filas que no cambiaron desde la lectura (mismo row_hash).
+drop function if exists public.marcar_retrasadas(date);
+
+drop index if exists public.tareas_abiertas_vencimiento_idx;
+-- lectura de las vencidas sin marcar (el filtro por estado se aplica sobre estas pocas)
+create index if not exists tareas_sin_retrasar_idx on public.tareas (fecha_vencimiento)
+  where retrasada is not true;
+
+-- p_filas: [{"id_tarea_planner", "row_hash_anterior", "row_hash"}]. Devuelve los id_tarea_planner marcados.
+create or replace function public.marcar_retrasadas(p_filas jsonb)
+returns jsonb
+language sql volatile
+as $$
+  with marcadas as (
+    update public.tareas t
+       set retrasada = true,
+           row_hash = f.row_hash
+      from jsonb_to_recordset(p_filas) as f(id_tarea_planner text, row_hash_anterior text, row_hash text)
+     where t.id_tarea_planner = f.id_tarea_planner
+       and t.row_hash is not distinct from f.row_hash_anterior
+       and t.retrasada is not true
+    returning t.id_tarea_planner
+  )
+  select coalesce(jsonb_agg(id_tarea_planner), '[]'::jsonb) from marcadas;
+$$;
@@ -0,0 +1,39 @@
+import os, sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("HUELLAS_PATH", ":memory:")
+
+from services.cache_parseos import CacheParseos, set_cache_parseos
+from services.huellas import HuellasLocales, set_huellas
+from services.registro_jobs import RegistroJobs, set_registro_jobs
+from services.repositorio import set_repositorio
+from services.sqlite_service import RepositorioSQLite
+
+
+@pytest.fixture
+def repo():
+    """Base SQLite en memoria + huellas en memoria, repuestas al terminar."""
+    r = RepositorioSQLite(":memory:")
+    set_repositorio(r)
+    set_huellas(HuellasLocales(":memory:"))
+    yield r
+    set_repositorio(None)
+    set_huellas(None)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    c = CacheParseos(str(tmp_path / "parse_cache"))
+    set_cache_parseos(c)
+    yield c
+    set_cache_parseos(None)
+
+
+@pytest.fixture
+def registro():
+    r = RegistroJobs(":memory:")
+    set_registro_jobs(r)
+    yield r
+    set_registro_jobs(None)
@@ -0,0 +1,17 @@
+import os, statistics
+
+import pytest
+
+from bench.arranque import PESADOS, medir_import
+
+# Presupuesto de `import main` (mediana de 3 procesos nuevos); subirlo en máquinas lentas de CI
+ARRANQUE_PRESUPUESTO_MS = float(os.getenv("ARRANQUE_PRESUPUESTO_MS", "1500"))
+
+
+@pytest.mark.parametrize("solo_lectura", ["0", "1"])
+def test_import_main_no_carga_pesados_y_entra_en_presupuesto(monkeypatch, solo_lectura):
+    monkeypatch.setenv("API_SOLO_LECTURA", solo_lectura)
+    corridas = [medir_import() for _ in range(3)]
+    assert not {m for c in corridas for m in c["pesados"]}, f"se cargaron al arrancar (de {PESADOS})"
+    mediana_ms = statistics.median(c["segundos"] for c in corridas) * 1000
+    assert mediana_ms <= ARRANQUE_PRESUPUESTO_MS
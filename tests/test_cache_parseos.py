@@ -0,0 +1,59 @@
+import io
+
+from openpyxl import Workbook
+
+from services import upload_jobs
+from services.cache_parseos import CacheParseos
+from services.excel_service import iterar_lotes_excel
+
+CABECERAS = ["Id. de tarea", "Nombre de la tarea", "Prioridad", "Asignado a", "Progreso",
+             "Nombre del depósito", "Descripción"]
+
+
+def _xlsx_mixto(ruta=None):
+    """Columnas de texto con números y strings mezclados, como llegan de Planner."""
+    wb = Workbook()
+    ws = wb.active
+    ws.append(CABECERAS)
+    ws.append(["T1", "Alpha", 1, "Ana", "En curso", "Tablero", 3.5])
+    ws.append(["T2", 2024, "Alta", 7, "En curso", 99, "texto"])
+    buf = io.BytesIO()
+    wb.save(ruta or buf)
+    buf.seek(0)
+    return buf
+
+
+def test_columnas_de_texto_mixtas_quedan_como_str(tmp_path):
+    ruta = str(tmp_path / "mixto.xlsx")
+    _xlsx_mixto(ruta)
+    filas = [f for lote in iterar_lotes_excel(ruta) for f in lote]
+    assert [f["nombre_tarea"] for f in filas] == ["Alpha", "2024"]
+    assert [f["prioridad"] for f in filas] == ["1", "Alta"]
+    assert [f["nombre_tablero"] for f in filas] == ["Tablero", "99"]
+
+
+def test_guardar_filas_no_serializables_no_cachea(tmp_path):
+    cache = CacheParseos(str(tmp_path))
+    digest = "a" * 40
+    tareas = [{"id_tarea_planner": "T1", "nombre_tarea": "Alpha"},
+              {"id_tarea_planner": "T2", "nombre_tarea": 2024}]
+    if not cache.guardar(digest, tareas, {"filas": 2}):
+        assert cache.meta(digest) is None
+        assert list(tmp_path.iterdir()) == []
+    else:   # sin pyarrow se guarda con pickle, que acepta tipos mezclados
+        assert cache.meta(digest) == {"filas": 2}
+
+
+def test_previsualizar_archivo_mixto(repo, cache):
+    previa = upload_jobs.previsualizar("mixto.xlsx", _xlsx_mixto())
+    assert previa["confirmable"] and not previa["en_cache"]
+    assert previa["diff"]["insertadas"] == 2
+    assert cache.meta(previa["digest"]) is not None
+
+
+def test_previsualizar_sin_cache_devuelve_diff(repo, cache, monkeypatch):
+    monkeypatch.setattr(cache, "guardar", lambda *a, **k: False)
+    previa = upload_jobs.previsualizar("mixto.xlsx", _xlsx_mixto())
+    assert not previa["confirmable"]
+    assert previa["diff"] == dict(procesadas=2, insertadas=2, actualizadas=0, sin_cambios=0)
+    assert cache.meta(previa["digest"]) is None
@@ -0,0 +1,30 @@
+import io
+
+import pytest
+
+from services import excel_service
+from services.excel_service import motor_lectura
+
+calamine = pytest.mark.skipif(excel_service.CalamineWorkbook is None, reason="sin python-calamine")
+
+
+@calamine
+def test_auto_usa_calamine_solo_hasta_el_umbral(monkeypatch):
+    monkeypatch.setattr(excel_service, "EXCEL_ENGINE", "auto")
+    monkeypatch.setattr(excel_service, "EXCEL_CALAMINE_MAX_MB", 1)
+    assert motor_lectura("a.xlsx") == "calamine"
+    assert motor_lectura("a.xlsx", 2**20) == "calamine"
+    assert motor_lectura("a.xlsx", 2**20 + 1) == "openpyxl"
+    # .ods solo se puede leer con calamine; EXCEL_ENGINE=calamine lo fuerza a cualquier tamaño
+    assert motor_lectura("a.ods", 2**30) == "calamine"
+    monkeypatch.setattr(excel_service, "EXCEL_ENGINE", "calamine")
+    assert motor_lectura("a.xlsx", 2**30) == "calamine"
+
+
+def test_tamano_no_mueve_la_posicion(tmp_path):
+    buf = io.BytesIO(b"x" * 100)
+    buf.seek(10)
+    assert excel_service._tamano(buf) == 100 and buf.tell() == 10
+    ruta = tmp_path / "a.xlsx"
+    ruta.write_bytes(b"x" * 7)
+    assert excel_service._tamano(str(ruta)) == 7
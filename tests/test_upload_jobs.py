@@ -0,0 +1,46 @@
+import io, time
+
+import pytest
+from openpyxl import Workbook
+
+from services import upload_jobs
+from services.upload_jobs import ConflictoIdempotencia
+
+CABECERAS = ["Id. de tarea", "Nombre de la tarea", "Nombre del depósito", "Progreso"]
+
+
+def _xlsx(*ids):
+    wb = Workbook()
+    ws = wb.active
+    ws.append(CABECERAS)
+    for id_tarea in ids:
+        ws.append([id_tarea, f"Tarea {id_tarea}", "Tablero", "No iniciado"])
+    buf = io.BytesIO()
+    wb.save(buf)
+    buf.seek(0)
+    return buf
+
+
+def _esperar(job_id, timeout=10.0):
+    limite = time.time() + timeout
+    while time.time() < limite:
+        job = upload_jobs.obtener_job(job_id)
+        if job["fase"] in ("completado", "error"):
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"el job {job_id} no terminó")
+
+
+def test_clave_de_un_job_deduplicado_no_se_reusa_con_otro_archivo(repo, registro):
+    original = upload_jobs.crear_job("a.xlsx", _xlsx("T1", "T2"))
+    assert _esperar(original["job_id"])["fase"] == "completado"
+
+    # mismo archivo con una clave nueva: se reusa el job original y la clave queda atada a él
+    dup = upload_jobs.crear_job("a.xlsx", _xlsx("T1", "T2"), idempotency_key="clave-1")
+    assert dup["duplicado"] and dup["job_id"] == original["job_id"]
+
+    with pytest.raises(ConflictoIdempotencia):
+        upload_jobs.crear_job("b.xlsx", _xlsx("T3"), idempotency_key="clave-1")
+
+    otra_vez = upload_jobs.crear_job("a.xlsx", _xlsx("T1", "T2"), idempotency_key="clave-1")
+    assert otra_vez["job_id"] == original["job_id"]